@@ -4,8 +4,9 @@ import logging
 from importlib.metadata import distribution
 
 from larry.color import Color, ColorList
+from larry.palette import Palette
 
-__all__ = ("__version__", "LOGGER", "Color", "ColorList")
+__all__ = ("__version__", "LOGGER", "Color", "ColorList", "Palette")
 __version__ = distribution("larry").version
 
 LOGGER = logging.getLogger("larry")
@@ -0,0 +1,241 @@
+"""Long-lived worker process for palette analysis
+
+Clustering is done by scikit-learn, which is slow to import and can (rarely) take much
+longer than we are willing to wait. So it is run in a separate, persistent process. The
+heavy imports are paid for once, when the worker starts, and a worker that takes too
+long can be killed without taking larry down with it.
+
+The worker is started with the "spawn" method (forking a threaded process is unsafe), so
+it re-imports the __main__ module. Scripts that use the worker (e.g. through
+Color.dominant()) must therefore guard their main code with
+`if __name__ == "__main__":`, or the worker will fail to start.
+"""
+
+from __future__ import annotations
+
+import atexit
+import importlib
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Any, Callable
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+DEFAULT_TIMEOUT = 5.0
+STARTUP_TIMEOUT = 60.0
+WARM_IMPORTS = ("sklearn.cluster",)
+
+Centroids = NDArray[np.float64]
+
+
+class AnalysisError(RuntimeError):
+    """The analysis worker failed to process the request"""
+
+
+class AnalysisTimeout(AnalysisError, TimeoutError):
+    """The analysis worker did not respond in time"""
+
+
+class AnalysisWorker:
+    """Proxy for the persistent analysis process
+
+    The process is started on first use and restarted if it dies or times out. It is
+    spawned, so the __main__ module must be importable without side effects (see the
+    module docstring).
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT) -> None:
+        self.timeout = timeout
+
+        # The centroids of the last k-means run for each number of clusters. The next
+        # run with that number of clusters is warm-started from them.
+        self.centroids: dict[int, Centroids] = {}
+
+        self._process: BaseProcess | None = None
+        self._conn: Connection | None = None
+        self._started = 0.0
+        self._ready = False
+        self._lock = threading.RLock()
+
+    @property
+    def is_running(self) -> bool:
+        """Return True if the worker process is running"""
+        return self._process is not None and self._process.is_alive()
+
+    def start(self, timeout: float | None = None) -> None:
+        """Start the worker process (if it's not already running) and wait until ready
+
+        Wait at most timeout seconds (None means as long as STARTUP_TIMEOUT allows).
+        If the worker is not ready by then AnalysisTimeout is raised, but the worker
+        is left to finish starting, unless it has used up STARTUP_TIMEOUT.
+        """
+        with self._lock:
+            if not self.is_running:
+                self.stop()
+                context = mp.get_context("spawn")
+                conn, child_conn = context.Pipe()
+                process = context.Process(
+                    target=serve, args=(child_conn,), name="larry-analysis", daemon=True
+                )
+                process.start()
+                child_conn.close()
+                self._process, self._conn = process, conn
+                self._started = time.monotonic()
+
+            if self._ready:
+                return
+
+            assert self._conn is not None
+            startup_left = self._started + STARTUP_TIMEOUT - time.monotonic()
+            wait = startup_left if timeout is None else min(timeout, startup_left)
+
+            if self._conn.poll(max(wait, 0)):
+                self._receive()
+                self._ready = True
+                return
+
+            if wait >= startup_left:
+                self.stop()
+                raise AnalysisTimeout("Analysis worker failed to start")
+
+            raise AnalysisTimeout(f"Analysis worker did not start in {timeout} seconds")
+
+    def stop(self) -> None:
+        """Stop the worker process"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+            if self._process is not None:
+                self._process.kill()
+                self._process.join()
+                self._process = None
+
+            self._ready = False
+
+    def reset(self) -> None:
+        """Forget the warm-start centroids"""
+        self.centroids.clear()
+
+    def kmeans(
+        self,
+        data: ArrayLike,
+        n_clusters: int,
+        *,
+        timeout: float | None = None,
+        random_state: Any = None,
+        sample_weight: ArrayLike | None = None,
+    ) -> Centroids:
+        """Return the k-means centroids of the given data
+
+        The samples may be given weights. The centroids of the previous run with the
+        same number of clusters (if any) are the initial centroids of this one, and
+        k-means converges from them. Successive palettes (e.g. of the same or a
+        similar image) are usually close, so this takes fewer iterations than
+        starting from scratch.
+        """
+        centroids = self.call(
+            "kmeans",
+            data=np.asarray(data),
+            n_clusters=n_clusters,
+            init=self.centroids.get(n_clusters),
+            random_state=random_state,
+            sample_weight=None if sample_weight is None else np.asarray(sample_weight),
+            timeout=timeout,
+        )
+        self.centroids[n_clusters] = centroids
+
+        return centroids
+
+    def call(self, name: str, *, timeout: float | None = None, **kwargs: Any) -> Any:
+        """Call the given handler in the worker and return the result
+
+        If the worker does not respond within timeout seconds, it is killed and
+        AnalysisTimeout is raised. The time it takes the worker to start counts
+        against the timeout.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        with self._lock:
+            self.start(timeout)
+            assert self._conn is not None
+
+            try:
+                self._conn.send((name, kwargs))
+            except OSError as error:
+                self.stop()
+                raise AnalysisError("Analysis worker died") from error
+
+            if not self._conn.poll(max(deadline - time.monotonic(), 0)):
+                self.stop()
+                raise AnalysisTimeout(f"Analysis took longer than {timeout} seconds")
+
+            return self._receive()
+
+    def _receive(self) -> Any:
+        assert self._conn is not None
+
+        try:
+            status, result = self._conn.recv()
+        except (EOFError, OSError) as error:
+            self.stop()
+            raise AnalysisError("Analysis worker died") from error
+
+        if status == "error":
+            raise AnalysisError(result)
+
+        return result
+
+
+def fit_kmeans(
+    data: NDArray,
+    n_clusters: int,
+    init: Centroids | None = None,
+    random_state: Any = None,
+    sample_weight: NDArray | None = None,
+) -> Centroids:
+    """Fit k-means to the (weighted) data and return the centroids"""
+    cluster = importlib.import_module("sklearn.cluster")
+
+    if init is not None and len(init) == n_clusters:
+        kmeans = cluster.KMeans(
+            n_clusters=n_clusters, init=init, n_init=1, random_state=random_state
+        )
+    else:
+        kmeans = cluster.KMeans(n_clusters=n_clusters, random_state=random_state)
+
+    return kmeans.fit(data, sample_weight=sample_weight).cluster_centers_
+
+
+HANDLERS: dict[str, Callable[..., Any]] = {"kmeans": fit_kmeans}
+
+
+def serve(conn: Connection) -> None:
+    """The worker process' main loop"""
+    for module in WARM_IMPORTS:
+        importlib.import_module(module)
+
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            name, kwargs = conn.recv()
+        except EOFError:
+            break
+
+        try:
+            response = ("ok", HANDLERS[name](**kwargs))
+        except Exception as error:  # pylint: disable=broad-except
+            response = ("error", f"{type(error).__name__}: {error}")
+
+        conn.send(response)
+
+
+WORKER = AnalysisWorker()
+atexit.register(WORKER.stop)
@@ -0,0 +1,489 @@
+"""Caches of decoded input images and their analysis
+
+The input image rarely changes between iterations, but reading, decoding and analyzing
+it is the most expensive part of an iteration. So the results are kept in-process by
+the ImageCache, keyed by the input's path, mtime and size (or, for "!command" inputs, a
+hash of the command's output).
+
+Photos can have hundreds of thousands of colors. A CachedImage can also quantize its
+palette to a few representative colors (see CachedImage.quantize()), so that filters
+need only see those, and map the representatives' new colors back onto the pixels. And
+when the palette itself isn't needed, a sample of the image's pixels will do for
+analysis (see CachedImage.sample()).
+
+The analysis results (palettes, pixel counts and dominant colors) are also kept on disk
+by the PaletteStore, keyed by content hash, so that they survive restarts. The store
+also keeps compiled filter lookup tables (see larry.filters.lut).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from configparser import RawConfigParser
+from functools import cached_property
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import platformdirs
+from numpy.typing import ArrayLike, NDArray
+
+from larry import LOGGER, __version__, quantize
+from larry.color import DOMINANT_METHOD, ColorList
+from larry.image import DEFAULT_SEED, Image, RasterImage, make_image_from_bytes
+from larry.io import read_file
+from larry.nearest import DEFAULT_SPACE, ColorIndex
+from larry.palette import Palette
+
+DEFAULT_MAXSIZE = 4
+CACHE_DIR = platformdirs.user_cache_dir("larry")
+DEFAULT_DISK_CACHE_SIZE = 64  # MiB
+
+# Images with at most this many pixels keep the palette index of each pixel (see
+# CachedImage.index_map)
+INDEX_MAP_PIXELS = 1 << 22
+
+# On-disk record of a palette color and its number of pixels
+PALETTE_DTYPE = np.dtype([("rgb", np.uint8, (3,)), ("count", np.int64)])
+
+CacheKey = tuple[str | int, ...]
+
+
+class CachedImage:
+    """A decoded image along with its (luminocity-sorted) palette
+
+    The palette is only extracted when it is first needed. If a PaletteStore and the
+    image's key are given, it is taken from (or saved to) the store.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        image: Image,
+        palette: Palette | None = None,
+        counts: NDArray[np.int64] | None = None,
+        *,
+        store: PaletteStore | None = None,
+        key: str | None = None,
+    ) -> None:
+        self.image = image
+        self.store = store
+        self.key = key
+
+        if palette is not None and counts is not None:
+            self.analysis = (palette, counts)
+
+        self._quantized: dict[tuple[int, str, str], Quantized] = {}
+        self._samples: dict[tuple[int, int], tuple[Palette, NDArray[np.int64]]] = {}
+
+    @cached_property
+    def analysis(self) -> tuple[Palette, NDArray[np.int64]]:
+        """The image's palette and the pixel count of each color (see analyze())"""
+        if self.store is None or self.key is None:
+            return analyze(self.image)
+
+        if (stored := self.store.load_palette(self.key)) is not None:
+            return stored
+
+        palette, counts = analyze(self.image)
+        self.store.save_palette(self.key, palette, counts)
+
+        return palette, counts
+
+    @property
+    def palette(self) -> Palette:
+        """The image's palette, sorted by luminocity"""
+        return self.analysis[0]
+
+    @property
+    def counts(self) -> NDArray[np.int64]:
+        """The number of pixels of each of the palette's colors"""
+        return self.analysis[1]
+
+    def sample(
+        self, size: int, seed: int = DEFAULT_SEED
+    ) -> tuple[Palette, NDArray[np.int64]]:
+        """Return the (luminocity-sorted) colors of a sample of the image's pixels
+
+        Unlike the palette, a sample costs the same whatever the size of the image.
+        The colors come with the number of sampled pixels of each. See Image.sample().
+        """
+        if (sample := self._samples.get((size, seed))) is None:
+            palette, counts = self.image.sample(size, seed)
+            order = palette.argsort()
+            sample = self._samples[size, seed] = (palette[order], counts[order])
+
+        return sample
+
+    @property
+    def colors(self) -> ColorList:
+        """The image's colors, sorted by luminocity"""
+        return self.palette.to_colors()
+
+    @cached_property
+    def index_map(self) -> NDArray[np.uint16 | np.uint32] | None:
+        """The index into the palette of each of the image's pixels
+
+        This saves recoloring a quantized image (see Quantized.replace()) from looking
+        up each pixel's color on every iteration. It is None for images that don't
+        have pixels or have more than INDEX_MAP_PIXELS pixels. Those look up the
+        indexes a band at a time instead.
+        """
+        if not isinstance(self.image, RasterImage):
+            return None
+
+        width, height = self.image.image.size
+
+        if width * height > INDEX_MAP_PIXELS:
+            return None
+
+        return self.image.palette_index(self.palette)
+
+    def quantize(
+        self, size: int, method: str, space: str = DEFAULT_SPACE
+    ) -> Quantized | None:
+        """Return the image's palette quantized to at most size colors
+
+        The colors are quantized by the given larry.quantize method and each is
+        represented by the nearest (in the given color space) of the quantized colors.
+
+        Return None if the image doesn't have pixels, is paletted (its colors are
+        replaced through its palette anyway) or already has no more than size colors.
+        """
+        if (
+            not isinstance(self.image, RasterImage)
+            or self.image.is_paletted
+            or len(self.palette) <= size
+        ):
+            return None
+
+        key = (size, method, space)
+
+        if (quantized := self._quantized.get(key)) is None:
+            quantized = self._quantized[key] = Quantized(self, size, method, space)
+
+        return quantized
+
+
+class Quantized:
+    """A CachedImage's palette quantized to a few representative colors
+
+    The representatives are sorted by luminocity and counts holds the number of pixels
+    each represents. nearest holds the index of the representative of each of the
+    image's palette colors.
+    """
+
+    def __init__(
+        self, cached: CachedImage, size: int, method: str, space: str = DEFAULT_SPACE
+    ) -> None:
+        self.cached = cached
+        palette = cached.palette.array
+        centers = np.rint(quantize.QUANTIZERS[method](palette, cached.counts, size))
+        nearest = ColorIndex(centers, space).query(palette)
+
+        # Representatives that represent nothing are dropped
+        used, nearest = np.unique(nearest, return_inverse=True)
+        representatives = Palette(centers[used])
+        order = representatives.argsort()
+
+        self.palette = representatives[order]
+        self.nearest: NDArray[np.intp] = np.argsort(order)[nearest]
+        self.counts: NDArray[np.int64] = np.bincount(
+            self.nearest, weights=cached.counts, minlength=len(order)
+        ).astype(np.int64)
+
+    @property
+    def colors(self) -> ColorList:
+        """The representative colors, sorted by luminocity"""
+        return self.palette.to_colors()
+
+    def replace(self, new_colors: ColorList, residuals: bool = False) -> RasterImage:
+        """Return the image with the representative colors replaced by new_colors
+
+        Each pixel gets the new color of its representative. If residuals is True, the
+        difference between the pixel's original color and its representative is added
+        back, preserving the detail that quantization would lose.
+
+        Like Image.replace(), representatives without a new color are left as they are.
+        """
+        image = self.cached.image
+        assert isinstance(image, RasterImage)
+
+        new = self.palette.array.copy()
+        replaced = Palette.from_colors(new_colors).array[: len(new)]
+        new[: len(replaced)] = replaced
+        table = new[self.nearest].astype(np.int16)
+
+        if residuals:
+            table += self.cached.palette.array
+            table -= self.palette.array[self.nearest]
+
+        return image.recolor(
+            self.cached.palette,
+            table.clip(0, 255).astype(np.uint8),
+            self.cached.index_map,
+        )
+
+
+class ImageCache:
+    """LRU cache of CachedImages holding at most maxsize entries"""
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[CacheKey, CachedImage] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self, filename: str, store: PaletteStore | None = None, **options: Any
+    ) -> CachedImage:
+        """Return the CachedImage for the given (read_file()-style) filename
+
+        The file is read and decoded only if it has changed since it was last cached.
+        If a PaletteStore is given, the image's analysis is taken from (or saved to) it.
+        The options are passed on to make_image_from_bytes().
+        """
+        data: bytes | None = None
+
+        if filename.startswith("!"):
+            data = read_file(filename)
+            key: CacheKey = (filename, content_hash(data))
+        else:
+            stat = os.stat(os.path.expanduser(filename))
+            key = (filename, stat.st_mtime_ns, stat.st_size)
+
+        key += (repr(sorted(options.items())),)
+
+        with self._lock:
+            if (entry := self._entries.get(key)) is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        if data is None:
+            data = read_file(filename)
+
+        entry = cached_image(data, store, **options)
+
+        with self._lock:
+            # Any older entries for this file (or for other options) are now stale
+            self._remove(filename)
+            self._entries[key] = entry
+            self._evict()
+
+        return entry
+
+    def invalidate(self, filename: str) -> None:
+        """Remove all entries for the given filename"""
+        with self._lock:
+            self._remove(filename)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def _remove(self, filename: str) -> None:
+        for key in [key for key in self._entries if key[0] == filename]:
+            del self._entries[key]
+
+    def _evict(self) -> None:
+        while len(self._entries) > max(self.maxsize, 0):
+            self._entries.popitem(last=False)
+
+
+class PaletteStore:
+    """Content-addressed on-disk store of image analysis
+
+    Entries are .npy files (which can be memory-mapped) in the given directory. When
+    the total size of the entries exceeds max_size bytes, the least recently used
+    entries are removed.
+    """
+
+    def __init__(
+        self, path: str | Path, max_size: int = DEFAULT_DISK_CACHE_SIZE << 20
+    ) -> None:
+        self.path = Path(path)
+        self.max_size = max_size
+
+    @classmethod
+    def from_config(cls, config: RawConfigParser) -> PaletteStore | None:
+        """Return the PaletteStore for the given larry config
+
+        Return None if the disk cache is disabled.
+        """
+        if not config.getboolean("larry", "disk_cache", fallback=True):
+            return None
+
+        path = os.path.expanduser(config.get("larry", "cache_dir", fallback=CACHE_DIR))
+        size = config.getint(
+            "larry", "disk_cache_size", fallback=DEFAULT_DISK_CACHE_SIZE
+        )
+
+        return cls(path, size << 20)
+
+    def load_palette(self, key: str) -> tuple[Palette, NDArray[np.int64]] | None:
+        """Return the palette and pixel counts stored for the given content hash"""
+        if (records := self._load(f"palettes/{key}.npy")) is None:
+            return None
+
+        return Palette(np.array(records["rgb"])), np.array(records["count"])
+
+    def save_palette(
+        self, key: str, palette: Palette, counts: NDArray[np.int64]
+    ) -> None:
+        """Store the palette and pixel counts for the given content hash"""
+        records = np.empty(len(palette), dtype=PALETTE_DTYPE)
+        records["rgb"] = palette.array
+        records["count"] = counts
+        self._save(f"palettes/{key}.npy", records)
+
+    def load_dominant(
+        self,
+        colors: ColorList,
+        needed: int,
+        method: str = DOMINANT_METHOD,
+        weights: ArrayLike | None = None,
+    ) -> ColorList | None:
+        """Return the stored dominant colors of the given (weighted) colors"""
+        name = self._dominant_name(colors, needed, method, weights)
+
+        if (array := self._load(name)) is None:
+            return None
+
+        return Palette(np.array(array)).to_colors()
+
+    def save_dominant(
+        self,
+        colors: ColorList,
+        needed: int,
+        dominant: ColorList,
+        method: str = DOMINANT_METHOD,
+        weights: ArrayLike | None = None,
+    ) -> None:
+        """Store the dominant colors of the given (weighted) colors"""
+        self._save(
+            self._dominant_name(colors, needed, method, weights),
+            Palette.from_colors(dominant).array,
+        )
+
+    def load_lut(self, key: str) -> NDArray[np.uint8] | None:
+        """Return the (memory-mapped) lookup table stored under the given key"""
+        return self._load(f"luts/{key}.npy")
+
+    def save_lut(self, key: str, table: NDArray[np.uint8]) -> None:
+        """Store the lookup table under the given key"""
+        self._save(f"luts/{key}.npy", table)
+
+    def prune(self) -> None:
+        """Remove least recently used entries until the store fits in max_size"""
+        entries = []
+
+        for path in self.path.glob("*/*.npy"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    @staticmethod
+    def _dominant_name(
+        colors: ColorList, needed: int, method: str, weights: ArrayLike | None
+    ) -> str:
+        data = Palette.from_colors(colors).array.tobytes()
+
+        if weights is not None:
+            data += np.asarray(weights, dtype=np.float64).tobytes()
+
+        key = content_hash(data)
+        suffix = "" if method == DOMINANT_METHOD else f"-{method}"
+
+        return f"dominant/{key}-{needed}{suffix}.npy"
+
+    def _load(self, name: str) -> NDArray | None:
+        path = self.path / name
+
+        try:
+            array = np.load(path, mmap_mode="r", allow_pickle=False)
+            # Mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as error:
+            LOGGER.debug("Ignoring unreadable cache entry %s: %s", path, error)
+            return None
+
+        return array
+
+    def _save(self, name: str, array: NDArray) -> None:
+        path = self.path / name
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=path.parent, suffix=".tmp", delete=False
+            ) as tmp:
+                np.save(tmp, array, allow_pickle=False)
+            os.replace(tmp.name, path)
+        except OSError as error:
+            LOGGER.debug("Could not write cache entry %s: %s", path, error)
+            return
+
+        self.prune()
+
+
+def content_hash(data: bytes, **options: Any) -> str:
+    """Return the key of the given content (when decoded with the given options)
+
+    The larry version is part of the key, as the analysis of the content may change
+    from one version to the next.
+    """
+    digest = hashlib.sha256(f"{__version__}\n".encode())
+    digest.update(data)
+
+    if options:
+        digest.update(repr(sorted(options.items())).encode())
+
+    return digest.hexdigest()
+
+
+def analyze(image: Image) -> tuple[Palette, NDArray[np.int64]]:
+    """Return the image's luminocity-sorted palette and the pixel count of each color
+
+    For images that don't have pixels, the counts are the number of times each color
+    occurs.
+    """
+    palette, counts = image.color_counts()
+    order = palette.argsort()
+
+    return palette[order], counts[order]
+
+
+def cached_image(
+    data: bytes, store: PaletteStore | None = None, **options: Any
+) -> CachedImage:
+    """Decode the image data into a CachedImage
+
+    The analysis is taken from (or saved to) the given store.
+    """
+    image = make_image_from_bytes(data, **options)
+
+    if store is None:
+        return CachedImage(image)
+
+    return CachedImage(image, store=store, key=content_hash(data, **options))
+
+
+IMAGE_CACHE = ImageCache()
@@ -6,19 +6,43 @@ import configparser
 import logging
 import os
 import signal
-from typing import Iterable
-
-from larry import LOGGER, __version__
+from typing import Any, Iterator
+
+import numpy as np
+from numpy.typing import NDArray
+
+from larry import LOGGER, __version__, quantize
+from larry.cache import (
+    DEFAULT_MAXSIZE,
+    IMAGE_CACHE,
+    CachedImage,
+    PaletteStore,
+    Quantized,
+)
 from larry.color import Color, ColorList
 from larry.config import DEFAULT_CONFIG_PATH, DEFAULT_INPUT_PATH, is_paused
 from larry.config import load as load_config
-from larry.filters import FilterNotFound, list_filters, load_filter
-from larry.image import make_image_from_bytes
-from larry.io import read_file, write_file
+from larry.filters import (
+    Filter,
+    FilterNotFound,
+    list_filters,
+    load_filter,
+    lut,
+    pipeline,
+)
+from larry.hsvtable import HSVTable, get_table
+from larry.image import Image, RasterImage
+from larry.io import write_file
+from larry.nearest import DEFAULT_SPACE, SPACES
+from larry.palette import Palette
 from larry.plugins import do_plugin, list_plugins
 from larry.types import STOP_EVENT, Handler
 
 INTERVAL = 8 * 60
+QUANTIZE_METHOD = "minibatch"
+PALETTE_MODE = "palette"
+PIXELS_MODE = "pixels"
+SAMPLE_SIZE = 1 << 14
 
 
 async def main(args: argparse.Namespace) -> None:
@@ -67,21 +91,108 @@ async def run_every(interval: float, config_path: str) -> None:
 async def run(config_path: str) -> None:
     """Perform a single iteration of Larry"""
     config = load_config(config_path)
-    colors: Iterable[Color]
 
     if is_paused(config):
         LOGGER.info("Larry is paused")
         return
 
-    raw_image_data = read_file(
-        os.path.expanduser(config.get("larry", "input", fallback=DEFAULT_INPUT_PATH))
+    cached = load_input(config)
+    colors_str = config["larry"].get("colors", "").strip().split()
+    plugin_names = config.get("larry", "plugins", fallback="").split()
+
+    chain = None if colors_str else pixel_chain(cached.image, config)
+    quantized = None
+
+    if chain:
+        palette, counts = pixels_palette(cached, config)
+    elif quantized := quantize_image(cached, config):
+        palette, counts = quantized.palette, quantized.counts
+    else:
+        palette, counts = cached.palette, cached.counts
+
+    # The image's colors are weighted by their pixel counts (the config's are not). The
+    # weights are passed on through the filters to the plugins.
+    orig_colors = palette.to_colors()
+
+    with pipeline.weighted(orig_colors, None if colors_str else counts):
+        if chain:
+            image, colors = filter_pixels(
+                cached.image, orig_colors, chain, bool(plugin_names), hsv_table(config)
+            )
+        else:
+            image, colors = filter_palette(
+                cached.image, orig_colors, quantized, colors_str, config
+            )
+
+        outfile = os.path.expanduser(config.get("larry", "output", fallback="!cat"))
+        write_file(outfile, bytes(image))
+
+        # now run any plugins
+        async with asyncio.TaskGroup() as task_group:
+            for plugin_name in plugin_names:
+                task_group.create_task(do_plugin(plugin_name, colors, config_path))
+
+
+def load_input(config: configparser.ConfigParser) -> CachedImage:
+    """Return the (cached) input image given by the config
+
+    Raster images are downscaled to the config's max_size, if given.
+    """
+    IMAGE_CACHE.maxsize = config["larry"].getint(
+        "image_cache_size", fallback=DEFAULT_MAXSIZE
+    )
+    store = PaletteStore.from_config(config)
+    options: dict[str, Any] = {
+        "embedded": config["larry"].getboolean("embedded_images", fallback=False)
+    }
+
+    if (size := max_size(config)) is not None:
+        options["max_size"] = size
+
+    return IMAGE_CACHE.get(
+        os.path.expanduser(config.get("larry", "input", fallback=DEFAULT_INPUT_PATH)),
+        store,
+        **options,
     )
-    image = make_image_from_bytes(raw_image_data)
 
-    orig_colors = list(image.colors)
-    orig_colors.sort(key=Color.luminocity)
-    colors_str = config["larry"].get("colors", "").strip().split()
 
+def max_size(config: configparser.ConfigParser) -> tuple[int, int] | None:
+    """Return the (width, height) given by the config's max_size option
+
+    The option is either WIDTHxHEIGHT (e.g. 2560x1440) or a single number for both.
+    Return None if the input is not to be downscaled.
+    """
+    value = config["larry"].get("max_size", fallback="").strip().lower()
+
+    if not value:
+        return None
+
+    width, sep, height = value.partition("x")
+
+    try:
+        size = (int(width), int(height if sep else width))
+    except ValueError:
+        size = (0, 0)
+
+    if min(size) < 1:
+        LOGGER.warning("Invalid max_size %r. Not downscaling.", value)
+        return None
+
+    return size
+
+
+def filter_palette(
+    image: Image,
+    orig_colors: ColorList,
+    quantized: Quantized | None,
+    colors_str: list[str],
+    config: configparser.ConfigParser,
+) -> tuple[Image, ColorList]:
+    """Filter the palette's colors (or replace them with the config's colors)
+
+    Return the image with its palette colors replaced by the new colors, along with the
+    new colors. If the palette is quantized the image is recolored through it.
+    """
     if colors_str:
         LOGGER.debug("using colors from config")
         colors = [Color(i.strip()) for i in colors_str]
@@ -90,16 +201,133 @@ async def run(config_path: str) -> None:
 
     LOGGER.debug("new colors: %s", colors)
 
-    if colors != orig_colors:
-        image = image.replace(orig_colors, colors)
+    if colors == orig_colors:
+        return image, colors
+
+    if quantized:
+        residuals = config["larry"].getboolean("quantize_residuals", fallback=False)
+        return quantized.replace(colors, residuals), colors
+
+    return image.replace(orig_colors, colors), colors
+
+
+def filter_pixels(
+    image: Image,
+    orig_colors: ColorList,
+    chain: pipeline.Chain,
+    with_colors: bool,
+    table: HSVTable | None = None,
+) -> tuple[Image, ColorList]:
+    """Pass the image's pixels through the filter chain (see pixel_chain())
+
+    HSV filters use the given HSVTable, if any. Return the new image along with, if
+    with_colors is True, the filtered palette colors.
+    """
+    assert isinstance(image, RasterImage)
+    LOGGER.debug("filtering pixels")
+    image = image.map_pixels(lambda rgb: pipeline.run_array(rgb, chain, table))
+
+    if not with_colors:
+        return image, []
+
+    return image, pipeline.run(orig_colors, chain, table)
+
+
+def pixels_palette(
+    cached: CachedImage, config: configparser.ConfigParser
+) -> tuple[Palette, NDArray[np.int64]]:
+    """Return the palette (and pixel counts) to filter for the plugins in pixels mode
+
+    In pixels mode the image's palette is not otherwise needed (nor is it quantized).
+    So a sample of about sample_size of the image's pixels stands in for it (see
+    CachedImage.sample()). A sample_size of 0 means the whole palette.
+    """
+    if size := config["larry"].getint("sample_size", fallback=SAMPLE_SIZE):
+        return cached.sample(size)
+
+    return cached.palette, cached.counts
+
+
+def quantize_image(
+    cached: CachedImage, config: configparser.ConfigParser
+) -> Quantized | None:
+    """Return the image's palette quantized as given by the config's quantize options
+
+    The quantize option is the (maximum) number of colors. If it is not given (or 0)
+    the palette is not quantized and None is returned. See CachedImage.quantize().
+
+    Only the palette is quantized, so this is not used in pixels mode.
+    """
+    if not (size := config["larry"].getint("quantize", fallback=0)):
+        return None
+
+    method = config["larry"].get("quantize_method", fallback=QUANTIZE_METHOD)
+    space = config["larry"].get("distance", fallback=DEFAULT_SPACE)
+
+    if method not in quantize.QUANTIZERS:
+        LOGGER.warning("Unknown quantize method %r. Using %s", method, QUANTIZE_METHOD)
+        method = QUANTIZE_METHOD
+
+    if space not in SPACES:
+        LOGGER.warning("Unknown distance %r. Using %s", space, DEFAULT_SPACE)
+        space = DEFAULT_SPACE
+
+    return cached.quantize(size, method, space)
+
+
+def pixel_chain(
+    image: Image, config: configparser.ConfigParser
+) -> list[tuple[Filter, configparser.ConfigParser]] | None:
+    """Return the config's filter chain if it is to be applied to the image's pixels
+
+    In pixels mode ([larry] mode = pixels) the filters are applied directly to the
+    pixels of (non-paletted) raster images, instead of to the image's palette. This
+    only works for chains of @pointwise filters (without "random" values). Other
+    filters, like shift, gradient and kaleidoscope, need the whole palette.
+
+    Return None if the image's palette is to be filtered instead. In pixels mode the
+    reason is logged.
+    """
+    if config["larry"].get("mode", fallback=PALETTE_MODE) != PIXELS_MODE:
+        return None
+
+    if not isinstance(image, RasterImage) or image.is_paletted:
+        LOGGER.info("Image has no pixels to filter. Filtering its palette instead")
+        return None
+
+    names = filter_names(config)
+
+    try:
+        chain = [(load_filter(name), config) for name in names]
+    except FilterNotFound:
+        # Palette mode reports it
+        return None
+
+    if reason := needs_palette(names, chain):
+        LOGGER.info("%s. Filtering the palette instead of the pixels", reason)
+        return None
+
+    return list(optimize_chain(chain, config))
 
-    outfile = os.path.expanduser(config.get("larry", "output", fallback="!cat"))
-    write_file(outfile, bytes(image))
 
-    # now run any plugins
-    async with asyncio.TaskGroup() as task_group:
-        for plugin_name in config.get("larry", "plugins", fallback="").split():
-            task_group.create_task(do_plugin(plugin_name, colors, config_path))
+def needs_palette(
+    names: list[str], chain: list[tuple[Filter, configparser.ConfigParser]]
+) -> str:
+    """Return why the named filter chain can't be applied to pixels ("" if it can)"""
+    if not chain:
+        return "No filters"
+
+    if others := [
+        name
+        for name, (cfilter, _) in zip(names, chain)
+        if not pipeline.is_pointwise(cfilter)
+    ]:
+        return f"Filters need the palette: {' '.join(others)}"
+
+    if lut.is_random(chain):
+        return 'Filters have "random" values'
+
+    return ""
 
 
 def apply_filters(colors: ColorList, config: configparser.ConfigParser) -> ColorList:
@@ -107,9 +335,51 @@ def apply_filters(colors: ColorList, config: configparser.ConfigParser) -> Color
 
     Return the new ColorList
     """
-    colors = colors.copy()
+    chain = optimize_chain(filter_chain(config), config)
+
+    return pipeline.run(
+        pipeline.pass_weights(colors, colors.copy()), chain, hsv_table(config)
+    )
+
+
+def hsv_table(config: configparser.ConfigParser) -> HSVTable | None:
+    """Return the HSVTable to convert colors with, if the hsv_table option is set
+
+    The table is kept in the cache directory, so it is not used if the disk cache is
+    disabled.
+    """
+    if not config["larry"].getboolean("hsv_table", fallback=False):
+        return None
+
+    if (store := PaletteStore.from_config(config)) is None:
+        return None
 
-    for filter_name in config["larry"].get("filter", fallback="none").split():
+    return get_table(str(store.path))
+
+
+def optimize_chain(
+    chain: pipeline.Chain, config: configparser.ConfigParser
+) -> pipeline.Chain:
+    """Return the filter chain as optimized by the config's options
+
+    With the lut option, runs of pointwise filters are compiled into lookup tables
+    (see larry.filters.lut). With fuse_hsv, runs of HSV filters are fused (see
+    larry.filters.pipeline.fuse()), which can change the colors slightly.
+    """
+    if (size := lut.lut_size(config)) is not None:
+        chain = lut.compile_chain(chain, size, PaletteStore.from_config(config))
+
+    if config["larry"].getboolean("fuse_hsv", fallback=False):
+        chain = pipeline.fuse(chain)
+
+    return chain
+
+
+def filter_chain(
+    config: configparser.ConfigParser,
+) -> Iterator[tuple[Filter, configparser.ConfigParser]]:
+    """Yield the config's filters (along with the config)"""
+    for filter_name in filter_names(config):
         try:
             cfilter = load_filter(filter_name)
         except FilterNotFound:
@@ -117,9 +387,12 @@ def apply_filters(colors: ColorList, config: configparser.ConfigParser) -> Color
             LOGGER.exception(error_message)
         else:
             LOGGER.debug("Calling filter %s", filter_name)
-            colors = cfilter(colors, config)
+            yield cfilter, config
+
 
-    return colors
+def filter_names(config: configparser.ConfigParser) -> list[str]:
+    """Return the names of the config's filters"""
+    return config["larry"].get("filter", fallback="none").split()
 
 
 def build_parser() -> argparse.ArgumentParser:
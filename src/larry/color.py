@@ -2,21 +2,32 @@
 
 from __future__ import annotations
 
-import multiprocessing as mp
+import logging
 import random
 import re
 from collections import namedtuple
 from dataclasses import dataclass
 from math import ceil, floor
-from queue import Empty
-from typing import Callable, Iterable, Iterator, Optional, TypeAlias, TypeVar, Union
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    TypeAlias,
+    TypeVar,
+    Union,
+)
 
 import numpy as np
-from numpy.typing import NDArray
+from numpy.typing import ArrayLike, NDArray
 from scipy.spatial import distance
-from sklearn.cluster import KMeans
 
-from larry import utils
+from larry import analysis, quantize, utils
+from larry.nearest import DEFAULT_SPACE, color_index, convert
+
+if TYPE_CHECKING:  # pragma: no cover
+    from larry.cache import PaletteStore
 
 ColorFloatType = TypeVar(  #  pylint: disable=invalid-name
     "ColorFloatType", bound="ColorFloat"
@@ -28,6 +39,9 @@ ColorArray: TypeAlias = NDArray[np.int8]
 
 _COMPS = (">", "<", "=")
 
+# larry.LOGGER can't be imported here as the larry package imports this module
+LOGGER = logging.getLogger(__name__)
+
 COLORS_RE = re.compile(
     r"(#[0-9a-fA-F]{6}"
     r"|#[0-9a-fA-F]{3}"
@@ -42,7 +56,10 @@ PASTEL_BRIGHTNESS = 100
 
 DEFAULT_SOFTNESS = 0.5
 
-mp.set_start_method("fork")
+# Color.dominant() methods: scikit-learn's k-means (run by the analysis worker) or one
+# of the larry.quantize quantizers
+DOMINANT_METHOD = "sklearn"
+DOMINANT_METHODS = (DOMINANT_METHOD, *quantize.QUANTIZERS)
 
 
 class BadColorSpecError(ValueError):
@@ -380,21 +397,74 @@ class Color(namedtuple("Color", ["red", "green", "blue"])):
         yield from cls.generate_from(colors[split:], needed - split)
 
     @classmethod
-    def dominant(cls, colors: ColorList, needed: int) -> ColorList:
-        """Return the n dominant colors in colors"""
-        kmeans = KMeans(n_clusters=needed)
-        queue: mp.Queue = mp.Queue()
-        process = mp.Process(target=lambda: queue.put(kmeans.fit(np.array(colors))))
-        process.start()
-
-        try:
-            kmeans = queue.get(timeout=5.0)
-        except Empty:
-            process.kill()
-            return list(cls.generate_from(colors, needed))
-
-        centroids = kmeans.cluster_centers_
-        return [cls(int(i[0]), int(i[1]), int(i[2])) for i in centroids]
+    def dominant(  # pylint: disable=too-many-arguments
+        cls,
+        colors: ColorList,
+        needed: int,
+        timeout: float | None = None,
+        store: PaletteStore | None = None,
+        *,
+        method: str = DOMINANT_METHOD,
+        weights: ArrayLike | None = None,
+    ) -> ColorList:
+        """Return the n dominant colors in colors
+
+        If weights (e.g. the pixel count of each color) are given, the distinct colors
+        are clustered with the total weight of each.
+
+        With the "sklearn" method (the default) the clustering is done by the analysis
+        worker. If it fails or does not respond within timeout seconds (the worker's
+        default if None), a warning is logged and colors are picked by generate_from()
+        instead. The worker is a spawned process, so scripts calling this must guard
+        their main code with `if __name__ == "__main__":`.
+
+        The other methods are the larry.quantize quantizers. These run in-process, need
+        no scikit-learn and return the colors heaviest first.
+
+        If a PaletteStore is given, clustering results are taken from (and saved to)
+        it.
+
+        Raise ValueError if the method is not one of DOMINANT_METHODS.
+        """
+        if method not in DOMINANT_METHODS:
+            raise ValueError(f"Unknown dominant color method: {method!r}")
+
+        if store is not None and (
+            stored := store.load_dominant(colors, needed, method, weights)
+        ):
+            return stored
+
+        centroids: NDArray[np.generic]
+
+        if method == DOMINANT_METHOD:
+            random_state = np.random.RandomState()  # pylint: disable=no-member
+            random_state.set_state(np.random.get_state())
+
+            if weights is None:
+                data, sample_weight = np.array(colors, dtype=np.uint8), None
+            else:
+                data, sample_weight = distinct_colors(colors, weights)
+
+            try:
+                centroids = analysis.WORKER.kmeans(
+                    data,
+                    needed,
+                    timeout=timeout,
+                    random_state=random_state,
+                    sample_weight=sample_weight,
+                )
+            except analysis.AnalysisError as error:
+                LOGGER.warning("Not using k-means for dominant colors: %s", error)
+                return list(cls.generate_from(colors, needed))
+        else:
+            centroids = quantized_colors(colors, needed, method, weights)
+
+        dominant = [cls(int(i[0]), int(i[1]), int(i[2])) for i in centroids]
+
+        if store is not None:
+            store.save_dominant(colors, needed, dominant, method, weights)
+
+        return dominant
 
     @classmethod
     def randhue(cls, saturation, brightness) -> Color:
@@ -502,13 +572,24 @@ class Color(namedtuple("Color", ["red", "green", "blue"])):
 
         return Color.from_hsv((hsv[0], utils.clamp(factor * hsv[1]), hsv[2]))
 
-    def distance(self, other: Color) -> float:
-        """Return the distance between two colors"""
-        return distance.euclidean(self, other)
+    def distance(self, other: Color, space: str = DEFAULT_SPACE) -> float:
+        """Return the distance between two colors in the given color space
+
+        See larry.nearest for the color spaces.
+        """
+        if space == "rgb":
+            return distance.euclidean(self, other)
 
-    def closest(self, colors: ColorList) -> Color:
-        """Return the closest color given the list of colors"""
-        return min(colors, key=self.distance)
+        mine, theirs = convert([self, other], space)
+
+        return float(np.linalg.norm(mine - theirs))
+
+    def closest(self, colors: ColorList, space: str = DEFAULT_SPACE) -> Color:
+        """Return the closest color given the list of colors
+
+        Distances are measured in the given color space.
+        """
+        return colors[color_index(colors, space).nearest(self)]
 
     def to_array(self) -> ColorArray:
         """Convert the color into a numpy array"""
@@ -609,25 +690,30 @@ def replace_string(string: str, colormap: dict[Color, Color]) -> str:
 
     def subber(match):
         match_str = match.group(0)
-        color = Color(match_str)
-        repl = match_str
-
-        if match_str.startswith("rgb("):
-            if new := colormap.get(color):
-                repl = f"rgb({new.red}, {new.green}, {new.blue})"
-        elif match_str.startswith("rgba("):
-            if new := colormap.get(color):
-                alpha = match_str[5:-1].split(",")[-1].strip()
-                repl = f"rgba({new.red}, {new.green}, {new.blue}, {alpha})"
-        else:
-            if new := colormap.get(color):
-                repl = str(new)
 
-        return repl
+        if new := colormap.get(Color(match_str)):
+            return format_color(match_str, new)
+
+        return match_str
 
     return re.sub(COLORS_RE, subber, string)
 
 
+def format_color(color_str: str, color: Color) -> str:
+    """Format color using the same syntax (hex, rgb() or rgba()) as color_str
+
+    For rgba() the alpha of color_str is kept.
+    """
+    if color_str.startswith("rgb("):
+        return f"rgb({color.red}, {color.green}, {color.blue})"
+
+    if color_str.startswith("rgba("):
+        alpha = color_str[5:-1].split(",")[-1].strip()
+        return f"rgba({color.red}, {color.green}, {color.blue}, {alpha})"
+
+    return str(color)
+
+
 def combine(fg: ColorFloat, bg: ColorFloat) -> ColorFloat:
     """Combine two ColorFloats"""
     # https://stackoverflow.com/questions/726549/algorithm-for-additive-color-mixing-for-rgb-values
@@ -650,6 +736,96 @@ def combine_colors(fg: Color, bg: Color, opacity: float) -> Color:
     ).to_color()
 
 
+def quantized_colors(
+    colors: ColorList, needed: int, method: str, weights: ArrayLike | None = None
+) -> NDArray[np.uint8]:
+    """Return the needed quantized colors of the colors, heaviest first
+
+    If the quantizer gives fewer colors than needed, they are repeated.
+    """
+    rgb, counts = distinct_colors(colors, weights)
+    centers = quantize.QUANTIZERS[method](rgb, counts, needed)
+    centers = quantize.by_weight(rgb, counts, centers)
+
+    return np.resize(np.clip(np.rint(centers), 0, 255).astype(np.uint8), (needed, 3))
+
+
+def distinct_colors(
+    colors: ColorList, weights: ArrayLike | None = None
+) -> tuple[NDArray[np.uint8], NDArray[np.float64]]:
+    """Return the distinct colors of the colors along with the total weight of each
+
+    Without weights, each color weighs 1.
+    """
+    rgb, counts, inverse = quantize.distinct(np.array(colors, dtype=np.uint8))
+
+    if weights is None:
+        return rgb, counts.astype(np.float64)
+
+    totals = np.bincount(
+        inverse, weights=np.asarray(weights, dtype=np.float64), minlength=len(rgb)
+    )
+
+    return rgb, totals
+
+
+def rgb_to_hsv(rgb: ArrayLike) -> NDArray[np.float64]:
+    """Convert an (N, 3) array of RGB values to an (N, 3) array of HSV values
+
+    This is the vectorized version of Color.to_hsv() and gives the same results.
+    """
+    red, green, blue = (np.asarray(rgb, dtype=np.float64).reshape(-1, 3) / 255.0).T
+    maximum = np.maximum(np.maximum(red, green), blue)
+    minimum = np.minimum(np.minimum(red, green), blue)
+    delta = maximum - minimum
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        saturation = np.where(maximum != 0.0, delta / maximum, 0.0)
+        hue = np.where(
+            red == maximum,
+            (green - blue) / delta,
+            np.where(
+                green == maximum, 2 + (blue - red) / delta, 4 + (red - green) / delta
+            ),
+        )
+    hue = np.where(saturation == 0.0, -1.0, hue * 60.0)
+    hue = np.where(hue < 0, hue + 360.0, hue)
+
+    return np.stack([hue, saturation * 100.0, maximum * 100.0], axis=1)
+
+
+def hsv_to_rgb(hsv: ArrayLike) -> NDArray[np.uint8]:
+    """Convert an (N, 3) array of HSV values to an (N, 3) array of RGB values
+
+    This is the vectorized version of Color.from_hsv() and gives the same results.
+    """
+    hsv = np.asarray(hsv, dtype=np.float64).reshape(-1, 3)
+    hue, saturation, value = hsv[:, 0] / 360.0, hsv[:, 1] / 100.0, hsv[:, 2] / 100.0
+    hue = np.where(hue < 0.0, hue + 1, hue)
+    hue = np.where(hue == 1.0, 0.0, hue) * 6.0
+    i = np.floor(hue)
+    f = hue - i
+    aa = value * (1 - saturation)
+    bb = value * (1 - (saturation * f))
+    cc = value * (1 - (saturation * (1 - f)))
+    sextants = [
+        (value, cc, aa),
+        (bb, value, aa),
+        (aa, value, cc),
+        (aa, bb, value),
+        (cc, aa, value),
+        (value, aa, bb),
+    ]
+    conditions = [i == n for n in range(6)]
+    rgb = np.stack(
+        [np.select(conditions, [s[c] for s in sextants], 0.0) for c in range(3)], axis=1
+    )
+    # grayscale
+    rgb = np.where((saturation == 0.0)[:, None], value[:, None], rgb)
+
+    return np.clip(rgb * 255, 0, 255).astype(np.uint8)
+
+
 def parser(regex: str):
     """Register str -> ColorTuple parser with the given regex"""
     pattern = re.compile(f"{regex}$")
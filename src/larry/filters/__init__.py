@@ -1,17 +1,34 @@
 """Larry color filters
 
 Filters are functions that take a list of colors and return a list of colors, possibly
-doing "something" to them.
+doing "something" to them. Filters declared with @array_filter instead take and return
+an (N, 3) float32 array of colors and filters declared with @hsv_filter take and return
+an (N, 3) array of HSV values (see larry.filters.pipeline).
 """
 
-from larry.filters.types import Filter, FilterError, FilterNotFound
+from larry.filters.pipeline import array_filter, hsv_filter
+from larry.filters.types import (
+    ArrayFilter,
+    ColorArray,
+    Filter,
+    FilterError,
+    FilterNotFound,
+    HSVArray,
+    HSVFilter,
+)
 from larry.filters.utils import filters_list, list_filters, load_filter
 
 __all__ = (
+    "ArrayFilter",
+    "ColorArray",
     "Filter",
     "FilterError",
     "FilterNotFound",
+    "HSVArray",
+    "HSVFilter",
+    "array_filter",
     "filters_list",
+    "hsv_filter",
     "list_filters",
     "load_filter",
 )
@@ -2,17 +2,17 @@
 
 from configparser import ConfigParser
 
-from larry import ColorList
+from larry.filters.pipeline import array_filter, pointwise, to_array
+from larry.filters.types import ColorArray
+from larry.palette import Palette
 
 
-def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
+@pointwise
+@array_filter
+def cfilter(orig_colors: ColorArray, config: ConfigParser) -> ColorArray:
     """Return brightened (or darkend) version of the colors"""
     percent = config.getint("filters:brighten", "percent", fallback=-20)
-    colors: ColorList = []
+    palette = Palette(orig_colors)
+    lum = palette.luminocity()
 
-    for color in orig_colors:
-        lum = color.luminocity()
-        new_lum = lum + 0.01 * percent * lum
-        colors.append(color.luminize(new_lum))
-
-    return colors
+    return to_array(palette.luminize(lum + 0.01 * percent * lum))
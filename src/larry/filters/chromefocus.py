@@ -1,38 +1,57 @@
 """chromefocus color filter"""
 
-import collections
 from configparser import ConfigParser
 
-from larry import Color, ColorList, utils
+import numpy as np
 
+from larry import Palette, utils
+from larry.filters.pipeline import array_filter, color_weights, order_preserving
+from larry.filters.types import ColorArray
 
-def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
+
+@order_preserving
+@array_filter
+def cfilter(orig_colors: ColorArray, config: ConfigParser) -> ColorArray:
     """Focus on a particular color and fade out the others"""
-    angular_distance = utils.angular_distance
     focus_range = config.getfloat("filters:chromefocus", "range", fallback=5.0)
 
     if focus_range == 0:
-        return list(orig_colors)
+        return orig_colors
 
     factor = config.getfloat("filters:chromefocus", "factor", fallback=0.0)
-    buckets = utils.buckets(0, 360, focus_range)
-    hue_counts: collections.Counter[tuple[float, float]] = collections.Counter()
-
-    for color in orig_colors:
-        hue = color.to_hsv()[0]
-        for bucket in buckets:
-            if bucket[0] <= hue < bucket[1]:
-                hue_counts.update([bucket])
-                break
-
-    average_hue = sum(hue_counts.most_common(1)[0][0]) / 2
-
-    return [
-        (
-            color
-            if angular_distance(h, average_hue) <= focus_range
-            else Color.from_hsv((h, factor * s, v))
-        )
-        for color in orig_colors
-        for h, s, v in [color.to_hsv()]
-    ]
+    palette = Palette(orig_colors)
+    hsv = palette.to_hsv()
+    hue = hsv[:, 0]
+    average_hue = (
+        sum(most_common_bucket(hue, focus_range, color_weights(orig_colors))) / 2
+    )
+    distance = np.abs((hue - average_hue + 180) % 360 - 180)
+    hsv[:, 1] *= factor
+    rgb = np.where(
+        (distance <= focus_range)[:, None], palette.array, Palette.from_hsv(hsv).array
+    )
+
+    return rgb.astype(np.float32)
+
+
+def most_common_bucket(
+    hues: np.ndarray, size: float, weights: np.ndarray | None = None
+) -> tuple[float, float]:
+    """Return the size-bucket in [0, 360) containing the most hues
+
+    If weights are given, the bucket with the greatest total weight of hues is returned
+    instead. Ties go to the bucket whose first hue comes first.
+    """
+    buckets = np.array(utils.buckets(0, 360, size))
+    index = np.searchsorted(buckets[:, 0], hues, side="right") - 1
+    in_bucket = (index >= 0) & (hues < buckets[index.clip(0), 1])
+    indices, first, inverse = np.unique(
+        index[in_bucket], return_index=True, return_inverse=True
+    )
+    counts = np.bincount(
+        inverse.reshape(-1), weights=None if weights is None else weights[in_bucket]
+    )
+    winners = np.flatnonzero(counts == counts.max())
+    winner = indices[winners[np.argmin(first[winners])]]
+
+    return tuple(buckets[winner].tolist())
@@ -4,13 +4,22 @@ from configparser import ConfigParser
 
 import numpy as np
 
-from larry.color import Color, ColorList
+from larry.filters.pipeline import (
+    array_filter,
+    color_weights,
+    order_preserving,
+    to_array,
+)
+from larry.filters.types import ColorArray
+from larry.palette import Palette
 
 
-def cfilter(orig_colors: ColorList, _config: ConfigParser) -> ColorList:
+@order_preserving
+@array_filter
+def cfilter(orig_colors: ColorArray, _config: ConfigParser) -> ColorArray:
     """Adjust the colors to achieve a more harmonious color scheme"""
-    normalized = np.array(orig_colors) / 255
-    average = normalized.mean(axis=0)
+    normalized = Palette(orig_colors).channels() / 255
+    average = np.average(normalized, axis=0, weights=color_weights(orig_colors))
     adjusted = np.clip(normalized + (average - normalized) * 0.5, 0, 1) * 255
 
-    return [Color.from_array(carray) for carray in adjusted]
+    return to_array(Palette(adjusted))
@@ -2,10 +2,14 @@
 
 from configparser import ConfigParser
 
-from larry import Color, ColorList
+from larry import Color, Palette
+from larry.filters.pipeline import array_filter, pointwise, to_array
+from larry.filters.types import ColorArray
 
 
-def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
+@pointwise
+@array_filter
+def cfilter(orig_colors: ColorArray, config: ConfigParser) -> ColorArray:
     """Apply a color filter over the colors"""
     color_str = config.get("filters:colorify", "color", fallback="#ff0000")
     color = Color(color_str)
@@ -14,5 +18,14 @@ def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
         color = color.pastelize()
 
     fix_bw = config.getboolean("filters:colorify", "fix_bw", fallback=False)
+    rgb = Palette(orig_colors).array.copy()
 
-    return [orig_color.colorify(color, fix_bw) for orig_color in orig_colors]
+    if fix_bw:
+        # black and white don't make good HSV values, so we make them imperfect
+        rgb[(rgb == 255).all(axis=1)] = 254
+        rgb[(rgb == 0).all(axis=1)] = 1
+
+    hsv = Palette(rgb).to_hsv()
+    hsv[:, 0] = color.to_hsv()[0]
+
+    return to_array(Palette.from_hsv(hsv))
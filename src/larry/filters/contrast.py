@@ -2,11 +2,17 @@
 
 from configparser import ConfigParser
 
-from larry import ColorList
+import numpy as np
 
+from larry.filters.pipeline import array_filter, order_preserving, to_array
+from larry.filters.types import ColorArray
+from larry.palette import Palette
 
-def cfilter(orig_colors: ColorList, _config: ConfigParser) -> ColorList:
+
+@order_preserving
+@array_filter
+def cfilter(orig_colors: ColorArray, _config: ConfigParser) -> ColorArray:
     """The darks are so dark and the brights are so bright"""
     step = 255 / len(orig_colors)
 
-    return [color.luminize(i * step) for i, color in enumerate(orig_colors)]
+    return to_array(Palette(orig_colors).luminize(np.arange(len(orig_colors)) * step))
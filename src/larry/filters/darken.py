@@ -5,9 +5,11 @@ from configparser import ConfigParser
 from larry import Color, ColorList
 from larry.color import combine_colors as combine
 
+from .pipeline import order_preserving
 from .utils import get_opacity, new_image_colors
 
 
+@order_preserving
 def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
     """Darkens colors with the darkest of two colors"""
     opacity = get_opacity(config, "darken")
@@ -7,9 +7,11 @@ from larry import ColorList
 from larry.color import combine_colors as combine
 
 from . import FilterError
+from .pipeline import order_preserving
 from .utils import get_opacity, new_image_colors
 
 
+@order_preserving
 def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
     """Dissolve image into colors from another image"""
     aux_colors = new_image_colors(orig_colors, config, "dissolve")
@@ -2,16 +2,15 @@
 
 from configparser import ConfigParser
 
-from larry import Color, ColorList
+from larry.filters.pipeline import hsv_filter, pointwise
+from larry.filters.types import HSVArray
 
 
-def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
+@pointwise
+@hsv_filter
+def cfilter(hsv: HSVArray, config: ConfigParser) -> HSVArray:
     """Convert colors to grayscale"""
-    colors: ColorList = []
     new_saturation = config.getfloat("filters:grayscale", "saturation", fallback=0.0)
+    hsv[:, 1] = new_saturation
 
-    for color in orig_colors:
-        hue, _, value = color.to_hsv()
-        colors.append(Color.from_hsv((hue, new_saturation, value)))
-
-    return colors
+    return hsv
@@ -4,21 +4,22 @@ import random
 import sys
 from configparser import ConfigParser
 
-from larry.color import Color, ColorList
+from larry.filters.pipeline import hsv_filter, pointwise
+from larry.filters.types import HSVArray
 
 DEFAULT_AMOUNT = -90.0
 
 
-def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
+@pointwise
+@hsv_filter
+def cfilter(hsv: HSVArray, config: ConfigParser) -> HSVArray:
     """Shift the hues of each color by a given amount"""
     amount_str = config.get("filters:hueshift", "amount", fallback="")
     amount = get_amount(amount_str)
 
-    return [
-        Color.from_hsv((((h + amount) % 360), s, v))
-        for color in orig_colors
-        for h, s, v in [color.to_hsv()]
-    ]
+    hsv[:, 0] = (hsv[:, 0] + amount) % 360
+
+    return hsv
 
 
 def get_amount(amount_str: str, default: float = DEFAULT_AMOUNT) -> float:
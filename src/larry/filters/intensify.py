@@ -2,11 +2,22 @@
 
 from configparser import ConfigParser
 
-from larry.color import ColorList
+import numpy as np
 
+from larry.filters.pipeline import hsv_filter, pointwise
+from larry.filters.types import HSVArray
 
-def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
+
+@pointwise
+@hsv_filter
+def cfilter(hsv: HSVArray, config: ConfigParser) -> HSVArray | None:
     """Intensifies the colors (increases saturation)"""
     amount = config.getfloat("filters:intensify", "percent", fallback=50.0) / 100
 
-    return [color.intensify(amount) for color in orig_colors]
+    if amount == 0:
+        # avoid rounding issues
+        return None
+
+    hsv[:, 1] = np.trunc(np.clip((1 + amount) * hsv[:, 1], 0, 255))
+
+    return hsv
@@ -2,9 +2,12 @@
 
 from configparser import ConfigParser
 
-from larry import ColorList
+from larry.filters.pipeline import array_filter, pointwise
+from larry.filters.types import ColorArray
 
 
-def cfilter(orig_colors: ColorList, _config: ConfigParser) -> ColorList:
+@pointwise
+@array_filter
+def cfilter(orig_colors: ColorArray, _config: ConfigParser) -> ColorArray:
     """Return orig_colors inversed"""
-    return [i.inverse() for i in orig_colors]
+    return 255 - orig_colors
@@ -2,11 +2,15 @@
 
 from configparser import ConfigParser
 
-from larry.color import ColorList
+from larry.filters.pipeline import array_filter, pointwise, to_array
+from larry.filters.types import ColorArray
+from larry.palette import Palette
 
 
-def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
+@pointwise
+@array_filter
+def cfilter(orig_colors: ColorArray, config: ConfigParser) -> ColorArray:
     """Give all the colors the same luminocity"""
     luminance = config.getfloat("filters:luminize", "luminance", fallback=178.5)
 
-    return [color.luminize(luminance) for color in orig_colors]
+    return to_array(Palette(orig_colors).luminize(luminance))
@@ -0,0 +1,241 @@
+"""Lookup tables of pointwise filter chains
+
+A chain of @pointwise filters maps each color on its own, so it can be evaluated once on
+a lattice of RGB colors and then applied to any number of colors (or pixels) with a
+table lookup and trilinear interpolation. An "exact" table holds all 256³ colors and
+needs no interpolation.
+
+The lattice size is given by the [larry] lut option (e.g. 33, 65 or exact). Compiled
+tables are kept in memory and in the PaletteStore, keyed by the filters and their
+config. Exact tables (48 MiB) are only kept in memory, as they would nearly fill the
+store.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+from configparser import ConfigParser
+from typing import Iterator, Sequence
+
+import numpy as np
+from numpy.typing import NDArray
+
+from larry import LOGGER, __version__
+from larry.cache import PaletteStore
+from larry.filters import pipeline
+from larry.filters.types import ColorArray, Filter
+from larry.palette import Palette
+
+EXACT = 256
+
+# Maximum number of lattice colors passed through the filters at once when compiling
+CHUNK_SIZE = 1 << 20
+
+# Number of recently used LUTs kept in memory, keyed by lut_key() (see load_lut())
+MAX_LUTS = 4
+LUTS: OrderedDict[str, LUT] = OrderedDict()
+LUTS_LOCK = threading.Lock()
+
+Steps = Sequence[tuple[Filter, ConfigParser]]
+
+
+class LUT:
+    """A 3D lookup table of RGB colors
+
+    table[i, j, k] is the color that the lattice color (coords[i], coords[j], coords[k])
+    maps to.
+    """
+
+    def __init__(self, table: NDArray[np.uint8]) -> None:
+        self.table = table
+        self.coords = lattice(len(table))
+
+        # The lower lattice index and interpolation weight of each channel value
+        values = np.arange(256)
+        self.index = np.clip(
+            np.searchsorted(self.coords, values, side="right") - 1, 0, self.size - 2
+        )
+        low = self.coords[self.index]
+        self.weight = (values - low) / (self.coords[self.index + 1] - low)
+
+    @property
+    def size(self) -> int:
+        """The number of lattice points along each axis"""
+        return len(self.table)
+
+    @classmethod
+    def compile(cls, steps: Steps, size: int) -> LUT:
+        """Evaluate the (pointwise) filter steps on a lattice of the given size"""
+        coords = lattice(size).astype(np.float32)
+        table = np.empty((size, size, size, 3), dtype=np.uint8)
+        rows = max(CHUNK_SIZE // size**2, 1)
+
+        for start in range(0, size, rows):
+            grid = np.meshgrid(
+                coords[start : start + rows], coords, coords, indexing="ij"
+            )
+            colors = np.stack(grid, axis=-1).reshape(-1, 3)
+            new = Palette(pipeline.run_array(colors, steps)).array
+            table[start : start + rows] = new.reshape(-1, size, size, 3)
+
+        return cls(table)
+
+    def apply(self, colors: ColorArray) -> ColorArray:
+        """Map the colors, an array of shape (..., 3), through the table"""
+        rgb = Palette(colors.reshape(-1, 3)).array
+
+        if self.size == EXACT:
+            new = self.table[rgb[:, 0], rgb[:, 1], rgb[:, 2]].astype(np.float32)
+        else:
+            new = self.interpolate(rgb).astype(np.float32)
+
+        return new.reshape(colors.shape)
+
+    def interpolate(self, rgb: NDArray[np.uint8]) -> NDArray[np.float64]:
+        """Return the table trilinearly interpolated at the given (N, 3) colors"""
+        strides = np.array([self.size**2, self.size, 1])
+        table = self.table.reshape(-1, 3)
+        base = self.index[rgb] @ strides
+        weight = self.weight[rgb]
+        new = np.zeros(rgb.shape, dtype=np.float64)
+
+        for corner in itertools.product((0, 1), repeat=3):
+            offset = np.array(corner)
+            corner_weight = np.where(offset, weight, 1 - weight).prod(axis=1)
+            new += corner_weight[:, None] * table[base + offset @ strides]
+
+        return np.rint(new)
+
+
+def lattice(size: int) -> NDArray[np.float64]:
+    """Return the (whole) RGB values of the lattice points along each axis"""
+    return np.rint(np.linspace(0, 255, size))
+
+
+def lut_size(config: ConfigParser) -> int | None:
+    """Return the lattice size given by the config's lut option
+
+    Return None if lookup tables are not to be used.
+    """
+    value = config.get("larry", "lut", fallback="").strip().lower()
+
+    if value in ("", "off"):
+        return None
+
+    if value == "exact":
+        return EXACT
+
+    try:
+        size = int(value)
+    except ValueError:
+        size = 0
+
+    if not 2 <= size <= EXACT:
+        LOGGER.warning("Invalid lut size %r. Not using lookup tables.", value)
+        return None
+
+    return size
+
+
+def compile_chain(
+    chain: pipeline.Chain, size: int, store: PaletteStore | None = None
+) -> Iterator[tuple[Filter, ConfigParser]]:
+    """Replace each run of pointwise filters in the chain with a lookup table filter
+
+    @volatile filters and runs having "random" config values are left alone since
+    their output is not reproducible.
+    """
+    for _, group in itertools.groupby(chain, key=lambda step: compilable(step[0])):
+        steps = list(group)
+
+        if not compilable(steps[0][0]) or is_random(steps):
+            yield from steps
+            continue
+
+        yield lut_filter(load_lut(steps, size, store)), steps[0][1]
+
+
+def load_lut(steps: Steps, size: int, store: PaletteStore | None = None) -> LUT:
+    """Return the LUT of the filter steps
+
+    Recently used LUTs are kept in memory (see MAX_LUTS). Others are taken from (or
+    saved to) the given store, except exact LUTs, which are only compiled.
+    """
+    key = lut_key(steps, size)
+
+    with LUTS_LOCK:
+        if (lut := LUTS.get(key)) is not None:
+            LUTS.move_to_end(key)
+            return lut
+
+    if size == EXACT:
+        store = None
+
+    if (
+        store is not None
+        and (table := store.load_lut(key)) is not None
+        and table.shape == (size,) * 3 + (3,)
+    ):
+        lut = LUT(table)
+    else:
+        lut = LUT.compile(steps, size)
+
+        if store is not None:
+            store.save_lut(key, lut.table)
+
+    with LUTS_LOCK:
+        LUTS[key] = lut
+
+        while len(LUTS) > MAX_LUTS:
+            LUTS.popitem(last=False)
+
+    return lut
+
+
+def lut_filter(lut: LUT) -> Filter:
+    """Return an array filter that maps colors through the given LUT"""
+
+    @pipeline.pointwise
+    @pipeline.array_filter
+    def cfilter(colors: ColorArray, _config: ConfigParser) -> ColorArray:
+        return lut.apply(colors)
+
+    return cfilter
+
+
+def lut_key(steps: Steps, size: int) -> str:
+    """Return the store key of the LUT of the filter steps"""
+    digest = hashlib.sha256(f"{__version__}\n{size}".encode())
+
+    for cfilter, config in steps:
+        digest.update(f"\n{cfilter.__module__}.{cfilter.__qualname__}\n".encode())
+        digest.update(repr(filter_sections(config)).encode())
+
+    return digest.hexdigest()
+
+
+def compilable(cfilter: Filter) -> bool:
+    """Return True if the given filter can be compiled into a lookup table"""
+    return pipeline.is_pointwise(cfilter) and not pipeline.is_volatile(cfilter)
+
+
+def is_random(steps: Steps) -> bool:
+    """Return True if any of the steps' filters are configured with "random" values"""
+    return any(
+        value.strip() == "random"
+        for _, config in steps
+        for _, options in filter_sections(config)
+        for _, value in options
+    )
+
+
+def filter_sections(config: ConfigParser) -> list[tuple[str, list[tuple[str, str]]]]:
+    """Return the config's filter sections along with their (sorted) options"""
+    return [
+        (name, sorted(config.items(name, raw=True)))
+        for name in sorted(config.sections())
+        if name.startswith("filters:")
+    ]
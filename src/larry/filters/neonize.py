@@ -2,16 +2,18 @@
 
 from configparser import ConfigParser
 
-from larry import Color, ColorList
+from larry.filters.pipeline import hsv_filter, pointwise
+from larry.filters.types import HSVArray
 
 
-def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
+@pointwise
+@hsv_filter
+def cfilter(hsv: HSVArray, config: ConfigParser) -> HSVArray:
     """Return the colors neonized"""
     saturation = config.getfloat("filters:neonize", "saturation", fallback=100.0)
     brightness = config.getfloat("filters:neonize", "brightness", fallback=100.0)
 
-    return [
-        Color.from_hsv((h, saturation, brightness))
-        for c in orig_colors
-        for h in [c.to_hsv()[0]]
-    ]
+    hsv[:, 1] = saturation
+    hsv[:, 2] = brightness
+
+    return hsv
@@ -3,8 +3,10 @@
 from configparser import ConfigParser
 
 from larry import ColorList
+from larry.filters.pipeline import order_preserving
 
 
+@order_preserving
 def cfilter(orig_colors: ColorList, _config: ConfigParser) -> ColorList:
     """A NO-OP filter
 
@@ -2,9 +2,16 @@
 
 from configparser import ConfigParser
 
-from larry import ColorList
+from larry.color import PASTEL_BRIGHTNESS, PASTEL_SATURATION
+from larry.filters.pipeline import hsv_filter, pointwise
+from larry.filters.types import HSVArray
 
 
-def cfilter(orig_colors: ColorList, _config: ConfigParser) -> ColorList:
+@pointwise
+@hsv_filter
+def cfilter(hsv: HSVArray, _config: ConfigParser) -> HSVArray:
     """Pastelize all the original colors"""
-    return [orig_color.pastelize() for orig_color in orig_colors]
+    hsv[:, 1] = PASTEL_SATURATION
+    hsv[:, 2] = PASTEL_BRIGHTNESS
+
+    return hsv
@@ -0,0 +1,369 @@
+"""Filter chains
+
+Filters come in two flavors. The original ("list") filters take and return a ColorList.
+Array filters take and return a ColorArray and are declared with the @array_filter
+decorator. When filters are chained, consecutive array filters pass arrays to each
+other and colors are only converted at the boundaries with list filters.
+
+HSV filters are array filters that only transform HSV values and are declared with the
+@hsv_filter decorator. Consecutive HSV filters can be fused (see fuse()): the colors
+are converted to HSV once, passed through each transform and converted back once. This
+skips the rounding to integer RGB values between the filters, so the output can differ
+slightly from that of running the filters one at a time.
+
+Filters that map each color independently of the others are declared with the
+@pointwise decorator. Chains of such filters can be compiled into lookup tables (see
+larry.filters.lut), unless they are also declared @volatile: their output changes from
+one run to the next (e.g. with the time of day) even if the config doesn't.
+
+The colors being filtered may have weights, e.g. the number of pixels of each color in
+the image (see weighted()). Filters that compute statistics of the colors, like their
+average, can take these into account with color_weights(). The weights belong to the
+very list (or array) of colors they were given for, and run() passes them on to the
+output of each filter that keeps the colors in place: @pointwise filters and those
+declared @order_preserving. The weights go by position, so they are dropped once the
+colors pass through any other filter (which may reorder, add or remove colors).
+"""
+
+import contextlib
+import functools
+import itertools
+from collections.abc import Sized
+from configparser import ConfigParser
+from contextvars import ContextVar
+from typing import Callable, Iterable, Iterator, Sequence, TypeVar
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from larry.color import Color, ColorList
+from larry.filters.types import ArrayFilter, ColorArray, Filter, HSVArray, HSVFilter
+from larry.hsvtable import HSVTable
+from larry.palette import Palette
+
+Chain = Iterable[tuple[Filter, ConfigParser]]
+Transforms = Sequence[tuple[HSVFilter, ConfigParser]]
+
+# The hue rgb_to_hsv() gives grays
+GRAY_HUE = 359.0
+
+# The weighted colors and their weights (see weighted())
+WEIGHTS: ContextVar[tuple[Sized, NDArray[np.float64]] | None] = ContextVar(
+    "weights", default=None
+)
+
+ColorsT = TypeVar("ColorsT", ColorList, ColorArray)
+NewColorsT = TypeVar("NewColorsT", ColorList, ColorArray)
+
+
+def array_filter(func: ArrayFilter) -> Filter:
+    """Decorator to declare the given function an array filter
+
+    The decorated function can still be called as a list filter. The array filter
+    itself is its array attribute.
+    """
+
+    @functools.wraps(func)
+    def cfilter(colors: ColorList, config: ConfigParser) -> ColorList:
+        array = to_array(colors)
+
+        with weighted(array, color_weights(colors)):
+            return to_colors(func(array, config))
+
+    setattr(cfilter, "array", func)
+
+    return cfilter
+
+
+def get_array_filter(cfilter: Filter) -> ArrayFilter | None:
+    """Return the array filter of the given filter, if it has one"""
+    return getattr(cfilter, "array", None)
+
+
+def hsv_filter(func: HSVFilter) -> Filter:
+    """Decorator to declare the given function an HSV filter
+
+    The function is given, and may modify in place, an array of HSV values and returns
+    the transformed HSV values (or None to leave the colors unchanged). The decorated
+    function can still be called as a list filter or (via its array attribute) as an
+    array filter. The transform itself is its hsv attribute.
+    """
+
+    @functools.wraps(func)
+    def afilter(colors: ColorArray, config: ConfigParser) -> ColorArray:
+        return apply_hsv(colors, func, config)
+
+    cfilter = array_filter(afilter)
+    setattr(cfilter, "hsv", func)
+
+    return cfilter
+
+
+def get_hsv_filter(cfilter: Filter) -> HSVFilter | None:
+    """Return the HSV transform of the given filter, if it has one"""
+    return getattr(cfilter, "hsv", None)
+
+
+def apply_hsv(
+    colors: ColorArray,
+    transform: HSVFilter,
+    config: ConfigParser,
+    hsv_table: HSVTable | None = None,
+) -> ColorArray:
+    """Pass the colors through the HSV transform
+
+    The colors are converted to HSV with the given HSVTable, if any. If the transform
+    returns None the colors are returned unchanged.
+    """
+    if (hsv := transform(Palette(colors).to_hsv(hsv_table), config)) is None:
+        return colors
+
+    return to_array(Palette.from_hsv(hsv))
+
+
+def fuse(chain: Chain) -> Iterator[tuple[Filter, ConfigParser]]:
+    """Replace each run of HSV filters in the chain with a single HSV filter
+
+    The colors are then converted to and from HSV once per run instead of once per
+    filter.
+    """
+    for _, group in itertools.groupby(chain, key=lambda step: is_hsv_filter(step[0])):
+        steps = list(group)
+
+        if len(steps) == 1 or not is_hsv_filter(steps[0][0]):
+            yield from steps
+            continue
+
+        transforms = [(getattr(cfilter, "hsv"), config) for cfilter, config in steps]
+        fused = hsv_filter(compose(transforms))
+
+        if all(is_pointwise(cfilter) for cfilter, _ in steps):
+            fused = pointwise(fused)
+        if any(is_volatile(cfilter) for cfilter, _ in steps):
+            fused = volatile(fused)
+
+        yield fused, steps[0][1]
+
+
+def compose(transforms: Transforms) -> HSVFilter:
+    """Return an HSV transform that applies each of the transforms (with its config)
+
+    Between the transforms the HSV values are normalized as converting them to RGB and
+    back would (see normalize()), but not rounded. The composed transform returns None
+    if all of the transforms do.
+    """
+
+    def transform(hsv: HSVArray, _config: ConfigParser) -> HSVArray | None:
+        changed = False
+
+        for func, config in transforms:
+            if changed:
+                normalize(hsv)
+            if (result := func(hsv, config)) is not None:
+                hsv, changed = result, True
+
+        return hsv if changed else None
+
+    return transform
+
+
+def normalize(hsv: HSVArray) -> None:
+    """Normalize, in place, the HSV values as converting them to RGB and back would
+
+    Black has no saturation and grays get the GRAY_HUE. Colors whose saturation or
+    value is out of range are clipped in RGB, so those are converted to RGB and back.
+    """
+    out_of_range = ((hsv[:, 1:] < 0) | (hsv[:, 1:] > 100)).any(axis=1)
+
+    if out_of_range.any():
+        hsv[out_of_range] = Palette.from_hsv(hsv[out_of_range]).to_hsv()
+
+    hsv[hsv[:, 2] == 0, 1] = 0
+    hsv[hsv[:, 1] == 0, 0] = GRAY_HUE
+
+
+def is_hsv_filter(cfilter: Filter) -> bool:
+    """Return True if the given filter is an HSV filter"""
+    return get_hsv_filter(cfilter) is not None
+
+
+def pointwise(cfilter: Filter) -> Filter:
+    """Decorator to declare that the given filter maps each color on its own
+
+    That is, the new value of each color depends only on that color (and the config)
+    and not on the other colors.
+    """
+    setattr(cfilter, "pointwise", True)
+
+    return cfilter
+
+
+def is_pointwise(cfilter: Filter) -> bool:
+    """Return True if the given filter was declared @pointwise"""
+    return getattr(cfilter, "pointwise", False)
+
+
+def volatile(cfilter: Filter) -> Filter:
+    """Decorator to declare that the given filter's output can change from run to run
+
+    That is, the output depends on more than the colors and the config (e.g. on the
+    time of day), so it must not be cached.
+    """
+    setattr(cfilter, "volatile", True)
+
+    return cfilter
+
+
+def is_volatile(cfilter: Filter) -> bool:
+    """Return True if the given filter was declared @volatile"""
+    return getattr(cfilter, "volatile", False)
+
+
+def order_preserving(cfilter: Filter) -> Filter:
+    """Decorator to declare that the given filter keeps the colors in place
+
+    That is, each new color is the new value of the color in the same position, though
+    it may depend on the other colors. @pointwise filters keep the colors in place too.
+    """
+    setattr(cfilter, "order_preserving", True)
+
+    return cfilter
+
+
+def is_order_preserving(cfilter: Filter) -> bool:
+    """Return True if the given filter keeps the colors in place"""
+    return is_pointwise(cfilter) or getattr(cfilter, "order_preserving", False)
+
+
+def to_array(colors: Iterable[Color] | Palette) -> ColorArray:
+    """Convert the colors into a ColorArray"""
+    if not isinstance(colors, Palette):
+        colors = Palette.from_colors(colors)
+
+    return colors.array.astype(np.float32)
+
+
+def to_colors(array: ColorArray) -> ColorList:
+    """Convert the ColorArray into a ColorList"""
+    return Palette(array).to_colors()
+
+
+def run(
+    colors: ColorList, chain: Chain, hsv_table: HSVTable | None = None
+) -> ColorList:
+    """Pass the colors through the chain of (filter, config)s
+
+    HSV filters convert the colors with the given HSVTable, if any. Return the new
+    ColorList
+    """
+    array: ColorArray | None = None
+
+    for cfilter, config in chain:
+        if (func := step_filter(cfilter, hsv_table)) is None:
+            if array is not None:
+                colors, array = pass_weights(array, to_colors(array)), None
+            colors = run_step(cfilter, cfilter, colors, config)
+        else:
+            if array is None:
+                array = pass_weights(colors, to_array(colors))
+            array = run_step(cfilter, func, array, config)
+
+    return colors if array is None else pass_weights(array, to_colors(array))
+
+
+def step_filter(cfilter: Filter, hsv_table: HSVTable | None) -> ArrayFilter | None:
+    """Return the array filter to run the filter with (None for list filters)
+
+    HSV filters are run with the given HSVTable.
+    """
+    if hsv_table is None or (transform := get_hsv_filter(cfilter)) is None:
+        return get_array_filter(cfilter)
+
+    def func(colors: ColorArray, config: ConfigParser) -> ColorArray:
+        return apply_hsv(colors, transform, config, hsv_table)
+
+    return func
+
+
+def run_step(
+    cfilter: Filter,
+    func: Callable[[ColorsT, ConfigParser], ColorsT],
+    colors: ColorsT,
+    config: ConfigParser,
+) -> ColorsT:
+    """Pass the colors through func, the list or array filter of the given filter
+
+    The colors' weights are passed on to the new colors if the filter keeps the colors
+    in place (see is_order_preserving()) and dropped otherwise.
+    """
+    new = func(colors, config)
+
+    if is_order_preserving(cfilter):
+        pass_weights(colors, new)
+    elif color_weights(new) is not None:
+        # The filter moved the colors around in place
+        WEIGHTS.set(None)
+
+    return new
+
+
+@contextlib.contextmanager
+def weighted(colors: Sized, weights: ArrayLike | None) -> Iterator[None]:
+    """Give the colors the given weights within the context
+
+    The weights are those of the given ColorList (or ColorArray) only, not of any other
+    colors, however many there are. They go by position: the first weight is that of
+    the first color and so on. None means the colors are not weighted.
+    """
+    token = WEIGHTS.set(
+        None if weights is None else (colors, np.asarray(weights, dtype=np.float64))
+    )
+
+    try:
+        yield
+    finally:
+        WEIGHTS.reset(token)
+
+
+def color_weights(colors: Sized) -> NDArray[np.float64] | None:
+    """Return the weight of each of the given colors
+
+    Return None if the colors are not weighted (or the weights are not for as many
+    colors).
+    """
+    if (
+        (entry := WEIGHTS.get()) is None
+        or entry[0] is not colors
+        or len(entry[1]) != len(colors)
+    ):
+        return None
+
+    return entry[1]
+
+
+def pass_weights(colors: Sized, new: NewColorsT) -> NewColorsT:
+    """Give the new colors the weights of the given colors, if any, and return them
+
+    The new colors are taken to be the given colors in the same order (e.g. converted to
+    or from a ColorArray). The weights remain until the end of the weighted() context.
+    """
+    if (weights := color_weights(colors)) is not None:
+        WEIGHTS.set((new, weights))
+
+    return new
+
+
+def run_array(
+    array: ColorArray, chain: Chain, hsv_table: HSVTable | None = None
+) -> ColorArray:
+    """Like run() but for a ColorArray"""
+    for cfilter, config in chain:
+        if (func := step_filter(cfilter, hsv_table)) is None:
+            colors = run_step(
+                cfilter, cfilter, pass_weights(array, to_colors(array)), config
+            )
+            array = pass_weights(colors, to_array(colors))
+        else:
+            array = run_step(cfilter, func, array, config)
+
+    return array
@@ -4,8 +4,10 @@ import random
 from configparser import ConfigParser
 
 from larry import ColorList
+from larry.filters.pipeline import order_preserving
 
 
+@order_preserving
 def cfilter(orig_colors: ColorList, _config: ConfigParser) -> ColorList:
     """Each color is darkened/lightened by a random value"""
     return [i.luminize(random.randint(0, 255)) for i in orig_colors]
@@ -2,25 +2,103 @@
 
 import random
 from configparser import ConfigParser
+from typing import Any
 
-from larry import ColorList
+import numpy as np
+from numpy.typing import ArrayLike
 
-from .utils import closest_color
+from larry import ColorList, quantize
+from larry.nearest import DEFAULT_SPACE, ColorIndex, get_converter
+from larry.palette import Palette
 
+from .pipeline import color_weights, order_preserving
+from .types import FilterError
 
+DEFAULT_METHOD = "random"
+
+
+@order_preserving
 def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
-    """Reduce the number of distinct colors"""
+    """Reduce the number of distinct colors
+
+    The "method" option says how the representative colors are chosen:
+
+        random: a random choice of the colors (the default)
+        mediancut, octree, kmeans, minibatch, histogram: the colors are quantized (see
+            larry.quantize)
+
+    Both take the weights of the colors, if any, into account.
+
+    Each color is replaced by the nearest of the representative colors, as measured in
+    the color space given by the "distance" option (or the [larry] distance option).
+    """
     default_amount = 64
     amount = config.getint("filters:reduce", "amount", fallback=default_amount)
+    method = config.get("filters:reduce", "method", fallback=DEFAULT_METHOD)
+    space = config.get(
+        "filters:reduce",
+        "distance",
+        fallback=config.get("larry", "distance", fallback=DEFAULT_SPACE),
+    )
+
+    try:
+        get_converter(space)
+    except ValueError as error:
+        raise FilterError(str(error)) from error
+
+    if method != DEFAULT_METHOD and method not in quantize.QUANTIZERS:
+        raise FilterError(f"Unknown reduce method: {method!r}")
 
     num_colors = len(orig_colors)
     if amount == 0 or num_colors <= amount:
         return orig_colors
 
+    if method != DEFAULT_METHOD:
+        return quantized(orig_colors, amount, method, space, config)
+
+    weights = color_weights(orig_colors)
     colors = list(orig_colors)
-    selected_colors: ColorList = random.choices(colors, k=amount)
+    selected_colors: ColorList = random.choices(
+        colors, weights=None if weights is None else weights.tolist(), k=amount
+    )
+
+    index = ColorIndex(selected_colors, space)
+
+    return [selected_colors[i] for i in index.query(colors)]
+
+
+def quantized(
+    colors: ColorList, amount: int, method: str, space: str, config: ConfigParser
+) -> ColorList:
+    """Replace the colors with the nearest of the quantized colors
+
+    The colors are quantized (in RGB) by their distinct values, weighted by how often
+    each occurs (and by the weights of the colors, if any).
+    """
+    distinct, counts, inverse = quantize.distinct(Palette.from_colors(colors).array)
+    totals: ArrayLike = counts
+
+    if (weights := color_weights(colors)) is not None:
+        totals = np.bincount(inverse, weights=weights, minlength=len(distinct))
+
+    if len(distinct) <= amount:
+        return colors
+
+    options: dict[str, Any] = {}
+    if method in ("kmeans", "minibatch"):
+        options["seed"] = config.getint(
+            "filters:reduce", "seed", fallback=quantize.DEFAULT_SEED
+        )
+    if method == "kmeans":
+        options["iterations"] = config.getint(
+            "filters:reduce", "iterations", fallback=quantize.DEFAULT_ITERATIONS
+        )
+        # A timeout makes the result depend on the machine's speed, so it's opt-in
+        options["timeout"] = config.getfloat("filters:reduce", "timeout", fallback=None)
+
+    centers = Palette(
+        np.rint(quantize.QUANTIZERS[method](distinct, totals, amount, **options))
+    ).array
+    nearest = ColorIndex(centers, space).query(distinct)
 
-    return [
-        color if color in selected_colors else closest_color(color, selected_colors)
-        for color in colors
-    ]
+    return Palette(centers[nearest][inverse]).to_colors()
@@ -5,8 +5,12 @@ import sys
 from configparser import ConfigParser
 from dataclasses import dataclass
 
-from larry.color import Color, ColorList
-from larry.utils import clamp
+import numpy as np
+
+from larry.color import Color
+from larry.filters.pipeline import array_filter, pointwise, to_array
+from larry.filters.types import ColorArray
+from larry.palette import Palette
 
 
 @dataclass
@@ -25,7 +29,9 @@ CHANNELS = {
 }
 
 
-def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
+@pointwise
+@array_filter
+def cfilter(orig_colors: ColorArray, config: ConfigParser) -> ColorArray:
     """Apply a sepia effect to the given colors"""
     rc = Channel(
         get(config, "red_base"),
@@ -44,7 +50,9 @@ def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
     )
     amount = config.getfloat("filters:sepia", "amount", fallback=1.0)
 
-    return [blend(c, sepia(c, rc, gc, bc), amount) for c in orig_colors]
+    palette = Palette(orig_colors)
+
+    return to_array(blend_palettes(palette, sepia_palette(palette, rc, gc, bc), amount))
 
 
 def sepia(color: Color, rc: Channel, gc: Channel, bc: Channel) -> Color:
@@ -52,18 +60,24 @@ def sepia(color: Color, rc: Channel, gc: Channel, bc: Channel) -> Color:
 
     Given the channel coefficients
     """
-    return Color(
-        clamp(rc.base * color.red + rc.multiplier * color.green + bc.base * color.blue),
-        clamp(
-            rc.adjustment * color.red
-            + gc.base * color.green
-            + bc.multiplier * color.blue
-        ),
+    return sepia_palette(Palette.from_colors([color]), rc, gc, bc)[0]
+
+
+def sepia_palette(palette: Palette, rc: Channel, gc: Channel, bc: Channel) -> Palette:
+    """Like sepia() but for every color in the Palette"""
+    red, green, blue = palette.channels().T
+
+    return Palette(
         clamp(
-            bc.adjustment * color.red
-            + gc.multiplier * color.green
-            + bc.base * color.blue
-        ),
+            np.stack(
+                [
+                    rc.base * red + rc.multiplier * green + bc.base * blue,
+                    rc.adjustment * red + gc.base * green + bc.multiplier * blue,
+                    bc.adjustment * red + gc.multiplier * green + bc.base * blue,
+                ],
+                axis=1,
+            )
+        )
     )
 
 
@@ -72,17 +86,25 @@ def blend(orig_color: Color, sepia_color: Color, amount: float) -> Color:
 
     amount is between 0 and 1 where 1 is 100% sepia and 0 is 100% original.
     """
+    return blend_palettes(
+        Palette.from_colors([orig_color]), Palette.from_colors([sepia_color]), amount
+    )[0]
+
+
+def blend_palettes(orig: Palette, sepia_: Palette, amount: float) -> Palette:
+    """Like blend() but for every color in the Palettes"""
     if amount == 1:
-        return sepia_color
+        return sepia_
 
     if amount == 0:
-        return orig_color
+        return orig
 
-    return Color(
-        clamp((1 - amount) * orig_color.red + amount * sepia_color.red),
-        clamp((1 - amount) * orig_color.green + amount * sepia_color.green),
-        clamp((1 - amount) * orig_color.blue + amount * sepia_color.blue),
-    )
+    return Palette(clamp((1 - amount) * orig.channels() + amount * sepia_.channels()))
+
+
+def clamp(array: np.ndarray) -> np.ndarray:
+    """Vectorized utils.clamp()"""
+    return np.trunc(np.clip(array, 0, 255))
 
 
 def get(config: ConfigParser, name: str) -> float:
@@ -3,7 +3,7 @@
 import random
 from configparser import ConfigParser
 
-from larry import Color, ColorList
+from larry import ColorList, Palette
 
 
 def cfilter(orig_colors: ColorList, _config: ConfigParser) -> ColorList:
@@ -11,15 +11,14 @@ def cfilter(orig_colors: ColorList, _config: ConfigParser) -> ColorList:
 
     But keep the same saturation and brightness as the original
     """
-    colors = []
+    shuffled = []
 
     for orig_color in orig_colors:
         rgb = [*orig_color]
         random.shuffle(rgb)
-        tmp_color = Color(*rgb)
-        saturation, brightness = orig_color.to_hsv()[1:]
-        hue = tmp_color.to_hsv()[0]
-        color = Color.from_hsv((hue, saturation, brightness))
-        colors.append(color)
+        shuffled.append(rgb)
 
-    return colors
+    hsv = Palette.from_colors(orig_colors).to_hsv()
+    hsv[:, 0] = Palette(shuffled).to_hsv()[:, 0]
+
+    return Palette.from_hsv(hsv).to_colors()
@@ -6,8 +6,10 @@ import sys
 from configparser import ConfigParser
 
 from larry.color import Color, ColorList
+from larry.filters.pipeline import order_preserving
 
 
+@order_preserving
 def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
     """Change the hue by a ratio of its sine"""
     mode = config.get("filters:sine", "mode", fallback="sine")
@@ -2,12 +2,20 @@
 
 from configparser import ConfigParser
 
-from larry import ColorList
+import numpy as np
+
 from larry.color import DEFAULT_SOFTNESS
+from larry.filters.pipeline import hsv_filter, pointwise
+from larry.filters.types import HSVArray
 
 
-def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
+@pointwise
+@hsv_filter
+def cfilter(hsv: HSVArray, config: ConfigParser) -> HSVArray:
     """Soften all the original colors"""
     softness = config.getfloat("filters:soften", "softness", fallback=DEFAULT_SOFTNESS)
 
-    return [orig_color.soften(softness) for orig_color in orig_colors]
+    hsv[:, 1] *= 1 - softness
+    hsv[:, 2] = np.minimum(100, hsv[:, 2] + softness * (100 - hsv[:, 2]))
+
+    return hsv
@@ -4,8 +4,10 @@ import random
 from configparser import ConfigParser
 
 from larry import ColorList
+from larry.filters.pipeline import order_preserving
 
 
+@order_preserving
 def cfilter(orig_colors: ColorList, _config: ConfigParser) -> ColorList:
     """XXX"""
     color = random.choice(orig_colors)
@@ -6,7 +6,8 @@ from configparser import ConfigParser
 from enum import StrEnum, auto, unique
 from typing import TypeAlias
 
-from larry.color import Color, ColorList
+from larry.filters.pipeline import hsv_filter, pointwise, volatile
+from larry.filters.types import HSVArray
 from larry.filters.utils import parse_range
 
 
@@ -38,17 +39,17 @@ DEFAULT_FACTORS = {
 now = dt.datetime.now
 
 
-def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
+@volatile
+@pointwise
+@hsv_filter
+def cfilter(hsv: HSVArray, config: ConfigParser) -> HSVArray:
     """Adjust brightness according to the time of day"""
     time = now()
     factor = get_brightness_factor(time, config)
 
-    # return [next(palette).colorify(color) for color in orig_colors]
-    return [
-        Color.from_hsv((h, s, factor * v))
-        for color in orig_colors
-        for h, s, v in [color.to_hsv()]
-    ]
+    hsv[:, 2] = factor * hsv[:, 2]
+
+    return hsv
 
 
 def get_brightness_factor(time: dt.datetime, config: ConfigParser) -> float:
@@ -3,10 +3,21 @@
 from configparser import ConfigParser
 from typing import Callable
 
+import numpy as np
+from numpy.typing import NDArray
+
 from larry import ColorList
 
 Filter = Callable[[ColorList, ConfigParser], ColorList]
 
+# (N, 3) array of RGB values in [0, 255]
+ColorArray = NDArray[np.float32]
+ArrayFilter = Callable[[ColorArray, ConfigParser], ColorArray]
+
+# (N, 3) array of (Hue, Saturation, Value). Hue is in [0, 360), the others in [0, 100]
+HSVArray = NDArray[np.float64]
+HSVFilter = Callable[[HSVArray, ConfigParser], HSVArray | None]
+
 
 class FilterNotFound(LookupError):
     """Unable to find the requested filter"""
@@ -6,14 +6,12 @@ from configparser import ConfigParser
 from importlib.metadata import entry_points
 from itertools import cycle
 
-import numpy as np
-from scipy.spatial import distance
-
 from larry.color import Color, ColorList
 from larry.config import load as load_config
 from larry.filters.types import Filter, FilterError, FilterNotFound
 from larry.image import make_image_from_bytes
 from larry.io import read_file
+from larry.nearest import DEFAULT_SPACE, color_index
 
 
 def list_filters(config_path: str) -> str:
@@ -95,11 +93,12 @@ def new_image_colors(
     return [next(replacer_colors_cycle) for _ in range(count)]
 
 
-def closest_color(color: Color, colors: ColorList) -> Color:
-    """Given the list of Colors, return the one closest to the given color"""
-    distances = [distance.euclidean(color, c) for c in colors]
+def closest_color(color: Color, colors: ColorList, space: str = DEFAULT_SPACE) -> Color:
+    """Given the list of Colors, return the one closest to the given color
 
-    return colors[np.argmin(distances)]
+    Distances are measured in the given color space (see larry.nearest).
+    """
+    return colors[color_index(colors, space).nearest(color)]
 
 
 def parse_range(range_str: str) -> tuple[float, float] | None:
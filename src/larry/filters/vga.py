@@ -2,16 +2,18 @@
 
 from configparser import ConfigParser
 
-from larry import Color, ColorList
+import numpy as np
 
+from larry.filters.pipeline import array_filter, pointwise
+from larry.filters.types import ColorArray
 
-def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
+
+@pointwise
+@array_filter
+def cfilter(orig_colors: ColorArray, config: ConfigParser) -> ColorArray:
     """A blast from the past"""
     bits = config.getint("filters:vga", "bits", fallback=8)
     div = 256 / bits
+    rgb = orig_colors.astype(np.float64)
 
-    return [
-        Color(int(red // div * div), int(green // div * div), int(blue // div * div))
-        for color in orig_colors
-        for red, green, blue in [color]
-    ]
+    return np.trunc(rgb // div * div).astype(np.float32)
@@ -2,32 +2,37 @@
 
 from configparser import ConfigParser
 
-from larry.color import Color, ColorList
-from larry.utils import clamp
+import numpy as np
 
+from larry.filters.pipeline import array_filter, color_weights, order_preserving
+from larry.filters.types import ColorArray
+from larry.palette import Palette
 
-def cfilter(orig_colors: ColorList, config: ConfigParser) -> ColorList:
+
+@order_preserving
+@array_filter
+def cfilter(orig_colors: ColorArray, config: ConfigParser) -> ColorArray:
     """Make colors more vibrant
 
     Given a threshold value, and for colors below this threshold, increase saturation by
     a percentage of the difference between the threshold and the original saturation.
+    The threshold defaults to the (weighted) average saturation of the colors.
     """
-    colors: ColorList = []
+    palette = Palette(orig_colors)
+    hsv = palette.to_hsv()
+    saturation = hsv[:, 1].copy()
     threshold = config.getfloat("filters:vibrance", "threshold", fallback=None)
 
     if threshold is None:
-        threshold = sum(color.to_hsv()[1] for color in orig_colors) / len(orig_colors)
+        if (weights := color_weights(orig_colors)) is None:
+            threshold = sum(saturation.tolist()) / len(orig_colors)
+        else:
+            threshold = float(np.average(saturation, weights=weights))
 
     percentage = config.getint("filters:vibrance", "percent", fallback=20) * 0.01
+    below = saturation < threshold
+    new_s = saturation + percentage * (threshold - saturation)
+    hsv[:, 1] = np.trunc(np.clip(new_s, 0, 100))
+    rgb = np.where(below[:, None], Palette.from_hsv(hsv).array, palette.array)
 
-    for color in orig_colors:
-        h, s, v = color.to_hsv()
-
-        if s >= threshold:
-            colors.append(color)
-            continue
-
-        new_s = clamp(s + percentage * (threshold - s), maximum=100)
-        colors.append(Color.from_hsv((h, new_s, v)))
-
-    return colors
+    return rgb.astype(np.float32)
@@ -0,0 +1,124 @@
+"""Precomputed HSV values of every 24-bit RGB color
+
+The table is an (2²⁴, 3) float64 .npy file (384 MiB) in the cache directory, indexed by
+the packed (0xRRGGBB) color. It is generated the first time it's used and then
+memory-mapped, so converting colors to HSV is a gather, and all of the larry processes
+on the host share the same (page-cached) table.
+
+The values are exactly those of rgb_to_hsv() (smaller floats would change the colors),
+so using the table does not change the output. A table is passed to Palette.to_hsv()
+and the filter pipeline explicitly. The cli does so if the [larry] hsv_table option is
+set.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from numpy.typing import NDArray
+
+from larry.color import rgb_to_hsv
+
+# larry.LOGGER can't be imported here as the larry package imports this module
+LOGGER = logging.getLogger(__name__)
+
+FILENAME = "rgb_to_hsv64.npy"
+NUM_COLORS = 1 << 24
+
+# Number of colors converted at once when generating the table
+CHUNK_SIZE = 1 << 20
+
+
+class HSVTable:
+    """The (lazily generated) RGB to HSV table in the given directory"""
+
+    def __init__(self, directory: str | Path) -> None:
+        self.path = Path(directory) / FILENAME
+        self._table: NDArray[np.float64] | None = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def lookup(self, rgb: NDArray[np.uint8]) -> NDArray[np.float64]:
+        """Return the (N, 3) array of HSV values of the (N, 3) array of RGB values
+
+        If the table cannot be loaded or generated, the values are computed instead.
+        """
+        if (table := self.load()) is None:
+            return rgb_to_hsv(rgb)
+
+        index = (
+            (rgb[:, 0].astype(np.uint32) << 16)
+            | (rgb[:, 1].astype(np.uint32) << 8)
+            | rgb[:, 2]
+        )
+
+        return np.take(table, index, axis=0)
+
+    def load(self) -> NDArray[np.float64] | None:
+        """Return the memory-mapped table, generating it if it doesn't yet exist"""
+        with self._lock:
+            if self._table is None and not self._failed:
+                try:
+                    self._table = self._open()
+                except (OSError, ValueError) as error:
+                    LOGGER.warning("Not using HSV table %s: %s", self.path, error)
+                    self._failed = True
+
+            return self._table
+
+    def _open(self) -> NDArray[np.float64]:
+        try:
+            table = np.load(self.path, mmap_mode="r", allow_pickle=False)
+        except FileNotFoundError:
+            self.generate()
+            table = np.load(self.path, mmap_mode="r", allow_pickle=False)
+
+        if table.shape != (NUM_COLORS, 3) or table.dtype != np.float64:
+            raise ValueError(f"Unexpected table {table.dtype}{table.shape}")
+
+        return table
+
+    def generate(self) -> None:
+        """Write the table
+
+        The table is written to a temporary file and then moved into place, so other
+        processes never see a partially written table.
+        """
+        LOGGER.info("Generating HSV table %s", self.path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with tempfile.NamedTemporaryFile(
+            dir=self.path.parent, suffix=".tmp", delete=False
+        ) as tmp:
+            pass
+
+        try:
+            table = np.lib.format.open_memmap(
+                tmp.name, mode="w+", dtype=np.float64, shape=(NUM_COLORS, 3)
+            )
+            for start in range(0, NUM_COLORS, CHUNK_SIZE):
+                packed = np.arange(start, start + CHUNK_SIZE, dtype=np.uint32)
+                rgb = (packed[:, None] >> np.array([16, 8, 0], dtype=np.uint32)) & 0xFF
+                table[start : start + CHUNK_SIZE] = rgb_to_hsv(rgb)
+            table.flush()
+            del table
+            os.replace(tmp.name, self.path)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+
+
+@functools.cache
+def get_table(directory: str) -> HSVTable:
+    """Return the HSVTable in the given directory
+
+    The same instance is returned for the same directory, so the table is only loaded
+    once per process.
+    """
+    return HSVTable(directory)
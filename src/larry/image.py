@@ -2,21 +2,62 @@
 
 from __future__ import annotations
 
+import base64
+import binascii
+import copy
+import gzip
+import math
+import re
 from io import BytesIO
-from typing import Iterable, Protocol, Type
+from typing import Any, Callable, Iterable, Iterator, Protocol, Type
 
 import numpy as np
+from numpy.typing import ArrayLike, NDArray
 from PIL import Image as PillowImage
 
-from larry.color import COLORS_RE, Color, replace_string
+from larry.color import COLORS_RE, Color, format_color
+from larry.palette import Palette, pack, unpack
 
 IMAGE_TYPES: list[Type[Image]] = []
 
+GZIP_MAGIC = b"\x1f\x8b"
+UTF8_BOM = b"\xef\xbb\xbf"
+# base64-encoded data: URIs. The payload may be broken across lines
+DATA_URI_RE = re.compile(
+    r"(data:[\w/+.-]*(?:;[\w=.-]+)*;base64,"
+    r"[A-Za-z0-9+/=]+(?:[ \t]*\r?\n\s*[A-Za-z0-9+/=]+)*)"
+)
+RASTER_DATA_URIS = tuple(
+    f"data:image/{subtype}" for subtype in ("png", "jpeg", "gif", "webp", "bmp")
+)
+RASTER_MAGIC = (
+    b"\x89PNG\r\n\x1a\n",  # PNG
+    b"\xff\xd8\xff",  # JPEG
+    b"GIF87a",  # GIF
+    b"GIF89a",
+    b"BM",  # BMP
+)
+
+# Seed of the random generator that picks the pixels of samples
+DEFAULT_SEED = 0
+
+# Raster images are processed in horizontal bands of (about) this many pixels so that
+# large images need not be copied in their entirety
+TILE_PIXELS = 1 << 20
+
 
 class Image(Protocol):
-    """A type of image instantiated from a byte stream"""
+    """A type of image instantiated from a byte stream
+
+    Image types may also have a sniff(data) staticmethod returning True if data looks
+    like an image of that type. make_image_from_bytes() uses these to go straight to
+    the right type.
+
+    Keyword options are passed to every type, so types ignore the options that don't
+    apply to them.
+    """
 
-    def __init__(self, data: bytes) -> None:
+    def __init__(self, data: bytes, **options: Any) -> None:
         """Initializer"""
 
     def __bytes__(self) -> bytes:
@@ -26,6 +67,18 @@ class Image(Protocol):
     def colors(self) -> Iterable[Color]:
         """Return the Colors of this Image"""
 
+    def color_counts(self) -> tuple[Palette, NDArray[np.int64]]:
+        """Return the unique colors of the image and how often each occurs"""
+
+    def sample(
+        self, size: int, seed: int = DEFAULT_SEED
+    ) -> tuple[Palette, NDArray[np.int64]]:
+        """Return the unique colors of a representative sample of the image's colors
+
+        The sample has about size colors. Like color_counts(), the colors come with how
+        often each occurs, but in the sample.
+        """
+
     def replace(
         self, orig_colors: Iterable[Color], new_colors: Iterable[Color]
     ) -> Image:
@@ -40,84 +93,422 @@ def register_image_type(cls: Type[Image]) -> Type[Image]:
 
 @register_image_type
 class SVGImage:
-    """An SVG image"""
+    """An SVG image
+
+    Gzip-compressed (svgz) data is decompressed, and compressed again when converted
+    back to bytes.
+
+    The document is scanned for colors once. It is kept as a list of parts that
+    alternate between text and color strings (so color strings are at the odd
+    indices) along with the Color of each distinct color string.
+
+    base64 data: URIs are not scanned. If embedded is True, the raster images embedded
+    in them are decoded and take part in colors and replace() like the rest of the
+    document. They are not downscaled (see RasterImage) as that would change the
+    document.
+    """
+
+    def __init__(self, data: bytes, *, embedded: bool = False, **options: Any):
+        options.pop("max_size", None)
+
+        self.compressed = data.startswith(GZIP_MAGIC)
+
+        if self.compressed:
+            data = gzip.decompress(data)
 
-    def __init__(self, data: bytes):
-        self.svg = data.decode()
+        self.parts: list[str] = tokenize_svg(data.decode(), embedded)
+        self.token_colors: dict[str, Color] = {}
+        self.embedded: dict[str, RasterImage] = {}
+
+        for token in self.parts[1::2]:
+            if not token.startswith("data:"):
+                self.token_colors.setdefault(token, Color(token))
+            elif token not in self.embedded:
+                try:
+                    self.embedded[token] = RasterImage(
+                        base64.b64decode(token.partition(",")[2]), **options
+                    )
+                except (binascii.Error, OSError, ValueError):
+                    continue
+
+    @staticmethod
+    def sniff(data: bytes) -> bool:
+        """Return True if data looks like an SVG (or svgz) image"""
+        if data.startswith(GZIP_MAGIC):
+            return True
+
+        head = data[:1024].removeprefix(UTF8_BOM).lstrip()
+
+        return head.startswith((b"<svg", b"<?xml", b"<!DOCTYPE svg"))
+
+    @property
+    def svg(self) -> str:
+        """The SVG document"""
+        return "".join(self.parts)
 
     def __bytes__(self):
-        return self.svg.encode()
+        data = self.svg.encode()
+
+        return gzip.compress(data, mtime=0) if self.compressed else data
 
     def __str__(self):
         return self.svg
 
     def color_strings(self) -> list[str]:
         """Return a list of all the colors strings in the SVGImage"""
-        return COLORS_RE.findall(self.svg)
+        return [token for token in self.parts[1::2] if token in self.token_colors]
 
     @property
     def colors(self) -> set[Color]:
         """Return the Colors of this Image"""
-        return {Color(i) for i in self.color_strings()}
+        colors = set(self.token_colors.values())
+
+        for image in self.embedded.values():
+            colors.update(image.colors)
+
+        return colors
+
+    def color_counts(self) -> tuple[Palette, NDArray[np.int64]]:
+        """Return the unique colors of the image and the number of times each occurs
+
+        Each occurrence of a color string counts once, as does each pixel of the
+        embedded images.
+        """
+        strings = Palette.from_colors(
+            self.token_colors[token] for token in self.color_strings()
+        )
+        packed = [pack(strings.array)]
+        counts = [np.ones(len(strings), dtype=np.int64)]
+
+        for image in self.embedded.values():
+            palette, image_counts = image.color_counts()
+            packed.append(pack(palette.array))
+            counts.append(image_counts)
+
+        unique, totals = tally(np.concatenate(packed), np.concatenate(counts))
+
+        return Palette(unpack(unique)), totals
+
+    def sample(  # pylint: disable=unused-argument
+        self, size: int, seed: int = DEFAULT_SEED
+    ) -> tuple[Palette, NDArray[np.int64]]:
+        """Return the color_counts()
+
+        SVG documents are scanned for colors as they are parsed, so there is nothing to
+        be saved by sampling.
+        """
+        return self.color_counts()
 
     def replace(
         self, orig_colors: Iterable[Color], new_colors: Iterable[Color]
     ) -> SVGImage:
         """Return a new image by orig_colors with new_colors"""
+        orig_colors = list(orig_colors)
+        new_colors = list(new_colors)
         color_map = dict(zip(orig_colors, new_colors))
-        svg = replace_string(self.svg, color_map)
+        replacements: dict[str, str] = {}
+        token_colors: dict[str, Color] = {}
+        embedded: dict[str, RasterImage] = {}
 
-        return type(self)(svg.encode())
+        for token, color in self.token_colors.items():
+            if new_color := color_map.get(color):
+                replacements[token] = format_color(token, new_color)
+                token, color = replacements[token], new_color
+            token_colors.setdefault(token, color)
+
+        for token, image in self.embedded.items():
+            image = image.replace(orig_colors, new_colors)
+            prefix = token.partition(",")[0]
+            replacements[token] = f"{prefix},{base64.b64encode(bytes(image)).decode()}"
+            embedded[replacements[token]] = image
+
+        new = copy.copy(self)
+        new.parts = self.parts.copy()
+        new.token_colors = token_colors
+        new.embedded = embedded
+
+        for index in range(1, len(new.parts), 2):
+            new.parts[index] = replacements.get(new.parts[index], new.parts[index])
+
+        return new
 
 
 @register_image_type
 class RasterImage:
-    """Image for Raster files"""
+    """Image for Raster files
+
+    If max_size, a (width, height), is given, images larger than that are downscaled
+    (keeping their aspect ratio) as they are decoded.
+    """
 
-    def __init__(self, data: bytes):
+    def __init__(
+        self, data: bytes, *, max_size: tuple[int, int] | None = None, **_options: Any
+    ):
         bytes_io = BytesIO(data)
         self.image = PillowImage.open(bytes_io)
 
         # We want to deal with everything as an RGBA but but go back to the original
-        # format/mode when converting to bytes
+        # format/mode when converting to bytes. The exception are paletted images
+        # whose colors can be had (and replaced) from the palette alone.
         self.image_format = self.image.format
         self.image_mode = self.image.mode
-        self.image = self.image.convert("RGBA")
+
+        if max_size is not None:
+            # This has to happen before the image is loaded: JPEGs can then be decoded
+            # at a fraction of their size to begin with (see Pillow's draft())
+            self.image.thumbnail(max_size, PillowImage.Resampling.LANCZOS)
+
+        if self.is_paletted:
+            self.image.load()
+        else:
+            self.image = self.image.convert("RGBA")
+
+    @staticmethod
+    def sniff(data: bytes) -> bool:
+        """Return True if data starts with the signature of a common raster format"""
+        if data.startswith(RASTER_MAGIC):
+            return True
+
+        return data[:4] == b"RIFF" and data[8:12] == b"WEBP"
+
+    @property
+    def is_paletted(self) -> bool:
+        """Return True if the image is stored as indices into a color palette"""
+        return self.image.mode == "P"
 
     @property
     def colors(self) -> set[Color]:
         """Return the Colors of this Image"""
-        array = np.array(self.image)[:, :, :3]
+        palette, _ = self.color_counts()
+
+        return set(palette)
+
+    def color_counts(self) -> tuple[Palette, NDArray[np.int64]]:
+        """Return the unique colors of the image and the number of pixels of each"""
+        if not self.is_paletted:
+            tile_values = [np.empty(0, dtype=np.uint32)]
+            tile_totals = [np.empty(0, dtype=np.int64)]
+
+            for _, tile in self.tiles():
+                tile_unique, tile_counts = np.unique(
+                    pack(np.asarray(tile)[:, :, :3]), return_counts=True
+                )
+                tile_values.append(tile_unique)
+                tile_totals.append(tile_counts)
+
+            unique, totals = tally(
+                np.concatenate(tile_values), np.concatenate(tile_totals)
+            )
+
+            return Palette(unpack(unique)), totals
+
+        # Count the palette entries in use. Different entries can have the same color
+        entry_counts = np.zeros(256, dtype=np.int64)
 
-        return {
-            Color.from_array(array[i, j])
-            for i in range(array.shape[0])
-            for j in range(array.shape[1])
-        }
+        for _, tile in self.tiles():
+            entry_counts += np.bincount(np.asarray(tile).ravel(), minlength=256)
+
+        entries = np.flatnonzero(entry_counts)
+        unique, counts = tally(
+            pack(self.palette_array()[entries, :3]), entry_counts[entries]
+        )
+
+        return Palette(unpack(unique)), counts
+
+    def sample(
+        self, size: int, seed: int = DEFAULT_SEED
+    ) -> tuple[Palette, NDArray[np.int64]]:
+        """Return the unique colors of a sample of about size of the image's pixels
+
+        The image is divided into a grid of about size (equally sized) cells and one
+        pixel is picked at random from each cell, so the sample covers the whole image.
+        Only the sampled pixels are read. The same seed picks the same pixels.
+
+        Return the color_counts() if the image has no more than size pixels.
+        """
+        width, height = self.image.size
+
+        if width * height <= size:
+            return self.color_counts()
+
+        rows = min(height, max(1, round(math.sqrt(size * height / width))))
+        columns = min(width, max(1, size // rows))
+        rng = np.random.default_rng(seed)
+        ys = (np.arange(rows)[:, None] + rng.random((rows, columns))) * height / rows
+        xs = (np.arange(columns) + rng.random((rows, columns))) * width / columns
+        pixels = self.image.load()
+        assert pixels is not None
+        values = [
+            pixels[x, y]
+            for x, y in zip(
+                xs.astype(int).ravel().tolist(), ys.astype(int).ravel().tolist()
+            )
+        ]
+
+        if self.is_paletted:
+            rgb = self.palette_array()[np.array(values), :3]
+        else:
+            rgb = np.array(values, dtype=np.uint8)[:, :3]
+
+        unique, counts = np.unique(pack(rgb), return_counts=True)
+
+        return Palette(unpack(unique)), counts.astype(np.int64)
+
+    def indexed_tiles(
+        self, palette: Palette
+    ) -> Iterator[tuple[int, PillowImage.Image, NDArray[np.uint32]]]:
+        """Yield the tiles() along with the index into the palette of each pixel's color
+
+        Pixels whose color is not in the palette get len(palette). The indexes are
+        computed a band at a time, so they never take more memory than a band does.
+        """
+        keys = pack(palette.array)
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+
+        def lookup(packed: NDArray[np.uint32]) -> NDArray[np.uint32]:
+            if keys.size == 0:
+                return np.full(packed.shape, len(palette), dtype=np.uint32)
+
+            index = np.searchsorted(keys, packed).clip(max=len(keys) - 1)
+
+            return np.where(keys[index] == packed, order[index], len(palette)).astype(
+                np.uint32
+            )
+
+        if self.is_paletted:
+            entry_index = lookup(pack(self.palette_array()[:, :3]))
+
+        for top, tile in self.tiles():
+            if self.is_paletted:
+                yield top, tile, entry_index[np.asarray(tile)]
+            else:
+                yield top, tile, lookup(pack(np.asarray(tile)[:, :, :3]))
+
+    def palette_index(self, palette: Palette) -> NDArray[np.uint16 | np.uint32]:
+        """Return the index into the given palette of each pixel's color
+
+        See indexed_tiles(). The indexes are uint16 if the palette is small enough,
+        uint32 otherwise.
+        """
+        small = len(palette) <= np.iinfo(np.uint16).max
+        width, height = self.image.size
+        index_map = np.empty((height, width), dtype=np.uint16 if small else np.uint32)
+
+        for top, tile, index in self.indexed_tiles(palette):
+            index_map[top : top + tile.height] = index
+
+        return index_map
+
+    def tiles(self) -> Iterator[tuple[int, PillowImage.Image]]:
+        """Yield the image in horizontal bands of about TILE_PIXELS pixels
+
+        Each band is given along with the row it starts at.
+        """
+        width, height = self.image.size
+        rows = max(1, TILE_PIXELS // max(1, width))
+
+        for top in range(0, height, rows):
+            yield top, self.image.crop((0, top, width, min(top + rows, height)))
+
+    def palette_array(self) -> NDArray[np.uint8]:
+        """Return the 256 entries of a paletted image's palette as an array
+
+        The array has a column for each channel of the palette's mode (e.g. RGB or
+        RGBA). Entries missing from the palette are black.
+        """
+        mode = self.image.palette.mode
+        palette = np.zeros((256, len(mode)), dtype=np.uint8)
+        entries = np.array(self.image.getpalette(mode), dtype=np.uint8)
+        entries = entries.reshape(-1, len(mode))[:256]
+        palette[: len(entries)] = entries
+
+        return palette
 
     def replace(
         self, orig_colors: Iterable[Color], new_colors: Iterable[Color]
     ) -> RasterImage:
         """Return a new image by orig_colors with new_colors"""
-        width, height = self.image.size
+        keys, values = remap_table(orig_colors, new_colors)
 
-        # map original rgb tuples to new
-        color_map = dict((orig, new) for orig, new in zip(orig_colors, new_colors))
+        if self.is_paletted:
+            # Only the palette needs rewriting
+            palette = self.palette_array()
+            remap(palette[:, :3], keys, values)
+            image = self.image.copy()
+            image.putpalette(palette.tobytes(), self.image.palette.mode)
 
-        new_image = type(self)(bytes(self))
+            return self.with_image(image)
 
-        for x in range(width):  # pylint: disable=invalid-name
-            for y in range(height):  # pylint: disable=invalid-name
-                *rgb, alpha = self.image.getpixel((x, y))
+        if keys.size == 0:
+            return self.with_image(self.image.copy())
 
-                try:
-                    new = color_map[Color(*rgb)]
-                except KeyError:
-                    continue
+        image = PillowImage.new("RGBA", self.image.size)
+
+        for top, tile in self.tiles():
+            array = np.array(tile)
+            remap(array[:, :, :3], keys, values)
+            image.paste(PillowImage.fromarray(array, "RGBA"), (0, top))
 
-                new_image.image.putpixel((x, y), (*new, alpha))
+        return self.with_image(image)
+
+    def recolor(
+        self,
+        palette: Palette,
+        table: NDArray[np.uint8],
+        index_map: NDArray[np.uint16 | np.uint32] | None = None,
+    ) -> RasterImage:
+        """Return a new image whose pixels have the new colors of their palette colors
+
+        The (N, 3) table holds the new color of each of the palette's colors, which
+        must include all of the image's colors. The pixels keep their alpha.
+
+        If the index_map (see palette_index()) of the palette is given, the pixels'
+        indexes are taken from it instead of being looked up.
+        """
+        image = PillowImage.new("RGBA", self.image.size)
+        bands: Iterable[tuple[int, PillowImage.Image, NDArray[np.uint16 | np.uint32]]]
+
+        if index_map is None:
+            bands = self.indexed_tiles(palette)
+        else:
+            bands = (
+                (top, tile, index_map[top : top + tile.height])
+                for top, tile in self.tiles()
+            )
+
+        for top, tile, index in bands:
+            array = np.array(tile.convert("RGBA"))
+            array[:, :, :3] = table[index]
+            image.paste(PillowImage.fromarray(array, "RGBA"), (0, top))
+
+        return self.with_image(image)
+
+    def map_pixels(
+        self, func: Callable[[NDArray[np.float32]], ArrayLike]
+    ) -> RasterImage:
+        """Return a new image with the pixels' colors mapped by func
 
-        return new_image
+        func is given the (N, 3) float32 RGB values of a band of pixels at a time (see
+        tiles()) and returns their new RGB values, which are rounded and clipped as
+        they would be for a Palette. The pixels keep their alpha.
+        """
+        image = PillowImage.new("RGBA", self.image.size)
+
+        for top, tile in self.tiles():
+            array = np.array(tile.convert("RGBA"))
+            rgb = array[:, :, :3].reshape(-1, 3).astype(np.float32)
+            array[:, :, :3] = Palette(func(rgb)).array.reshape(array.shape[:2] + (3,))
+            image.paste(PillowImage.fromarray(array, "RGBA"), (0, top))
+
+        return self.with_image(image)
+
+    def with_image(self, image: PillowImage.Image) -> RasterImage:
+        """Return a copy of this RasterImage but with the given Pillow image"""
+        new = copy.copy(self)
+        new.image = image
+
+        return new
 
     def __bytes__(self) -> bytes:
         bytes_io = BytesIO()
@@ -130,12 +521,90 @@ class RasterImage:
         return bytes_io.getvalue()
 
 
-def make_image_from_bytes(data: bytes) -> Image:
-    """Return an instance of Image using data"""
-    for image_type in IMAGE_TYPES:
+def remap_table(
+    orig_colors: Iterable[Color], new_colors: Iterable[Color]
+) -> tuple[NDArray[np.uint32], NDArray[np.uint8]]:
+    """Vectorized version of dict(zip(orig_colors, new_colors))
+
+    Return the sorted, packed original colors and their (N, 3) replacement colors.
+    Colors that map to themselves are left out.
+    """
+    orig = pack(Palette.from_colors(orig_colors).array)
+    new = Palette.from_colors(new_colors).array
+    size = min(len(orig), len(new))
+
+    # Like a dict, the last occurrence of a color wins
+    keys, index = np.unique(orig[:size][::-1], return_index=True)
+    values = new[:size][::-1][index]
+    changed = pack(values) != keys
+
+    return keys[changed], values[changed]
+
+
+def tally(
+    values: NDArray[np.uint32], counts: NDArray[np.int64]
+) -> tuple[NDArray[np.uint32], NDArray[np.int64]]:
+    """Return the unique values and the sum of the counts of each"""
+    unique, inverse = np.unique(values, return_inverse=True)
+    totals = np.zeros(len(unique), dtype=np.int64)
+    np.add.at(totals, inverse.ravel(), counts)
+
+    return unique, totals
+
+
+def remap(
+    rgb: NDArray[np.uint8], keys: NDArray[np.uint32], values: NDArray[np.uint8]
+) -> None:
+    """Replace, in place, the colors of the rgb array given the remap_table()"""
+    if keys.size == 0:
+        return
+
+    packed = pack(rgb)
+    index = np.searchsorted(keys, packed).clip(max=len(keys) - 1)
+    found = keys[index] == packed
+    rgb[found] = values[index[found]]
+
+
+def make_image_from_bytes(data: bytes, **options: Any) -> Image:
+    """Return an instance of Image using data
+
+    If any image types' sniffers claim the data, only those types are tried. Otherwise
+    each image type is tried in turn. The options are passed on to the image type.
+    """
+    for image_type in sniff(data) or IMAGE_TYPES:
         try:
-            return image_type(data)
+            return image_type(data, **options)
         except Exception:  # pylint: disable=broad-except
             continue
 
     raise ValueError("Could not instantiate image type from data provided")
+
+
+def tokenize_svg(svg: str, embedded: bool = False) -> list[str]:
+    """Split the SVG document into parts alternating between text and color strings
+
+    base64 data: URIs are skipped over, as text. Unless embedded is True, in which case
+    those of raster images are split out as if they were color strings.
+    """
+    parts = [""]
+
+    for index, chunk in enumerate(DATA_URI_RE.split(svg)):
+        if index % 2 == 0:
+            first, *rest = COLORS_RE.split(chunk)
+            parts[-1] += first
+            parts.extend(rest)
+        elif embedded and chunk.startswith(RASTER_DATA_URIS):
+            parts.extend([chunk, ""])
+        else:
+            parts[-1] += chunk
+
+    return parts
+
+
+def sniff(data: bytes) -> list[Type[Image]]:
+    """Return the image types whose sniffers claim the given data"""
+    return [
+        image_type
+        for image_type in IMAGE_TYPES
+        if (sniffer := getattr(image_type, "sniff", None)) and sniffer(data)
+    ]
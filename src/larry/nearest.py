@@ -0,0 +1,160 @@
+"""Nearest-color queries
+
+A ColorIndex is built once from a list of colors and then answers, for any number of
+colors at once, which of its colors is the nearest. Distances are euclidean in the
+index's color space:
+
+    rgb: sRGB values (the default)
+    lab: CIELAB (D65)
+    oklab: OKLab
+
+The perceptual spaces give better matches than RGB. Colors are converted in batches,
+and the indexes of recently used color lists are cached (see color_index()).
+"""
+
+import functools
+from typing import Callable, Iterable
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+from scipy.spatial import cKDTree
+
+DEFAULT_SPACE = "rgb"
+
+# Maximum number of tied queries resolved at once by brute force
+TIES_CHUNK_SIZE = 4096
+
+# Linear sRGB to CIE XYZ, normalized to the D65 white point
+RGB_TO_XYZ = np.array(
+    [
+        [0.4124564, 0.3575761, 0.1804375],
+        [0.2126729, 0.7151522, 0.0721750],
+        [0.0193339, 0.1191920, 0.9503041],
+    ]
+) / np.array([[0.95047], [1.0], [1.08883]])
+
+# Linear sRGB to (OKLab) LMS, and LMS' to OKLab
+RGB_TO_LMS = np.array(
+    [
+        [0.4122214708, 0.5363325363, 0.0514459929],
+        [0.2119034982, 0.6806995451, 0.1073969566],
+        [0.0883024619, 0.2817188376, 0.6299787005],
+    ]
+)
+LMS_TO_OKLAB = np.array(
+    [
+        [0.2104542553, 0.7936177850, -0.0040720468],
+        [1.9779984951, -2.4285922050, 0.4505937099],
+        [0.0259040371, 0.7827717662, -0.8086757660],
+    ]
+)
+
+Converter = Callable[[NDArray[np.float64]], NDArray[np.float64]]
+
+
+class ColorIndex:
+    """KD-tree index of the given colors in the given color space
+
+    Of equally near colors the first one is chosen, as min() and np.argmin() would.
+    """
+
+    def __init__(self, colors: ArrayLike, space: str = DEFAULT_SPACE) -> None:
+        self.convert = get_converter(space)
+        rgb = np.asarray(colors, dtype=np.float64).reshape(-1, 3)
+
+        if rgb.size == 0:
+            raise ValueError("ColorIndex needs at least one color")
+
+        self.size = len(rgb)
+        self.space = space
+
+        # Duplicates are dropped, leaving the first occurrences in their original order
+        _, first = np.unique(rgb, axis=0, return_index=True)
+        self.ids: NDArray[np.intp] = np.sort(first)
+        self.points = self.convert(rgb[self.ids])
+        self.tree = cKDTree(self.points)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def query(self, colors: ArrayLike) -> NDArray[np.intp]:
+        """Return the index of the nearest color of each of the given (N, 3) colors"""
+        queries = self.convert(np.asarray(colors, dtype=np.float64).reshape(-1, 3))
+
+        if len(self.points) == 1:
+            return np.zeros(len(queries), dtype=np.intp)
+
+        distances, nearest = self.tree.query(queries, k=2)
+        nearest = nearest[:, 0]
+
+        # The tree does not say which of equally near colors comes first
+        ties = np.flatnonzero(distances[:, 0] == distances[:, 1])
+        for start in range(0, len(ties), TIES_CHUNK_SIZE):
+            rows = ties[start : start + TIES_CHUNK_SIZE]
+            squared = ((queries[rows, None, :] - self.points[None]) ** 2).sum(axis=2)
+            nearest[rows] = squared.argmin(axis=1)
+
+        return self.ids[nearest]
+
+    def nearest(self, color: ArrayLike) -> int:
+        """Return the index of the color nearest to the given color"""
+        return int(self.query(color)[0])
+
+
+@functools.lru_cache(maxsize=32)
+def _color_index(colors: tuple[tuple[int, int, int], ...], space: str) -> ColorIndex:
+    return ColorIndex(colors, space)
+
+
+def color_index(
+    colors: Iterable[tuple[int, int, int]], space: str = DEFAULT_SPACE
+) -> ColorIndex:
+    """Return the (cached) ColorIndex of the given colors"""
+    return _color_index(tuple(colors), space)
+
+
+def convert(colors: ArrayLike, space: str) -> NDArray[np.float64]:
+    """Convert the (N, 3) array of RGB values to the given color space"""
+    return get_converter(space)(np.asarray(colors, dtype=np.float64).reshape(-1, 3))
+
+
+def get_converter(space: str) -> Converter:
+    """Return the RGB converter of the given color space
+
+    Raise ValueError if there is no such color space.
+    """
+    try:
+        return SPACES[space]
+    except KeyError:
+        raise ValueError(f"Unknown color space: {space!r}") from None
+
+
+def rgb_to_linear(rgb: NDArray[np.float64]) -> NDArray[np.float64]:
+    """Convert the sRGB values ([0, 255]) to linear RGB values ([0, 1])"""
+    values = rgb / 255.0
+
+    return np.where(
+        values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4
+    )
+
+
+def rgb_to_lab(rgb: NDArray[np.float64]) -> NDArray[np.float64]:
+    """Convert the (N, 3) sRGB values to CIELAB"""
+    xyz = rgb_to_linear(rgb) @ RGB_TO_XYZ.T
+    delta = 6 / 29
+    f = np.where(xyz > delta**3, np.cbrt(xyz), xyz / (3 * delta**2) + 4 / 29)
+    fx, fy, fz = f.T
+
+    return np.stack([116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)], axis=1)
+
+
+def rgb_to_oklab(rgb: NDArray[np.float64]) -> NDArray[np.float64]:
+    """Convert the (N, 3) sRGB values to OKLab"""
+    return np.cbrt(rgb_to_linear(rgb) @ RGB_TO_LMS.T) @ LMS_TO_OKLAB.T
+
+
+SPACES: dict[str, Converter] = {
+    "rgb": lambda rgb: rgb,
+    "lab": rgb_to_lab,
+    "oklab": rgb_to_oklab,
+}
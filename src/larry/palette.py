@@ -0,0 +1,201 @@
+"""Array-backed palettes
+
+A Palette is the vectorized counterpart of a ColorList. The colors are stored in a
+single (N, 3) uint8 array and the Color operations are applied to all of them at once.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Iterator, TypeAlias, overload
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from larry.color import Color, ColorList, hsv_to_rgb, rgb_to_hsv
+from larry.hsvtable import HSVTable
+
+PaletteArray: TypeAlias = NDArray[np.uint8]
+Operand: TypeAlias = "Palette | Color | ArrayLike"
+
+
+class Palette:
+    """A sequence of colors backed by an (N, 3) uint8 array"""
+
+    __slots__ = ("array",)
+
+    def __init__(self, array: ArrayLike = ()) -> None:
+        array = np.asarray(array)
+
+        if array.size == 0:
+            array = array.reshape(0, 3)
+
+        if array.ndim != 2 or array.shape[1] != 3:
+            raise ValueError(f"Palette array must have shape (N, 3). Got {array.shape}")
+
+        if array.dtype != np.uint8:
+            array = to_uint8(array)
+
+        self.array: PaletteArray = array
+
+    @classmethod
+    def from_colors(cls, colors: Iterable[Color]) -> Palette:
+        """Create a Palette from the given Colors"""
+        return cls(np.array([*colors], dtype=np.uint8))
+
+    def to_colors(self) -> ColorList:
+        """Convert the Palette into a ColorList"""
+        # The values are already known to be in range so we can bypass Color's checks
+        make = Color._make  # pylint: disable=protected-access
+
+        return [make(rgb) for rgb in self.array.tolist()]
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def __iter__(self) -> Iterator[Color]:
+        return iter(self.to_colors())
+
+    @overload
+    def __getitem__(self, index: int) -> Color: ...
+
+    @overload
+    def __getitem__(self, index: slice | ArrayLike) -> Palette: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return Color._make(self.array[index].tolist())
+
+        return type(self)(self.array[index])
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Palette):
+            return np.array_equal(self.array, other.array)
+
+        if isinstance(other, list):
+            return self.to_colors() == other
+
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({[str(color) for color in self]})"
+
+    def copy(self) -> Palette:
+        """Return a copy of the Palette"""
+        return type(self)(self.array.copy())
+
+    def luminocity(self) -> NDArray[np.int64]:
+        """Return the (int) luminocity of each color"""
+        red, green, blue = self.channels().T
+
+        return np.rint(0.30 * red + 0.59 * green + 0.11 * blue).astype(np.int64)
+
+    def argsort(self) -> NDArray[np.intp]:
+        """Return the indices that would sort the Palette by luminocity
+
+        Like sorted() the sort is stable.
+        """
+        return np.argsort(self.luminocity(), kind="stable")
+
+    def sorted(self) -> Palette:
+        """Return a new Palette sorted by luminocity"""
+        return self[self.argsort()]
+
+    def to_hsv(self, table: HSVTable | None = None) -> NDArray[np.float64]:
+        """Return an (N, 3) array of (Hue, Saturation, Value)
+
+        If an HSVTable is given, the values are looked up in it.
+        """
+        if table is not None:
+            return table.lookup(self.array)
+
+        return rgb_to_hsv(self.array)
+
+    @classmethod
+    def from_hsv(cls, hsv: ArrayLike) -> Palette:
+        """Create a Palette from an (N, 3) array of (Hue, Saturation, Value)"""
+        return cls(hsv_to_rgb(hsv))
+
+    def luminize(self, luminocity: ArrayLike) -> Palette:
+        """Return new Palette with the given luminocity (or luminocities)"""
+        target = np.broadcast_to(np.asarray(luminocity, dtype=np.float64), len(self))
+        my_lum = self.luminocity()
+        black = my_lum == 0
+        lum = ((target - my_lum) / np.where(black, 1, my_lum))[:, None]
+        parts = self.channels()
+        parts = np.rint(np.clip(parts + (parts * lum), 0, 255))
+        parts[black] = np.trunc(target[black])[:, None]
+
+        return type(self)(parts)
+
+    def inverse(self) -> Palette:
+        """Return the inverse of each color"""
+        return type(self)(255 - self.array)
+
+    def channels(self) -> NDArray[np.float64]:
+        """Return the colors as an (N, 3) float array"""
+        return self.array.astype(np.float64)
+
+    def __add__(self, value: Operand) -> Palette:
+        return type(self)(self.channels() + operand(value, len(self)))
+
+    def __sub__(self, value: Operand) -> Palette:
+        return type(self)(self.channels() - operand(value, len(self)))
+
+    def __mul__(self, value: Operand) -> Palette:
+        if isinstance(value, Color):
+            # Same as Color.__mul__
+            value = value.luminocity()
+
+        return type(self)(self.channels() * operand(value, len(self)))
+
+    __rmul__ = __mul__
+
+
+def operand(value: Operand, size: int) -> NDArray[np.float64]:
+    """Return value as an array that can be broadcast against a (size, 3) array
+
+    The value is a scalar, a single Color, one scalar per color (shape (size,)) or one
+    color per color (a Palette or shape (size, 3)). A single color must be a Color so
+    that a flat array is never mistaken for one. Raise ValueError for any other shape.
+    """
+    if isinstance(value, Palette):
+        return value.channels()
+
+    array = np.asarray(value, dtype=np.float64)
+
+    if isinstance(value, Color) or array.ndim == 0 or array.shape == (size, 3):
+        return array
+
+    if array.shape == (size,):
+        # one scalar per color
+        return array[:, None]
+
+    raise ValueError(
+        f"Operand must be a scalar, a Color or have shape ({size},) or ({size}, 3)."
+        f" Got {array.shape}"
+    )
+
+
+def to_uint8(array: ArrayLike) -> PaletteArray:
+    """Clamp the array values to [0, 255] and truncate them to uint8
+
+    This is the vectorized version of int(utils.clamp(value)).
+    """
+    return np.clip(array, 0, 255).astype(np.uint8)
+
+
+def pack(rgb: ArrayLike) -> NDArray[np.uint32]:
+    """Pack the (..., 3) array of RGB values into (...) uint32 values (0xRRGGBB)"""
+    rgb = np.asarray(rgb, dtype=np.uint32)
+
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def unpack(packed: ArrayLike) -> PaletteArray:
+    """The inverse of pack()"""
+    packed = np.asarray(packed, dtype=np.uint32)
+    shifts = np.array([16, 8, 0], dtype=np.uint32)
+
+    return ((packed[..., None] >> shifts) & 0xFF).astype(np.uint8)
@@ -9,9 +9,9 @@ from inspect import iscoroutinefunction
 from typing import Any, Callable, List, Tuple, TypeAlias
 
 from larry import LOGGER, config
-from larry.color import ColorList
+from larry.color import DOMINANT_METHOD, DOMINANT_METHODS, ColorList
 from larry.config import ConfigType
-from larry.filters import load_filter
+from larry.filters import load_filter, pipeline
 from larry.pool import run
 
 PluginType: TypeAlias = Callable[[ColorList, config.ConfigType], Any]
@@ -119,12 +119,29 @@ def apply_plugin_filter(colors: ColorList, plugin_config: ConfigType) -> ColorLi
     if not (filter_names := plugin_config.get("filter", "").split()):
         return colors
 
-    for name in filter_names:
-        cfilter = load_filter(name)
-        global_config = global_config_for_filter(name, plugin_config)
-        colors = cfilter(colors, global_config)
+    chain = (
+        (load_filter(name), global_config_for_filter(name, plugin_config))
+        for name in filter_names
+    )
 
-    return colors
+    return pipeline.run(colors, chain)
+
+
+def dominant_method(plugin_config: ConfigType) -> str:
+    """Return the method by which the plugin finds the dominant colors
+
+    This is the plugin's dominant_method option, falling back to the [larry]
+    dominant_method option. See Color.dominant().
+    """
+    method = plugin_config.get("dominant_method", fallback=None) or (
+        plugin_config.parser.get("larry", "dominant_method", fallback=DOMINANT_METHOD)
+    )
+
+    if method not in DOMINANT_METHODS:
+        LOGGER.warning("Unknown dominant method %r. Using %s", method, DOMINANT_METHOD)
+        return DOMINANT_METHOD
+
+    return method
 
 
 def global_config_for_filter(name, plugin_config: ConfigType) -> ConfigParser:
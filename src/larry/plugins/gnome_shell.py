@@ -7,9 +7,13 @@ import tempfile
 import typing as t
 from enum import Enum, unique
 
+from larry import LOGGER
+from larry.cache import PaletteStore
 from larry.color import COLORS_RE, Color, ColorList, replace_string, ungray
 from larry.config import ConfigType
-from larry.plugins import apply_plugin_filter, gir
+from larry.filters.pipeline import color_weights
+from larry.nearest import DEFAULT_SPACE, SPACES, color_index
+from larry.plugins import apply_plugin_filter, dominant_method, gir
 from larry.pool import run
 
 DEFAULT_GRAY_THRESHOLD = 35
@@ -40,6 +44,17 @@ class AccentColor(Enum):
         """Return the index of the given AccentColor"""
         return list(cls).index(accent_color)
 
+    @classmethod
+    def closest(cls, color: Color, space: str = DEFAULT_SPACE) -> "AccentColor":
+        """Return the AccentColor closest to the given color
+
+        Distances are measured in the given color space (see larry.nearest).
+        """
+        accent_colors = list(cls)
+        index = color_index([c.value for c in accent_colors], space)
+
+        return accent_colors[index.nearest(color)]
+
 
 class Theme:
     """Represents a theme and it's filesystem structure
@@ -125,7 +140,16 @@ class Theme:
     ) -> t.Self:
         """Create new gnome-shell theme base on the given template"""
         theme_template = cls(template)
-        theme_color = Color.dominant(colors, 1)[0]
+        timeout = config.getfloat("dominant_timeout", fallback=None)
+        store = PaletteStore.from_config(config.parser)
+        theme_color = Color.dominant(
+            colors,
+            1,
+            timeout,
+            store,
+            method=dominant_method(config),
+            weights=color_weights(colors),
+        )[0]
 
         new_theme = theme_template.copy()
         orig_css = theme_template.gnome_shell_css_path.read_text(encoding="utf-8")
@@ -140,8 +164,9 @@ class Theme:
         new_css = new_css.replace("-st-accent-color", str(theme_color))
         new_theme.gnome_shell_css_path.write_text(new_css, encoding="utf-8")
 
-        closest_color = theme_color.closest([c.value for c in AccentColor])
-        new_theme.accent_color = AccentColor(closest_color)
+        new_theme.accent_color = AccentColor.closest(
+            theme_color, distance_space(config)
+        )
 
         return new_theme
 
@@ -156,6 +181,22 @@ class Theme:
         return self.path.joinpath("index.theme")
 
 
+def distance_space(config: ConfigType) -> str:
+    """Return the color space in which to find the closest accent color
+
+    This is the plugin's distance option, falling back to the [larry] distance option.
+    """
+    space = config.get("distance", fallback=None) or config.parser.get(
+        "larry", "distance", fallback=DEFAULT_SPACE
+    )
+
+    if space not in SPACES:
+        LOGGER.warning("Unknown color space %r. Using %s", space, DEFAULT_SPACE)
+        return DEFAULT_SPACE
+
+    return space
+
+
 async def plugin(colors: ColorList, config: ConfigType) -> None:
     """Plugin runner"""
     current_theme = Theme.current()
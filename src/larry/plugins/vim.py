@@ -8,8 +8,10 @@ from typing import Any, List, Optional, Tuple, cast
 from weakref import WeakSet
 
 from larry import LOGGER, Color, ColorList
+from larry.cache import PaletteStore
 from larry.config import ConfigType
-from larry.plugins import apply_plugin_filter
+from larry.filters.pipeline import color_weights
+from larry.plugins import apply_plugin_filter, dominant_method
 
 
 @dataclass(frozen=True, slots=True)
@@ -52,7 +54,18 @@ def get_new_colors(
     bg_color = from_colors[0]
     filter_bg = config.getboolean("filter_bg", fallback=True)
     vim_configs = [*process_config(conversions)]
-    targets = list(Color.dominant(list(from_colors), len(vim_configs)))
+    timeout = config.getfloat("dominant_timeout", fallback=None)
+    store = PaletteStore.from_config(config.parser)
+    targets = list(
+        Color.dominant(
+            list(from_colors),
+            len(vim_configs),
+            timeout,
+            store,
+            method=dominant_method(config),
+            weights=color_weights(from_colors),
+        )
+    )
     to_colors = apply_plugin_filter(
         [
             vim_config.color.colorify(target if vim_config.key == "fg" else bg_color)
@@ -0,0 +1,415 @@
+"""Color quantization
+
+Each quantizer takes an (N, 3) array of (unique) RGB colors along with the weight
+(e.g. pixel count) of each and returns an array of at most k representative colors:
+
+    mediancut: split the box with the widest weighted spread along its widest channel
+        at the weighted median, until there are k boxes
+    octree: the nodes of the deepest octree level that fits in k colors, with the
+        heaviest nodes split into (their heaviest) children as long as there is room
+    kmeans: Lloyd's algorithm seeded with k-means++
+    minibatch: mini-batch k-means, which refines the centers with random samples of the
+        colors instead of all of them
+    histogram: the peaks of a coarse histogram of the colors
+
+Representative colors are the weighted means of the colors they represent. The results
+are deterministic: the k-means variants use a seeded random generator (unless k-means
+is given a timeout).
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Callable
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+from scipy.spatial import cKDTree
+
+Centers = NDArray[np.float64]
+Quantizer = Callable[..., Centers]
+
+DEFAULT_ITERATIONS = 20
+DEFAULT_SEED = 0
+DEFAULT_BATCH_SIZE = 1024
+MINIBATCH_ITERATIONS = 50
+
+# Number of bits of each channel that the histogram bins colors by
+HISTOGRAM_BITS = 4
+
+# Maximum number of colors k-means++ chooses the initial centers from
+SEED_SAMPLE_SIZE = 1 << 14
+
+
+def median_cut(colors: ArrayLike, weights: ArrayLike, k: int) -> Centers:
+    """Quantize the colors to (at most) k colors by median cut"""
+    rgb, weight = prepare(colors, weights)
+    boxes = [np.arange(len(rgb))]
+    spreads = [box_spread(rgb, weight)]
+
+    while len(boxes) < k:
+        widest = int(np.argmax(spreads))
+
+        if spreads[widest] == 0:
+            break
+
+        halves = split_box(rgb, weight, boxes[widest])
+        boxes[widest : widest + 1] = halves
+        spreads[widest : widest + 1] = [
+            box_spread(rgb[half], weight[half]) for half in halves
+        ]
+
+    return np.array(
+        [np.average(rgb[box], axis=0, weights=weight[box]) for box in boxes]
+    )
+
+
+def box_spread(rgb: NDArray[np.float64], weight: NDArray[np.float64]) -> float:
+    """Return the box's widest channel range, scaled by its total weight"""
+    if len(rgb) < 2:
+        return 0.0
+
+    return float(np.ptp(rgb, axis=0).max() * weight.sum())
+
+
+def split_box(
+    rgb: NDArray[np.float64], weight: NDArray[np.float64], box: NDArray[np.intp]
+) -> list[NDArray[np.intp]]:
+    """Split the box at the weighted median of its widest channel"""
+    channel = int(np.argmax(np.ptp(rgb[box], axis=0)))
+    box = box[np.argsort(rgb[box, channel], kind="stable")]
+    cumulative = np.cumsum(weight[box])
+    median = int(np.searchsorted(cumulative, cumulative[-1] / 2))
+
+    # Colors with the same value stay together, and neither half may be empty
+    values = rgb[box, channel]
+    cut = int(np.searchsorted(values, values[median], side="right"))
+    if cut == len(box):
+        cut = int(np.searchsorted(values, values[-1], side="left"))
+
+    return [box[:cut], box[cut:]]
+
+
+def octree(colors: ArrayLike, weights: ArrayLike, k: int) -> Centers:
+    """Quantize the colors to (at most) k colors using an octree"""
+    rgb, weight = prepare(colors, weights)
+    whole = rgb.astype(np.uint32)
+    parents = np.zeros(len(rgb), dtype=np.uint32)
+
+    for depth in range(1, 9):
+        children = octree_keys(whole, depth)
+
+        if len(np.unique(children)) > k:
+            break
+
+        parents = children
+    else:
+        return group_means(rgb, weight, parents)
+
+    return group_means(rgb, weight, octree_leaves(parents, children, weight, k))
+
+
+def octree_leaves(
+    parents: NDArray[np.uint32],
+    children: NDArray[np.uint32],
+    weight: NDArray[np.float64],
+    k: int,
+) -> NDArray[np.uint64]:
+    """Return the leaf node of each color
+
+    The heaviest parents are split into their children while there is room for (at
+    most) k leaves. If there is room for only some of the children, the heaviest ones
+    are split off.
+    """
+    _, parent_of = np.unique(parents, return_inverse=True)
+    pairs, pair_of = np.unique(
+        (parent_of.astype(np.uint64) << 32) | children, return_inverse=True
+    )
+    pair_parent = pairs >> 32
+    pair_weight = np.bincount(pair_of, weights=weight)
+    separate = np.zeros(len(pairs), dtype=bool)
+    room = k - (int(pair_parent[-1]) + 1)
+
+    for i in np.argsort(-np.bincount(parent_of, weights=weight), kind="stable"):
+        if room <= 0:
+            break
+
+        mine = np.flatnonzero(pair_parent == i)
+
+        if len(mine) - 1 <= room:
+            separate[mine] = True
+            room -= len(mine) - 1
+        else:
+            separate[mine[np.argsort(-pair_weight[mine], kind="stable")[:room]]] = True
+            room = 0
+
+    # Children and parents are made distinct by setting a bit above the node keys
+    return np.where(
+        separate[pair_of], children.astype(np.uint64) | (1 << 32), parents
+    ).astype(np.uint64)
+
+
+def octree_keys(rgb: NDArray[np.uint32], depth: int) -> NDArray[np.uint32]:
+    """Return the packed octree node of each color at the given depth"""
+    shifted = rgb >> np.uint32(8 - depth)
+
+    return ((shifted[:, 0] << 16) | (shifted[:, 1] << 8) | shifted[:, 2]).astype(
+        np.uint32
+    )
+
+
+def kmeans(  # pylint: disable=too-many-arguments
+    colors: ArrayLike,
+    weights: ArrayLike,
+    k: int,
+    *,
+    iterations: int = DEFAULT_ITERATIONS,
+    timeout: float | None = None,
+    seed: int = DEFAULT_SEED,
+) -> Centers:
+    """Quantize the colors to (at most) k colors with k-means
+
+    The centers are seeded with k-means++ and then refined with (at most) the given
+    number of Lloyd iterations, stopping early if they converge.
+
+    If a timeout (in seconds) is given, the iterations also stop when it runs out. The
+    result then depends on how fast the machine is (and how busy), so it is no longer
+    deterministic.
+    """
+    rgb, weight = prepare(colors, weights)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    centers = seed_centers(rgb, weight, k, np.random.default_rng(seed))
+
+    for _ in range(iterations):
+        if deadline is not None and time.monotonic() > deadline:
+            break
+
+        new_centers = lloyd_step(rgb, weight, centers)
+
+        if np.allclose(new_centers, centers):
+            break
+
+        centers = new_centers
+
+    return centers
+
+
+def lloyd_step(
+    rgb: NDArray[np.float64], weight: NDArray[np.float64], centers: Centers
+) -> Centers:
+    """Move each center to the weighted mean of the colors nearest to it
+
+    Centers that no color is nearest to stay where they are.
+    """
+    _, labels = cKDTree(centers).query(rgb)
+    totals = np.bincount(labels, weights=weight, minlength=len(centers))
+    sums = np.stack(
+        [
+            np.bincount(labels, weights=weight * rgb[:, c], minlength=len(centers))
+            for c in range(3)
+        ],
+        axis=1,
+    )
+    used = totals > 0
+    new_centers = centers.copy()
+    new_centers[used] = sums[used] / totals[used, None]
+
+    return new_centers
+
+
+def minibatch_kmeans(  # pylint: disable=too-many-arguments
+    colors: ArrayLike,
+    weights: ArrayLike,
+    k: int,
+    *,
+    iterations: int = MINIBATCH_ITERATIONS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    seed: int = DEFAULT_SEED,
+) -> Centers:
+    """Quantize the colors to (at most) k colors with mini-batch k-means
+
+    The centers are seeded like kmeans(). Each iteration then moves them toward the
+    means of a (weighted) random sample of batch_size colors, by less the more colors
+    they have already seen.
+    """
+    rgb, weight = prepare(colors, weights)
+    rng = np.random.default_rng(seed)
+    centers = seed_centers(rgb, weight, k, rng)
+    seen = np.zeros(len(centers))
+    cumulative = np.cumsum(weight)
+
+    for _ in range(iterations):
+        picks = np.searchsorted(
+            cumulative, rng.random(batch_size) * cumulative[-1], side="right"
+        )
+        minibatch_step(centers, seen, rgb[np.minimum(picks, len(rgb) - 1)])
+
+    return centers
+
+
+def minibatch_step(
+    centers: Centers, seen: NDArray[np.float64], batch: NDArray[np.float64]
+) -> None:
+    """Move, in place, the centers toward the means of their colors in the batch
+
+    Each center moves by the share of the colors it has seen (counted in seen) that are
+    in the batch.
+    """
+    _, labels = cKDTree(centers).query(batch)
+    sizes = np.bincount(labels, minlength=len(centers))
+    sums = np.stack(
+        [
+            np.bincount(labels, weights=batch[:, c], minlength=len(centers))
+            for c in range(3)
+        ],
+        axis=1,
+    )
+    seen += sizes
+    used = sizes > 0
+    centers[used] += (sums[used] - sizes[used, None] * centers[used]) / seen[used, None]
+
+
+def seed_centers(
+    rgb: NDArray[np.float64],
+    weight: NDArray[np.float64],
+    k: int,
+    rng: np.random.Generator,
+) -> Centers:
+    """Choose k initial centers with k-means++
+
+    Large palettes are seeded from a sample of their colors.
+    """
+    sample = np.arange(len(rgb))
+    if len(sample) > SEED_SAMPLE_SIZE:
+        sample = np.sort(rng.choice(sample, SEED_SAMPLE_SIZE, replace=False))
+
+    return kmeans_plus_plus(rgb[sample], weight[sample], k, rng)
+
+
+def kmeans_plus_plus(
+    rgb: NDArray[np.float64],
+    weight: NDArray[np.float64],
+    k: int,
+    rng: np.random.Generator,
+) -> Centers:
+    """Choose k initial centers among the colors with (weighted) k-means++"""
+    k = min(k, len(rgb))
+    chosen = [int(rng.choice(len(rgb), p=weight / weight.sum()))]
+    nearest = ((rgb - rgb[chosen[0]]) ** 2).sum(axis=1)
+
+    for _ in range(k - 1):
+        scores = nearest * weight
+
+        if (total := scores.sum()) == 0:
+            break
+
+        chosen.append(int(rng.choice(len(rgb), p=scores / total)))
+        nearest = np.minimum(nearest, ((rgb - rgb[chosen[-1]]) ** 2).sum(axis=1))
+
+    return rgb[chosen]
+
+
+def histogram(
+    colors: ArrayLike, weights: ArrayLike, k: int, *, bits: int = HISTOGRAM_BITS
+) -> Centers:
+    """Quantize the colors to (at most) k colors by the peaks of their histogram
+
+    The colors are binned by the top bits of each channel. The heaviest bins are chosen
+    first, skipping those next to an already chosen bin for as long as there are other
+    bins left.
+    """
+    rgb, weight = prepare(colors, weights)
+    whole = rgb.astype(np.uint32)
+    _, bin_of = np.unique(octree_keys(whole, bits), return_inverse=True)
+    totals = np.bincount(bin_of, weights=weight)
+    coords = np.zeros((len(totals), 3), dtype=np.int64)
+    coords[bin_of] = whole >> np.uint32(8 - bits)
+
+    order = np.argsort(-totals, kind="stable")
+    peaks: list[int] = []
+
+    for i in order:
+        if len(peaks) == k:
+            break
+
+        if not peaks or np.abs(coords[peaks] - coords[i]).max(axis=1).min() > 1:
+            peaks.append(int(i))
+
+    chosen = set(peaks)
+    peaks.extend([int(i) for i in order if i not in chosen][: k - len(peaks)])
+
+    return group_means(rgb, weight, bin_of)[peaks]
+
+
+def by_weight(colors: ArrayLike, weights: ArrayLike, centers: Centers) -> Centers:
+    """Return the centers ordered by the weight of the colors nearest to each
+
+    The heaviest center comes first.
+    """
+    rgb, weight = prepare(colors, weights)
+    _, labels = cKDTree(centers).query(rgb)
+    totals = np.bincount(labels, weights=weight, minlength=len(centers))
+
+    return centers[np.argsort(-totals, kind="stable")]
+
+
+def distinct(
+    colors: ArrayLike,
+) -> tuple[NDArray[np.uint8], NDArray[np.intp], NDArray[np.intp]]:
+    """Return the distinct colors of the (N, 3) colors
+
+    Also returned are the number of times each distinct color occurs and, for each
+    color, the index of its distinct color.
+    """
+    rgb = np.asarray(colors, dtype=np.uint8).reshape(-1, 3).astype(np.uint32)
+    keys, inverse, counts = np.unique(
+        octree_keys(rgb, 8), return_inverse=True, return_counts=True
+    )
+    shifts = np.array([16, 8, 0], dtype=np.uint32)
+
+    return (
+        ((keys[:, None] >> shifts) & 0xFF).astype(np.uint8),
+        counts,
+        inverse.reshape(-1),
+    )
+
+
+def group_means(
+    rgb: NDArray[np.float64], weight: NDArray[np.float64], groups: ArrayLike
+) -> Centers:
+    """Return the weighted mean color of each group (in order of the group keys)"""
+    _, group_of = np.unique(groups, return_inverse=True)
+    totals = np.bincount(group_of, weights=weight)
+    sums = np.stack(
+        [np.bincount(group_of, weights=weight * rgb[:, c]) for c in range(3)], axis=1
+    )
+
+    return sums / totals[:, None]
+
+
+def prepare(
+    colors: ArrayLike, weights: ArrayLike
+) -> tuple[NDArray[np.float64], NDArray[np.float64]]:
+    """Return the colors and weights as float arrays
+
+    Raise ValueError if there are no colors or the weights don't match them.
+    """
+    rgb = np.asarray(colors, dtype=np.float64).reshape(-1, 3)
+    weight = np.asarray(weights, dtype=np.float64).reshape(-1)
+
+    if rgb.size == 0:
+        raise ValueError("No colors to quantize")
+
+    if len(weight) != len(rgb):
+        raise ValueError(f"Expected {len(rgb)} weights. Got {len(weight)}")
+
+    return rgb, weight
+
+
+QUANTIZERS: dict[str, Quantizer] = {
+    "mediancut": median_cut,
+    "octree": octree,
+    "kmeans": kmeans,
+    "minibatch": minibatch_kmeans,
+    "histogram": histogram,
+}
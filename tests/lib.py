@@ -53,7 +53,7 @@ class ConfigMaker:
         self.path = f"{dirname}/larry.cfg"
         self._section = "larry"
         self.config = larry_config.load(self.path)
-        self.add_config(output=f"{dirname}/larry.svg")
+        self.add_config(output=f"{dirname}/larry.svg", cache_dir=f"{dirname}/cache")
 
     def add_config(self, **kwargs):
         for name, value in kwargs.items():
@@ -0,0 +1,160 @@
+# pylint: disable=missing-docstring,unused-argument
+import time
+from unittest import TestCase, mock
+
+import numpy as np
+from unittest_fixtures import FixtureContext, Fixtures, fixture, given
+
+from larry import analysis
+from larry.color import Color
+
+from . import lib
+
+DATA = np.array(
+    [[0, 0, 0], [2, 2, 2], [1, 0, 1], [250, 250, 250], [255, 255, 255], [252, 249, 255]]
+)
+
+
+@fixture()
+def analysis_worker(_fixtures: Fixtures) -> FixtureContext[analysis.AnalysisWorker]:
+    instance = analysis.AnalysisWorker()
+    yield instance
+    instance.stop()
+
+
+@given(analysis_worker)
+class AnalysisWorkerTests(TestCase):
+    def test_kmeans(self, fixtures: Fixtures) -> None:
+        centroids = fixtures.analysis_worker.kmeans(DATA, 2, random_state=1)
+
+        self.assertEqual(
+            sorted(centroids.round().tolist()), [[1, 1, 1], [252, 251, 253]]
+        )
+
+    def test_kmeans_sample_weight(self, fixtures: Fixtures) -> None:
+        data = [[0, 0, 0], [10, 10, 10], [250, 250, 250]]
+
+        centroids = fixtures.analysis_worker.kmeans(
+            data, 1, random_state=1, sample_weight=[1, 3, 0]
+        )
+
+        self.assertEqual(centroids.tolist(), [[7.5, 7.5, 7.5]])
+
+    def test_is_persistent(self, fixtures: Fixtures) -> None:
+        worker = fixtures.analysis_worker
+        worker.start()
+        process = getattr(worker, "_process")
+
+        worker.kmeans(DATA, 2)
+        worker.kmeans(DATA, 3)
+
+        self.assertIs(getattr(worker, "_process"), process)
+        self.assertTrue(worker.is_running)
+
+    def test_warm_starts_from_previous_centroids(self, fixtures: Fixtures) -> None:
+        worker = fixtures.analysis_worker
+        centroids = worker.kmeans(DATA, 2)
+
+        with mock.patch.object(worker, "call", return_value=centroids) as call:
+            worker.kmeans(DATA, 2)
+
+        self.assertIs(call.call_args.kwargs["init"], centroids)
+
+    def test_other_data_is_warm_started(self, fixtures: Fixtures) -> None:
+        worker = fixtures.analysis_worker
+        centroids = worker.kmeans(DATA, 2)
+
+        with mock.patch.object(worker, "call", return_value=centroids) as call:
+            worker.kmeans(DATA[::-1], 2, sample_weight=[1, 2, 3, 4, 5, 6])
+
+        self.assertIs(call.call_args.kwargs["init"], centroids)
+
+    def test_converges_from_warm_start(self, fixtures: Fixtures) -> None:
+        worker = fixtures.analysis_worker
+        worker.kmeans(DATA, 2, random_state=1)
+
+        centroids = worker.kmeans(DATA + 3, 2)
+
+        self.assertIs(worker.centroids[2], centroids)
+        self.assertEqual(
+            sorted(centroids.round().tolist()), [[4, 4, 4], [255, 254, 256]]
+        )
+
+    def test_other_cluster_counts_are_not_warm_started(
+        self, fixtures: Fixtures
+    ) -> None:
+        worker = fixtures.analysis_worker
+        centroids = worker.kmeans(DATA, 2)
+
+        with mock.patch.object(worker, "call", return_value=centroids) as call:
+            worker.kmeans(DATA, 3)
+
+        self.assertIsNone(call.call_args.kwargs["init"])
+
+    def test_reset(self, fixtures: Fixtures) -> None:
+        worker = fixtures.analysis_worker
+        worker.kmeans(DATA, 2)
+
+        worker.reset()
+
+        self.assertEqual(worker.centroids, {})
+
+    def test_timeout_kills_worker(self, fixtures: Fixtures) -> None:
+        worker = fixtures.analysis_worker
+        worker.start()
+
+        with self.assertRaises(analysis.AnalysisTimeout):
+            worker.kmeans(DATA, 2, timeout=0)
+
+        self.assertFalse(worker.is_running)
+
+        # And it comes back
+        self.assertEqual(len(worker.kmeans(DATA, 2)), 2)
+
+    def test_startup_counts_against_the_timeout(self, fixtures: Fixtures) -> None:
+        worker = fixtures.analysis_worker
+        start = time.monotonic()
+
+        with self.assertRaises(analysis.AnalysisTimeout):
+            worker.kmeans(DATA, 2, timeout=0.01)
+
+        self.assertLess(time.monotonic() - start, 1)
+
+        # The worker is left to finish starting
+        self.assertTrue(worker.is_running)
+        process = getattr(worker, "_process")
+        self.assertEqual(len(worker.kmeans(DATA, 2, timeout=60)), 2)
+        self.assertIs(getattr(worker, "_process"), process)
+
+    def test_startup_timeout(self, fixtures: Fixtures) -> None:
+        worker = fixtures.analysis_worker
+
+        with mock.patch.object(analysis, "STARTUP_TIMEOUT", 0):
+            with self.assertRaises(analysis.AnalysisTimeout) as context:
+                worker.start()
+
+        self.assertEqual(str(context.exception), "Analysis worker failed to start")
+        self.assertFalse(worker.is_running)
+
+    def test_error(self, fixtures: Fixtures) -> None:
+        with self.assertRaises(analysis.AnalysisError) as context:
+            fixtures.analysis_worker.kmeans(DATA, 7)
+
+        self.assertIn("ValueError", str(context.exception))
+        self.assertTrue(fixtures.analysis_worker.is_running)
+
+
+@given(lib.random)
+class DominantFallbackTests(TestCase):
+    def test(self, fixtures: Fixtures) -> None:
+        colors = lib.make_colors("#FF5733 #33FF57 #3357FF #FFFF33")
+
+        with mock.patch.object(
+            analysis.WORKER, "kmeans", side_effect=analysis.AnalysisTimeout
+        ):
+            with self.assertLogs("larry.color", "WARNING") as logs:
+                dominant_colors = Color.dominant(colors, 2, timeout=0.1)
+
+        self.assertEqual(len(dominant_colors), 2)
+        self.assertIn("Not using k-means", logs.output[0])
+        self.assertTrue(set(dominant_colors) <= set(colors))
@@ -0,0 +1,374 @@
+# pylint: disable=missing-docstring,unused-argument
+import os
+from configparser import ConfigParser
+from unittest import TestCase, mock
+
+import numpy as np
+from unittest_fixtures import Fixtures, given
+
+from larry import analysis, cache, color
+from larry.color import Color
+from larry.image import RasterImage, SVGImage
+from larry.palette import Palette
+
+from . import lib
+
+
+def write_image(path: str, data: bytes, mtime_ns: int) -> None:
+    with open(path, "wb") as fp:
+        fp.write(data)
+
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+class CachedImageTests(TestCase):
+    def test_colors_are_sorted(self) -> None:
+        cached = cache.CachedImage(SVGImage(lib.SVG_IMAGE))
+
+        self.assertEqual(
+            cached.colors,
+            lib.make_colors("#000000 #1c343f #254351 #666666 #7c8e96 #ffffff"),
+        )
+
+    def test_index_map(self) -> None:
+        cached = cache.CachedImage(RasterImage(lib.RASTER_IMAGE))
+        index_map = cached.index_map
+        assert index_map is not None
+
+        pixels = cached.image.image.getdata()  # type: ignore[attr-defined]
+        self.assertEqual(index_map.dtype, np.uint16)
+        self.assertEqual(
+            [cached.colors[i] for i in index_map.ravel()],
+            [Color(*rgba[:3]) for rgba in pixels],
+        )
+
+    def test_index_map_for_svg_is_none(self) -> None:
+        self.assertIsNone(cache.CachedImage(SVGImage(lib.SVG_IMAGE)).index_map)
+
+    def test_no_index_map_for_large_images(self) -> None:
+        cached = cache.CachedImage(RasterImage(lib.RASTER_IMAGE))
+        width, height = cached.image.image.size  # type: ignore[attr-defined]
+
+        with mock.patch.object(cache, "INDEX_MAP_PIXELS", width * height - 1):
+            self.assertIsNone(cached.index_map)
+
+    def test_sample(self) -> None:
+        cached = cache.CachedImage(RasterImage(lib.RASTER_IMAGE))
+
+        with mock.patch.object(
+            cache, "analyze", side_effect=AssertionError("not sampled")
+        ):
+            palette, counts = cached.sample(25)
+
+        self.assertEqual(palette.argsort().tolist(), list(range(len(palette))))
+        self.assertEqual(counts.sum(), 25)
+        self.assertTrue(set(palette) <= set(cached.colors))
+        self.assertIs(cached.sample(25), cached.sample(25))
+        self.assertIsNot(cached.sample(25, seed=1), cached.sample(25))
+
+
+class QuantizedTests(TestCase):
+    def test_quantize(self) -> None:
+        cached = cache.CachedImage(RasterImage(lib.RASTER_IMAGE))
+
+        quantized = cached.quantize(4, "mediancut")
+        assert quantized is not None
+
+        self.assertEqual(len(quantized.colors), 4)
+        self.assertEqual(quantized.palette.argsort().tolist(), [0, 1, 2, 3])
+        self.assertEqual(quantized.counts.sum(), cached.counts.sum())
+        self.assertEqual(
+            quantized.counts.tolist(),
+            np.bincount(quantized.nearest, weights=cached.counts).tolist(),
+        )
+        self.assertIs(cached.quantize(4, "mediancut"), quantized)
+
+    def test_nothing_to_quantize(self) -> None:
+        self.assertIsNone(
+            cache.CachedImage(SVGImage(lib.SVG_IMAGE)).quantize(2, "octree")
+        )
+        self.assertIsNone(
+            cache.CachedImage(RasterImage(lib.RASTER_IMAGE)).quantize(10, "octree")
+        )
+
+    def test_replace(self) -> None:
+        cached = cache.CachedImage(RasterImage(lib.RASTER_IMAGE))
+        quantized = cached.quantize(4, "mediancut")
+        assert quantized is not None
+        new_colors = lib.make_colors("#000 #f00 #0f0 #00f")
+
+        image = quantized.replace(new_colors)
+
+        self.assertEqual(
+            image.colors, {new_colors[i] for i in set(quantized.nearest.tolist())}
+        )
+        pixels = [Color(*rgba[:3]) for rgba in image.image.getdata()]
+        orig_pixels = cached.image.image.getdata()  # type: ignore[attr-defined]
+        self.assertEqual(
+            pixels,
+            [
+                new_colors[quantized.nearest[cached.colors.index(Color(*rgba[:3]))]]
+                for rgba in orig_pixels
+            ],
+        )
+
+    def test_replace_with_residuals(self) -> None:
+        cached = cache.CachedImage(RasterImage(lib.RASTER_IMAGE))
+        quantized = cached.quantize(4, "mediancut")
+        assert quantized is not None
+
+        image = quantized.replace(quantized.colors, residuals=True)
+
+        self.assertEqual(image.image.tobytes(), cached.image.image.tobytes())  # type: ignore[attr-defined]
+
+    def test_replace_with_fewer_colors(self) -> None:
+        cached = cache.CachedImage(RasterImage(lib.RASTER_IMAGE))
+        quantized = cached.quantize(4, "mediancut")
+        assert quantized is not None
+
+        image = quantized.replace(lib.make_colors("#000"))
+
+        self.assertEqual(image.colors, {Color("#000"), *quantized.colors[1:]})
+
+
+@given(lib.tmpdir)
+class ImageCacheTests(TestCase):
+    def test_returns_cached_entry(self, fixtures: Fixtures) -> None:
+        path = f"{fixtures.tmpdir}/test.png"
+        write_image(path, lib.RASTER_IMAGE, 1)
+        image_cache = cache.ImageCache()
+
+        entry = image_cache.get(path)
+
+        with mock.patch.object(cache, "read_file") as read_file:
+            self.assertIs(image_cache.get(path), entry)
+
+        read_file.assert_not_called()
+
+    def test_changed_file_is_reread(self, fixtures: Fixtures) -> None:
+        path = f"{fixtures.tmpdir}/test.img"
+        write_image(path, lib.RASTER_IMAGE, 1)
+        image_cache = cache.ImageCache()
+        image_cache.get(path)
+
+        write_image(path, lib.SVG_IMAGE, 2)
+        entry = image_cache.get(path)
+
+        self.assertIsInstance(entry.image, SVGImage)
+        self.assertEqual(len(image_cache), 1)
+
+    def test_command_is_keyed_by_output(self, fixtures: Fixtures) -> None:
+        path = f"{fixtures.tmpdir}/test.png"
+        write_image(path, lib.RASTER_IMAGE, 1)
+        image_cache = cache.ImageCache()
+        command = f"!cat {path}"
+
+        entry = image_cache.get(command)
+        self.assertIs(image_cache.get(command), entry)
+
+        write_image(path, lib.SVG_IMAGE, 1)
+        self.assertIsInstance(image_cache.get(command).image, SVGImage)
+
+    def test_maxsize(self, fixtures: Fixtures) -> None:
+        image_cache = cache.ImageCache(maxsize=2)
+        paths = [f"{fixtures.tmpdir}/{i}.png" for i in range(3)]
+
+        for path in paths:
+            write_image(path, lib.RASTER_IMAGE, 1)
+            image_cache.get(path)
+
+        self.assertEqual(len(image_cache), 2)
+
+        # The least recently used was evicted
+        with mock.patch.object(cache, "read_file", wraps=cache.read_file) as read_file:
+            image_cache.get(paths[2])
+            image_cache.get(paths[0])
+
+        read_file.assert_called_once_with(paths[0])
+
+    def test_invalidate(self, fixtures: Fixtures) -> None:
+        path = f"{fixtures.tmpdir}/test.png"
+        write_image(path, lib.RASTER_IMAGE, 1)
+        image_cache = cache.ImageCache()
+        entry = image_cache.get(path)
+
+        image_cache.invalidate(path)
+
+        self.assertEqual(len(image_cache), 0)
+        self.assertIsNot(image_cache.get(path), entry)
+
+    def test_clear(self, fixtures: Fixtures) -> None:
+        path = f"{fixtures.tmpdir}/test.png"
+        write_image(path, lib.RASTER_IMAGE, 1)
+        image_cache = cache.ImageCache()
+        image_cache.get(path)
+
+        image_cache.clear()
+
+        self.assertEqual(len(image_cache), 0)
+
+
+@given(lib.tmpdir)
+class PaletteStoreTests(TestCase):
+    def test_palette(self, fixtures: Fixtures) -> None:
+        store = cache.PaletteStore(fixtures.tmpdir)
+        palette = Palette.from_colors(lib.make_colors("#000 #f00 #fff"))
+        counts = np.array([1, 20, 300])
+
+        self.assertIsNone(store.load_palette("key"))
+        store.save_palette("key", palette, counts)
+        stored = store.load_palette("key")
+        assert stored is not None
+
+        self.assertEqual(stored[0], palette)
+        self.assertEqual(stored[1].tolist(), [1, 20, 300])
+
+    def test_palette_format(self, fixtures: Fixtures) -> None:
+        store = cache.PaletteStore(fixtures.tmpdir)
+        palette = Palette.from_colors(lib.make_colors("#000 #f00 #fff"))
+        store.save_palette("key", palette, np.array([1, 20, 300]))
+
+        records = np.load(f"{fixtures.tmpdir}/palettes/key.npy", mmap_mode="r")
+
+        self.assertEqual(records.dtype, cache.PALETTE_DTYPE)
+        self.assertEqual(records["rgb"].tolist(), palette.array.tolist())
+
+    def test_unreadable_entry_is_ignored(self, fixtures: Fixtures) -> None:
+        store = cache.PaletteStore(fixtures.tmpdir)
+        os.makedirs(f"{fixtures.tmpdir}/palettes")
+        with open(f"{fixtures.tmpdir}/palettes/key.npy", "wb") as fp:
+            fp.write(b"bogus")
+
+        self.assertIsNone(store.load_palette("key"))
+
+    def test_dominant(self, fixtures: Fixtures) -> None:
+        store = cache.PaletteStore(fixtures.tmpdir)
+        colors = lib.make_colors("#000 #111 #eee #fff")
+        dominant = lib.make_colors("#080808 #f7f7f7")
+
+        self.assertIsNone(store.load_dominant(colors, 2))
+        store.save_dominant(colors, 2, dominant)
+
+        self.assertEqual(store.load_dominant(colors, 2), dominant)
+        self.assertIsNone(store.load_dominant(colors, 3))
+        self.assertIsNone(store.load_dominant(colors, 2, "octree"))
+
+        store.save_dominant(colors, 2, dominant[:1], "octree")
+
+        self.assertEqual(store.load_dominant(colors, 2, "octree"), dominant[:1])
+        self.assertEqual(store.load_dominant(colors, 2), dominant)
+
+    def test_dominant_key_has_version(self, fixtures: Fixtures) -> None:
+        store = cache.PaletteStore(fixtures.tmpdir)
+        colors = lib.make_colors("#000 #111 #eee #fff")
+        store.save_dominant(colors, 2, colors[:2])
+
+        with mock.patch.object(cache, "__version__", "0.0.0"):
+            self.assertIsNone(store.load_dominant(colors, 2))
+
+    def test_prune_removes_least_recently_used(self, fixtures: Fixtures) -> None:
+        store = cache.PaletteStore(fixtures.tmpdir)
+        palette = Palette.from_colors(lib.make_colors("#000 #f00 #fff"))
+
+        for i, key in enumerate(["first", "second", "third"]):
+            store.save_palette(key, palette, np.array([1, 2, 3]))
+            os.utime(f"{fixtures.tmpdir}/palettes/{key}.npy", ns=(i, i))
+        size = os.path.getsize(f"{fixtures.tmpdir}/palettes/first.npy")
+
+        store.max_size = 2 * size
+        store.prune()
+
+        self.assertIsNone(store.load_palette("first"))
+        self.assertIsNotNone(store.load_palette("second"))
+        self.assertIsNotNone(store.load_palette("third"))
+
+    def test_from_config(self, fixtures: Fixtures) -> None:
+        config = ConfigParser()
+        config.read_dict(
+            {"larry": {"cache_dir": fixtures.tmpdir, "disk_cache_size": "2"}}
+        )
+
+        store = cache.PaletteStore.from_config(config)
+        assert store is not None
+
+        self.assertEqual(str(store.path), fixtures.tmpdir)
+        self.assertEqual(store.max_size, 2 << 20)
+
+    def test_from_config_disabled(self, fixtures: Fixtures) -> None:
+        config = ConfigParser()
+        config.read_dict({"larry": {"disk_cache": "false"}})
+
+        self.assertIsNone(cache.PaletteStore.from_config(config))
+
+
+@given(lib.tmpdir)
+class CachedImageFromStoreTests(TestCase):
+    def test_analysis_is_stored(self, fixtures: Fixtures) -> None:
+        store = cache.PaletteStore(fixtures.tmpdir)
+        entry = cache.cached_image(lib.RASTER_IMAGE, store)
+        entry.analysis  # pylint: disable=pointless-statement
+
+        with mock.patch.object(cache, "analyze") as analyze:
+            stored = cache.cached_image(lib.RASTER_IMAGE, store)
+            stored.analysis  # pylint: disable=pointless-statement
+
+        analyze.assert_not_called()
+        self.assertEqual(stored.palette, entry.palette)
+        self.assertEqual(stored.counts.tolist(), entry.counts.tolist())
+
+    def test_image_cache_uses_store(self, fixtures: Fixtures) -> None:
+        path = f"{fixtures.tmpdir}/test.png"
+        write_image(path, lib.RASTER_IMAGE, 1)
+        store = cache.PaletteStore(f"{fixtures.tmpdir}/cache")
+
+        entry = cache.ImageCache().get(path, store)
+        self.assertIsNone(store.load_palette(cache.content_hash(lib.RASTER_IMAGE)))
+        entry.analysis  # pylint: disable=pointless-statement
+
+        self.assertIsNotNone(store.load_palette(cache.content_hash(lib.RASTER_IMAGE)))
+
+    def test_key_has_version(self, fixtures: Fixtures) -> None:
+        key = cache.content_hash(lib.RASTER_IMAGE)
+
+        with mock.patch.object(cache, "__version__", "0.0.0"):
+            self.assertNotEqual(cache.content_hash(lib.RASTER_IMAGE), key)
+
+    def test_analysis_is_done_when_needed(self, fixtures: Fixtures) -> None:
+        store = cache.PaletteStore(fixtures.tmpdir)
+
+        with mock.patch.object(cache, "analyze", wraps=cache.analyze) as analyze:
+            entry = cache.cached_image(lib.RASTER_IMAGE, store)
+            analyze.assert_not_called()
+
+            self.assertEqual(len(entry.palette), 10)
+            self.assertEqual(entry.counts.sum(), 100)
+
+        analyze.assert_called_once_with(entry.image)
+
+
+@given(lib.tmpdir, lib.nprandom)
+class DominantStoreTests(TestCase):
+    def test_results_are_stored(self, fixtures: Fixtures) -> None:
+        store = cache.PaletteStore(fixtures.tmpdir)
+        colors = lib.make_colors("#000 #111 #eee #fff")
+
+        dominant = Color.dominant(colors, 2, store=store)
+
+        with mock.patch.object(analysis.WORKER, "kmeans") as kmeans:
+            self.assertEqual(Color.dominant(colors, 2, store=store), dominant)
+
+        kmeans.assert_not_called()
+
+    def test_fallback_is_not_stored(self, fixtures: Fixtures) -> None:
+        store = cache.PaletteStore(fixtures.tmpdir)
+        colors = lib.make_colors("#000 #111 #eee #fff")
+
+        with (
+            mock.patch.object(
+                analysis.WORKER, "kmeans", side_effect=analysis.AnalysisTimeout
+            ),
+            mock.patch.object(color, "LOGGER"),
+        ):
+            Color.dominant(colors, 2, store=store)
+
+        self.assertIsNone(store.load_dominant(colors, 2))
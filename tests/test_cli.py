@@ -8,8 +8,8 @@ from unittest import IsolatedAsyncioTestCase, TestCase, mock
 
 from unittest_fixtures import FixtureContext, Fixtures, fixture, given
 
-from larry import cli, filters
-from larry.image import make_image_from_bytes
+from larry import cache, cli, filters, hsvtable
+from larry.image import RasterImage, SVGImage, make_image_from_bytes
 from larry.io import read_file
 
 from . import lib
@@ -75,6 +75,207 @@ class RunTests(IsolatedAsyncioTestCase):
             ]
         )
 
+    async def test_filters_get_pixel_counts(
+        self, _do_plugin: mock.Mock, fixtures: Fixtures
+    ) -> None:
+        weights = []
+
+        def apply_filters(colors, _config):
+            weights.append(filters.pipeline.color_weights(colors))
+            return colors
+
+        with mock.patch.object(cli, "apply_filters", side_effect=apply_filters):
+            await cli.run(fixtures.configmaker.path)
+
+        _, counts = cache.analyze(make_image_from_bytes(lib.SVG_IMAGE))
+        self.assertEqual(weights[0].tolist(), counts.tolist())
+        self.assertIsNone(filters.pipeline.color_weights(counts))
+
+    async def test_plugins_get_pixel_counts(
+        self, do_plugin: mock.Mock, fixtures: Fixtures
+    ) -> None:
+        configmaker = fixtures.configmaker
+        configmaker.add_config(plugins="dummy", filter="inverse pastelize")
+        weights = []
+
+        async def plugin(_name, colors, _config_path):
+            weights.append(filters.pipeline.color_weights(colors))
+            weights.append(filters.pipeline.color_weights(list(colors)))
+
+        do_plugin.side_effect = plugin
+
+        await cli.run(configmaker.path)
+
+        _, counts = cache.analyze(make_image_from_bytes(lib.SVG_IMAGE))
+        self.assertEqual(weights[0].tolist(), counts.tolist())
+        self.assertIsNone(weights[1])
+
+    async def test_quantize(self, _do_plugin: mock.Mock, fixtures: Fixtures) -> None:
+        configmaker = fixtures.configmaker
+        path = f"{fixtures.tmpdir}/input.png"
+        with open(path, "wb") as fp:
+            fp.write(lib.RASTER_IMAGE)
+        configmaker.add_config(
+            input=path,
+            output=f"{fixtures.tmpdir}/output.png",
+            filter="inverse",
+            quantize="4",
+            quantize_method="mediancut",
+        )
+        seen = []
+        run_filters = cli.apply_filters
+
+        def apply_filters(colors, config):
+            seen.append((colors, filters.pipeline.color_weights(colors)))
+            return run_filters(colors, config)
+
+        with mock.patch.object(cli, "apply_filters", side_effect=apply_filters):
+            await cli.run(configmaker.path)
+
+        quantized = cli.IMAGE_CACHE.get(path, embedded=False).quantize(4, "mediancut")
+        assert quantized is not None
+        colors, weights = seen[0]
+        self.assertEqual(colors, quantized.colors)
+        self.assertEqual(weights.tolist(), quantized.counts.tolist())
+        image = make_image_from_bytes(read_file(f"{fixtures.tmpdir}/output.png"))
+        self.assertEqual(set(image.colors), {color.inverse() for color in colors})
+
+    async def test_quantize_residuals(
+        self, _do_plugin: mock.Mock, fixtures: Fixtures
+    ) -> None:
+        configmaker = fixtures.configmaker
+        path = f"{fixtures.tmpdir}/input.png"
+        with open(path, "wb") as fp:
+            fp.write(lib.RASTER_IMAGE)
+        configmaker.add_config(
+            input=path,
+            output=f"{fixtures.tmpdir}/output.png",
+            filter="none",
+            colors="#000",
+            quantize="4",
+            quantize_residuals="true",
+        )
+
+        with mock.patch.object(cli.Quantized, "replace") as replace:
+            await cli.run(configmaker.path)
+
+        replace.assert_called_once_with(lib.make_colors("#000"), True)
+
+    async def test_quantize_is_off_by_default(
+        self, _do_plugin: mock.Mock, fixtures: Fixtures
+    ) -> None:
+        with mock.patch.object(cli.CachedImage, "quantize") as quantize:
+            await cli.run(fixtures.configmaker.path)
+
+        quantize.assert_not_called()
+
+    async def test_pixels_mode(self, do_plugin: mock.Mock, fixtures: Fixtures) -> None:
+        configmaker = fixtures.configmaker
+        path = f"{fixtures.tmpdir}/input.png"
+        with open(path, "wb") as fp:
+            fp.write(lib.RASTER_IMAGE)
+        configmaker.add_config(
+            input=path,
+            output=f"{fixtures.tmpdir}/palette.png",
+            filter="inverse pastelize",
+            plugins="dummy",
+        )
+        await cli.run(configmaker.path)
+        palette_colors = do_plugin.call_args[0][1]
+        configmaker.add_config(output=f"{fixtures.tmpdir}/pixels.png", mode="pixels")
+
+        with (
+            mock.patch.object(cli.RasterImage, "replace", autospec=True) as replace,
+            mock.patch.object(
+                cli.RasterImage,
+                "map_pixels",
+                autospec=True,
+                side_effect=cli.RasterImage.map_pixels,
+            ) as map_pixels,
+        ):
+            await cli.run(configmaker.path)
+
+        replace.assert_not_called()
+        map_pixels.assert_called_once()
+        self.assertEqual(
+            read_file(f"{fixtures.tmpdir}/pixels.png"),
+            read_file(f"{fixtures.tmpdir}/palette.png"),
+        )
+        self.assertEqual(do_plugin.call_args[0][1], palette_colors)
+
+    async def test_max_size(self, _do_plugin: mock.Mock, fixtures: Fixtures) -> None:
+        configmaker = fixtures.configmaker
+        path = f"{fixtures.tmpdir}/input.png"
+        with open(path, "wb") as fp:
+            fp.write(lib.RASTER_IMAGE)
+        output = f"{fixtures.tmpdir}/output.png"
+        configmaker.add_config(input=path, output=output, max_size="4x6")
+
+        await cli.run(configmaker.path)
+
+        image = make_image_from_bytes(read_file(output))
+        assert isinstance(image, RasterImage)
+        self.assertEqual(image.image.size, (4, 4))
+
+        with mock.patch("larry.cache.read_file") as mock_read_file:
+            await cli.run(configmaker.path)
+
+        mock_read_file.assert_not_called()
+
+    async def test_pixels_mode_samples_the_palette(
+        self, do_plugin: mock.Mock, fixtures: Fixtures
+    ) -> None:
+        configmaker = fixtures.configmaker
+        path = f"{fixtures.tmpdir}/input.png"
+        with open(path, "wb") as fp:
+            fp.write(lib.RASTER_IMAGE)
+        configmaker.add_config(
+            input=path,
+            output=f"{fixtures.tmpdir}/output.png",
+            filter="inverse",
+            mode="pixels",
+            plugins="dummy",
+            sample_size="9",
+        )
+
+        with mock.patch.object(
+            cache, "analyze", side_effect=AssertionError("not sampled")
+        ):
+            await cli.run(configmaker.path)
+
+        cached = cli.IMAGE_CACHE.get(path, embedded=False)
+        sample, _ = cached.sample(9)
+        inverse = filters.load_filter("inverse")
+        do_plugin.assert_called_once_with(
+            "dummy", inverse(sample.to_colors(), ANY), configmaker.path
+        )
+
+    async def test_pixels_mode_does_not_quantize(
+        self, _do_plugin: mock.Mock, fixtures: Fixtures
+    ) -> None:
+        configmaker = fixtures.configmaker
+        path = f"{fixtures.tmpdir}/input.png"
+        with open(path, "wb") as fp:
+            fp.write(lib.RASTER_IMAGE)
+        configmaker.add_config(
+            input=path,
+            output=f"{fixtures.tmpdir}/output.png",
+            filter="inverse",
+            mode="pixels",
+            plugins="dummy",
+            quantize="4",
+        )
+
+        with (
+            mock.patch.object(cli, "quantize_image") as quantize_image,
+            mock.patch.object(
+                cache, "analyze", side_effect=AssertionError("palette built")
+            ),
+        ):
+            await cli.run(configmaker.path)
+
+        quantize_image.assert_not_called()
+
     async def test_pause_mode_does_nothing(
         self, _do_plugin: mock.Mock, fixtures: Fixtures
     ) -> None:
@@ -131,11 +332,281 @@ class RunTests(IsolatedAsyncioTestCase):
     async def test_run_with_no_config(
         self, _do_plugin: mock.Mock, fixtures: Fixtures
     ) -> None:
+        cache_dir = f"{fixtures.tmpdir}/cache"
         with mock.patch("larry.cli.write_file") as write_file:
-            await cli.run(f"{fixtures.tmpdir}/bogus.cfg")
+            with mock.patch("larry.cache.CACHE_DIR", cache_dir):
+                await cli.run(f"{fixtures.tmpdir}/bogus.cfg")
 
         write_file.assert_called()
 
+    async def test_caches_input_image(
+        self, _do_plugin: mock.Mock, fixtures: Fixtures
+    ) -> None:
+        configmaker = fixtures.configmaker
+        configmaker.add_config(input=f"{fixtures.tmpdir}/input.svg")
+        with open(f"{fixtures.tmpdir}/input.svg", "wb") as fp:
+            fp.write(lib.SVG_IMAGE)
+
+        await cli.run(configmaker.path)
+
+        with mock.patch("larry.cache.read_file") as mock_read_file:
+            await cli.run(configmaker.path)
+
+        mock_read_file.assert_not_called()
+
+    async def test_uses_hsv_table(
+        self, _do_plugin: mock.Mock, fixtures: Fixtures
+    ) -> None:
+        configmaker = fixtures.configmaker
+        configmaker.add_config(hsv_table="true", filter="hueshift")
+
+        with (
+            mock.patch.object(cli.pipeline, "run", wraps=cli.pipeline.run) as run,
+            mock.patch.object(cli.HSVTable, "load", return_value=None),
+        ):
+            await cli.run(configmaker.path)
+
+        table = run.call_args[0][2]
+        self.assertEqual(
+            str(table.path), f"{fixtures.tmpdir}/cache/{hsvtable.FILENAME}"
+        )
+
+    async def test_hsv_table_is_off_by_default(
+        self, _do_plugin: mock.Mock, fixtures: Fixtures
+    ) -> None:
+        with mock.patch.object(cli.pipeline, "run", wraps=cli.pipeline.run) as run:
+            await cli.run(fixtures.configmaker.path)
+
+        self.assertIsNone(run.call_args[0][2])
+
+
+@given(lib.configmaker)
+class ApplyFiltersTests(TestCase):
+    def test(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"]["filter"] = "inverse pastelize"
+        colors = lib.make_colors("#000000 #1c343f #254351 #666666 #7c8e96 #ffffff")
+
+        self.assertEqual(
+            cli.apply_filters(colors, config),
+            filters.load_filter("pastelize")(
+                filters.load_filter("inverse")(colors, config), config
+            ),
+        )
+
+    def test_with_lut(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"]["filter"] = "inverse grayscale"
+        config["larry"]["lut"] = "exact"
+        colors = lib.make_colors("#000000 #1c343f #254351 #666666 #7c8e96 #ffffff")
+
+        with mock.patch.object(
+            cli.lut, "compile_chain", wraps=cli.lut.compile_chain
+        ) as compile_chain:
+            new_colors = cli.apply_filters(colors, config)
+
+        compile_chain.assert_called_once()
+        config["larry"]["lut"] = ""
+        self.assertEqual(new_colors, cli.apply_filters(colors, config))
+
+    def test_fuse_hsv(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"]["filter"] = "hueshift inverse soften pastelize"
+        colors = lib.make_colors("#000000 #1c343f #254351 #666666 #7c8e96 #ffffff")
+
+        with mock.patch.object(cli.pipeline, "fuse", wraps=cli.pipeline.fuse) as fuse:
+            cli.apply_filters(colors, config)
+            fuse.assert_not_called()
+
+            config["larry"]["fuse_hsv"] = "true"
+            cli.apply_filters(colors, config)
+            fuse.assert_called_once()
+
+
+@given(lib.configmaker)
+class PixelChainTests(TestCase):
+    image = RasterImage(lib.RASTER_IMAGE)
+
+    def test(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"].update(mode="pixels", filter="inverse grayscale")
+
+        chain = cli.pixel_chain(self.image, config)
+
+        self.assertEqual(
+            chain,
+            [
+                (filters.load_filter("inverse"), config),
+                (filters.load_filter("grayscale"), config),
+            ],
+        )
+
+    def test_palette_mode(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"]["filter"] = "inverse"
+
+        self.assertIsNone(cli.pixel_chain(self.image, config))
+
+    def test_needs_the_palette(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"]["mode"] = "pixels"
+
+        for filter_names in ["inverse shift", "gradient", "kaleidoscope", "bogus", ""]:
+            with self.subTest(filter=filter_names):
+                config["larry"]["filter"] = filter_names
+                self.assertIsNone(cli.pixel_chain(self.image, config))
+
+    def test_logs_fallback(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"].update(mode="pixels", filter="inverse shift gradient")
+
+        with self.assertLogs(cli.LOGGER, "INFO") as logs:
+            self.assertIsNone(cli.pixel_chain(self.image, config))
+
+        self.assertEqual(
+            logs.output,
+            [
+                "INFO:larry:Filters need the palette: shift gradient. Filtering the"
+                " palette instead of the pixels"
+            ],
+        )
+
+    def test_per_color_filters(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"].update(mode="pixels", filter="brighten timeofday", lut="17")
+
+        chain = cli.pixel_chain(self.image, config)
+
+        assert chain is not None
+        self.assertEqual(len(chain), 2)
+        self.assertIs(chain[1][0], filters.load_filter("timeofday"))
+
+    def test_random_values(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"].update(mode="pixels", filter="hueshift")
+        config["filters:hueshift"] = {"amount": "random"}
+
+        with self.assertLogs(cli.LOGGER, "INFO"):
+            self.assertIsNone(cli.pixel_chain(self.image, config))
+
+    def test_images_without_pixels(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"].update(mode="pixels", filter="inverse")
+        paletted = RasterImage(lib.RASTER_IMAGE)
+        paletted.image = paletted.image.convert("RGB").quantize(16)
+
+        self.assertIsNone(cli.pixel_chain(SVGImage(lib.SVG_IMAGE), config))
+        self.assertIsNone(cli.pixel_chain(paletted, config))
+
+    def test_with_lut(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"].update(mode="pixels", filter="inverse grayscale", lut="17")
+
+        with mock.patch.object(
+            cli.lut, "compile_chain", wraps=cli.lut.compile_chain
+        ) as compile_chain:
+            chain = cli.pixel_chain(self.image, config)
+
+        compile_chain.assert_called_once_with(
+            [
+                (filters.load_filter("inverse"), config),
+                (filters.load_filter("grayscale"), config),
+            ],
+            17,
+            ANY,
+        )
+        assert chain is not None
+        self.assertEqual(len(chain), 1)
+
+
+@given(lib.configmaker)
+class MaxSizeTests(TestCase):
+    def test(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+
+        for value, expected in [
+            ("1920x1080", (1920, 1080)),
+            (" 2560X1440 ", (2560, 1440)),
+            ("1000", (1000, 1000)),
+            ("", None),
+        ]:
+            with self.subTest(value=value):
+                config["larry"]["max_size"] = value
+                self.assertEqual(cli.max_size(config), expected)
+
+    def test_not_given(self, fixtures: Fixtures) -> None:
+        self.assertIsNone(cli.max_size(fixtures.configmaker.config))
+
+    def test_invalid(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+
+        for value in ["big", "0x100", "100x", "-1"]:
+            with self.subTest(value=value):
+                config["larry"]["max_size"] = value
+
+                with mock.patch.object(cli, "LOGGER") as logger:
+                    self.assertIsNone(cli.max_size(config))
+
+                logger.warning.assert_called_once_with(
+                    "Invalid max_size %r. Not downscaling.", value
+                )
+
+
+@given(lib.configmaker)
+class PixelsPaletteTests(TestCase):
+    cached = cache.CachedImage(RasterImage(lib.RASTER_IMAGE))
+
+    def test_sample(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"]["sample_size"] = "4"
+
+        palette, counts = cli.pixels_palette(self.cached, config)
+
+        self.assertIs(palette, self.cached.sample(4)[0])
+        self.assertIs(counts, self.cached.sample(4)[1])
+
+    def test_default_sample_size(self, fixtures: Fixtures) -> None:
+        with mock.patch.object(self.cached, "sample") as sample:
+            cli.pixels_palette(self.cached, fixtures.configmaker.config)
+
+        sample.assert_called_once_with(cli.SAMPLE_SIZE)
+
+    def test_whole_palette(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"]["sample_size"] = "0"
+
+        palette, counts = cli.pixels_palette(self.cached, config)
+
+        self.assertIs(palette, self.cached.palette)
+        self.assertIs(counts, self.cached.counts)
+
+
+@given(lib.configmaker)
+class QuantizeImageTests(TestCase):
+    def test(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"]["quantize"] = "8"
+        config["larry"]["distance"] = "oklab"
+        cached = mock.Mock()
+
+        quantized = cli.quantize_image(cached, config)
+
+        self.assertIs(quantized, cached.quantize.return_value)
+        cached.quantize.assert_called_once_with(8, cli.QUANTIZE_METHOD, "oklab")
+
+    def test_unknown_method(self, fixtures: Fixtures) -> None:
+        configmaker = fixtures.configmaker
+        configmaker.add_config(quantize="4", quantize_method="bogus")
+        cached = mock.Mock()
+
+        with mock.patch.object(cli, "LOGGER") as logger:
+            cli.quantize_image(cached, configmaker.config)
+
+        logger.warning.assert_called_once_with(
+            "Unknown quantize method %r. Using %s", "bogus", cli.QUANTIZE_METHOD
+        )
+        cached.quantize.assert_called_once_with(4, cli.QUANTIZE_METHOD, "rgb")
+
 
 @given(lib.configmaker)
 class RunEveryTests(IsolatedAsyncioTestCase):
@@ -1,5 +1,5 @@
 # pylint: disable=missing-docstring,duplicate-code,unused-argument
-from unittest import TestCase
+from unittest import TestCase, mock
 
 import numpy as np
 from unittest_fixtures import Fixtures, given
@@ -430,6 +430,55 @@ class DominantTests(TestCase):
         expected = ["#ffae19", "#7b6df7", "#33ff57"]
         self.assertEqual([Color(i) for i in expected], dominant_colors)
 
+    def test_quantizer_methods(self, fixtures: Fixtures) -> None:
+        colors = lib.make_colors("#ff0000 " * 5 + "#fe0101 #0000ff #0101fe #00ff00")
+
+        for method in ["mediancut", "octree", "kmeans", "minibatch", "histogram"]:
+            with self.subTest(method=method):
+                with mock.patch.object(color.analysis.WORKER, "kmeans") as kmeans:
+                    dominant_colors = Color.dominant(colors, 3, method=method)
+
+                kmeans.assert_not_called()
+                self.assertEqual(len(dominant_colors), 3)
+                # The reds are the heaviest
+                self.assertGreater(dominant_colors[0].red, 250)
+                self.assertLess(dominant_colors[0].blue, 2)
+
+    def test_fewer_colors_than_needed(self, fixtures: Fixtures) -> None:
+        colors = lib.make_colors("#ff0000 #ff0000 #0000ff")
+
+        dominant_colors = Color.dominant(colors, 3, method="octree")
+
+        self.assertEqual(dominant_colors, lib.make_colors("#ff0000 #0000ff #ff0000"))
+
+    def test_weights(self, fixtures: Fixtures) -> None:
+        colors = lib.make_colors("#ff0000 #0000ff #00ff00")
+
+        dominant_colors = Color.dominant(
+            colors, 1, method="mediancut", weights=[1, 10, 1]
+        )
+
+        self.assertEqual(dominant_colors, lib.make_colors("#1515d4"))
+
+    def test_weights_with_sklearn(self, fixtures: Fixtures) -> None:
+        colors = lib.make_colors("#ff0000 #0000ff #ff0000 #00ff00")
+
+        with mock.patch.object(
+            color.analysis.WORKER, "kmeans", return_value=np.zeros((1, 3))
+        ) as kmeans:
+            Color.dominant(colors, 1, weights=[1, 10, 2, 1])
+
+        data = kmeans.call_args.args[0]
+        sample_weight = kmeans.call_args.kwargs["sample_weight"]
+        self.assertEqual(
+            dict(zip(map(tuple, data.tolist()), sample_weight.tolist())),
+            {(255, 0, 0): 3.0, (0, 0, 255): 10.0, (0, 255, 0): 1.0},
+        )
+
+    def test_unknown_method(self, fixtures: Fixtures) -> None:
+        with self.assertRaises(ValueError):
+            Color.dominant(lib.make_colors("#ff0000 #0000ff"), 1, method="bogus")
+
 
 class ReplaceString(TestCase):
     def test1(self):
@@ -511,6 +560,22 @@ d {
         self.assertEqual(result, expected)
 
 
+class FormatColorTests(TestCase):
+    def test_hex(self) -> None:
+        self.assertEqual(color.format_color("#333", Color("#1245ef")), "#1245ef")
+
+    def test_rgb(self) -> None:
+        self.assertEqual(
+            color.format_color("rgb(51,51,51)", Color("#1245ef")), "rgb(18, 69, 239)"
+        )
+
+    def test_rgba_keeps_alpha(self) -> None:
+        self.assertEqual(
+            color.format_color("rgba(0, 45, 108, 0.6)", Color("#1245ef")),
+            "rgba(18, 69, 239, 0.6)",
+        )
+
+
 class ColorFloatTests(TestCase):
     def test_init_no_args(self):
         cf = ColorFloat()
@@ -685,6 +750,19 @@ class ClosestTests(TestCase):
     def closest(self, c: str) -> Color:
         return Color(c).closest(self.colors)
 
+    def test_space(self) -> None:
+        colors = lib.make_colors("#0000ff #008080 #808080")
+
+        self.assertEqual(Color("#382c7b").closest(colors, "lab"), Color("#808080"))
+        self.assertEqual(Color("#382c7b").closest(colors, "oklab"), Color("#0000ff"))
+
+    def test_distance_space(self) -> None:
+        black = Color("#000000")
+        white = Color("#ffffff")
+
+        self.assertAlmostEqual(black.distance(white, "lab"), 100, places=4)
+        self.assertAlmostEqual(black.distance(white, "oklab"), 1, places=4)
+
 
 class ToArrayTests(TestCase):
     def test(self) -> None:
@@ -702,3 +780,29 @@ class FromArrayTests(TestCase):
         c = Color.from_array(array)
 
         self.assertEqual(c, Color("#7e118f"))
+
+
+class RGBToHSVTests(TestCase):
+    def test(self) -> None:
+        colors = lib.make_colors("#9a59db #000000 #ffffff #7e118f #35dfe9 #ff0000")
+
+        hsv = color.rgb_to_hsv(np.array(colors))
+
+        expected = np.array([c.to_hsv() for c in colors])
+        self.assertTrue(np.array_equal(hsv, expected), hsv)
+
+    def test_gray_hue(self) -> None:
+        hsv = color.rgb_to_hsv([[102, 102, 102]])
+
+        self.assertEqual(hsv[0, 0], 359.0)
+
+
+class HSVToRGBTests(TestCase):
+    def test(self) -> None:
+        hsv = [(270, 59, 86), (-90, 59, 86), (360, 59, 86), (270, 0, 86), (0, 130, 50)]
+
+        rgb = color.hsv_to_rgb(hsv)
+
+        expected = [Color.from_hsv(i) for i in hsv]
+        self.assertEqual([Color(*i) for i in rgb.tolist()], expected)
+        self.assertEqual(rgb.dtype, np.uint8)
@@ -4,12 +4,15 @@ import random
 from inspect import signature
 from unittest import TestCase, mock
 
+import numpy as np
 from unittest_fixtures import Fixtures, given, params
 
-from larry import filters
+from larry import filters, quantize
 from larry.color import Color
 from larry.config import DEFAULT_INPUT_PATH
+from larry.filters import pipeline
 from larry.filters.random import cfilter as random_filter
+from larry.palette import Palette
 
 from . import lib
 
@@ -425,6 +428,101 @@ class ReduceTests(FilterTestCase):
 
         self.assertEqual(colors, self.orig_colors)
 
+    def test_distance(self):
+        config = lib.make_config("reduce", amount=3, distance="oklab")
+
+        with mock.patch("larry.filters.reduce.random", random.Random(2)):
+            colors = self.filter(self.orig_colors, config)
+
+        selected = set(colors)
+        self.assertEqual(len(selected), 3)
+        self.assertEqual(
+            colors,
+            [color.closest(list(selected), "oklab") for color in self.orig_colors],
+        )
+
+    def test_invalid_distance(self):
+        config = lib.make_config("reduce", amount=3, distance="cmyk")
+
+        with self.assertRaises(filters.FilterError):
+            self.filter(self.orig_colors, config)
+
+    def test_methods(self):
+        for method in ["mediancut", "octree", "kmeans", "minibatch", "histogram"]:
+            with self.subTest(method=method):
+                config = lib.make_config("reduce", amount=5, method=method)
+
+                with mock.patch("larry.filters.reduce.random") as random_:
+                    colors = self.filter(self.orig_colors, config)
+
+                random_.choices.assert_not_called()
+                selected = set(colors)
+                self.assertLessEqual(len(selected), 5)
+                self.assertGreater(len(selected), 1)
+                self.assertEqual(
+                    colors,
+                    [color.closest(list(selected)) for color in self.orig_colors],
+                )
+                self.assertEqual(self.filter(self.orig_colors, config), colors)
+
+    def test_kmeans_timeout(self):
+        kmeans = quantize.QUANTIZERS["kmeans"]
+
+        for timeout, expected in [(None, None), ("0.5", 0.5)]:
+            with self.subTest(timeout=timeout):
+                options = {} if timeout is None else {"timeout": timeout}
+                config = lib.make_config("reduce", amount=5, method="kmeans", **options)
+
+                wrapped = mock.Mock(wraps=kmeans)
+
+                with mock.patch.dict(quantize.QUANTIZERS, kmeans=wrapped):
+                    self.filter(self.orig_colors, config)
+
+                self.assertEqual(wrapped.call_args.kwargs["timeout"], expected)
+
+    def test_method_with_duplicate_colors(self):
+        config = lib.make_config("reduce", amount=2, method="mediancut")
+        orig_colors = lib.make_colors("#ff0000 #ff0000 #fe0000 #0000ff #0000fe #0000ff")
+
+        colors = self.filter(orig_colors, config)
+
+        self.assertEqual(colors, lib.make_colors("#ff0000 " * 3 + "#0000ff " * 3))
+
+    def test_method_with_few_distinct_colors(self):
+        config = lib.make_config("reduce", amount=2, method="octree")
+        orig_colors = lib.make_colors("#ff0000 #ff0000 #0000ff #0000ff")
+
+        self.assertEqual(self.filter(orig_colors, config), orig_colors)
+
+    def test_weighted(self):
+        config = lib.make_config("reduce", amount=2, method="mediancut")
+        heavy = lib.make_colors("#0916da #f9a423")
+        weights = [10**6 if color in heavy else 1 for color in self.orig_colors]
+
+        with pipeline.weighted(self.orig_colors, weights):
+            colors = self.filter(self.orig_colors, config)
+
+        self.assertEqual(set(colors), set(heavy))
+
+    def test_weighted_random(self):
+        config = lib.make_config("reduce", amount=3)
+        weights = list(range(len(self.orig_colors)))
+
+        with (
+            pipeline.weighted(self.orig_colors, weights),
+            mock.patch("larry.filters.reduce.random", random.Random(1)) as random_,
+            mock.patch.object(random_, "choices", wraps=random_.choices) as choices,
+        ):
+            self.filter(self.orig_colors, config)
+
+        self.assertEqual(choices.call_args.kwargs["weights"], weights)
+
+    def test_invalid_method(self):
+        config = lib.make_config("reduce", amount=3, method="bogus")
+
+        with self.assertRaises(filters.FilterError):
+            self.filter(self.orig_colors, config)
+
 
 class SubGradientTests(FilterTestCase):
     entry_point = "subgradient"
@@ -553,6 +651,19 @@ class ChromeFocusTests(FilterTestCase):
 
         self.assertEqual(colors, ORIG_COLORS)
 
+    def test_weighted(self):
+        config = lib.make_config("larry")
+        orig_colors = lib.make_colors("#0000ff #0000fe #0101ff #ff0000")
+
+        with pipeline.weighted(orig_colors, [1, 1, 1, 100]):
+            colors = self.filter(orig_colors, config)
+
+        # The (heavy) red is the focus and the blues are faded out
+        self.assertEqual(colors[3], orig_colors[3])
+        for color in colors[:3]:
+            self.assertEqual(color.red, color.green)
+            self.assertEqual(color.green, color.blue)
+
 
 class VibranceTests(FilterTestCase):
     entry_point = "vibrance"
@@ -567,6 +678,18 @@ class VibranceTests(FilterTestCase):
         )
         self.assertEqual(colors, expected)
 
+    def test_weighted(self):
+        weights = [1, 2, 3, 4, 5, 6, 7, 800]
+        saturation = Palette.from_colors(ORIG_COLORS).to_hsv()[:, 1]
+        threshold = np.average(saturation, weights=weights)
+
+        with pipeline.weighted(ORIG_COLORS, weights):
+            colors = self.filter(ORIG_COLORS, lib.make_config("larry"))
+
+        config = lib.make_config("vibrance", threshold=threshold)
+        self.assertEqual(colors, self.filter(ORIG_COLORS, config))
+        self.assertNotEqual(colors, self.filter(ORIG_COLORS, lib.make_config("larry")))
+
 
 class ColorBalanceTests(FilterTestCase):
     entry_point = "colorbalance"
@@ -581,6 +704,21 @@ class ColorBalanceTests(FilterTestCase):
         )
         self.assertEqual(colors, expected)
 
+    def test_weighted(self):
+        config = lib.make_config("larry")
+
+        with pipeline.weighted(ORIG_COLORS, [1] * len(ORIG_COLORS)):
+            colors = self.filter(ORIG_COLORS, config)
+
+        self.assertEqual(colors, self.filter(ORIG_COLORS, config))
+
+        # The colors are balanced toward the heaviest
+        with pipeline.weighted(ORIG_COLORS, [10**9] + [1] * (len(ORIG_COLORS) - 1)):
+            colors = self.filter(ORIG_COLORS, config)
+
+        for value, orig_value in zip(colors[0], ORIG_COLORS[0]):
+            self.assertAlmostEqual(value, orig_value, delta=1)
+
 
 class NeonizeTests(FilterTestCase):
     entry_point = "neonize"
@@ -0,0 +1,180 @@
+"""Tests for the filter lookup tables"""
+
+# pylint: disable=missing-docstring
+from configparser import ConfigParser
+from unittest import TestCase, mock
+
+import numpy as np
+from unittest_fixtures import FixtureContext, Fixtures, fixture, given
+
+from larry.cache import PaletteStore
+from larry.filters import load_filter, lut, pipeline
+
+from . import lib
+
+COLORS = np.random.default_rng(1).integers(0, 256, (500, 3)).astype(np.float32)
+
+
+def steps(*names: str, config: ConfigParser | None = None) -> lut.Steps:
+    config = ConfigParser() if config is None else config
+
+    return [(load_filter(name), config) for name in names]
+
+
+class LUTTests(TestCase):
+    def test_exact_matches_filters(self) -> None:
+        chain = steps("inverse", "grayscale")
+        table = lut.LUT.compile(chain, lut.EXACT)
+
+        self.assertEqual(
+            table.apply(COLORS).tolist(),
+            np.trunc(pipeline.run_array(COLORS, chain)).tolist(),
+        )
+
+    def test_lattice_colors_are_exact(self) -> None:
+        chain = steps("sepia", "hueshift")
+        table = lut.LUT.compile(chain, 17)
+        colors = np.stack([table.coords] * 3, axis=1).astype(np.float32)
+
+        self.assertEqual(
+            table.apply(colors).tolist(),
+            np.trunc(pipeline.run_array(colors, chain)).tolist(),
+        )
+
+    def test_interpolates(self) -> None:
+        table = lut.LUT.compile(steps("inverse"), 33)
+
+        self.assertEqual(table.apply(COLORS).tolist(), (255 - COLORS).tolist())
+
+    def test_close_to_filters(self) -> None:
+        chain = steps("sepia", "neonize")
+        table = lut.LUT.compile(chain, 65)
+
+        error = np.abs(table.apply(COLORS) - pipeline.run_array(COLORS, chain))
+
+        self.assertLess(error.mean(), 2)
+
+    def test_pixel_buffer(self) -> None:
+        table = lut.LUT.compile(steps("inverse"), 9)
+        pixels = COLORS.reshape(20, 25, 3)
+
+        self.assertEqual(table.apply(pixels).tolist(), (255 - pixels).tolist())
+
+
+class LUTSizeTests(TestCase):
+    def test(self) -> None:
+        for value, expected in [
+            ("", None),
+            ("off", None),
+            ("33", 33),
+            ("exact", 256),
+            ("1", None),
+            ("257", None),
+            ("bogus", None),
+        ]:
+            with self.subTest(value=value), mock.patch.object(lut, "LOGGER"):
+                config = ConfigParser()
+                config["larry"] = {"lut": value}
+
+                self.assertEqual(lut.lut_size(config), expected)
+
+
+class CompileChainTests(TestCase):
+    def test_replaces_runs_of_pointwise_filters(self) -> None:
+        chain = steps("inverse", "sepia", "shuffle", "grayscale", "timeofday")
+
+        compiled = list(lut.compile_chain(chain, 9))
+
+        self.assertEqual(len(compiled), 4)
+        self.assertNotIn(compiled[0][0], [cfilter for cfilter, _ in chain])
+        self.assertEqual(
+            [cfilter for cfilter, _ in compiled[1:]],
+            [load_filter("shuffle"), mock.ANY, load_filter("timeofday")],
+        )
+
+    def test_volatile_filters_are_not_compiled(self) -> None:
+        chain = steps("inverse", "timeofday", "brighten")
+
+        compiled = list(lut.compile_chain(chain, 9))
+
+        self.assertEqual(len(compiled), 3)
+        self.assertTrue(pipeline.is_pointwise(load_filter("timeofday")))
+        self.assertIs(compiled[1][0], load_filter("timeofday"))
+        self.assertNotIn(compiled[2][0], [cfilter for cfilter, _ in chain])
+
+    def test_random_config_is_not_compiled(self) -> None:
+        config = lib.make_config("hueshift", amount="random")
+        chain = steps("inverse", "hueshift", config=config)
+
+        self.assertEqual(list(lut.compile_chain(chain, 9)), chain)
+
+    def test_run(self) -> None:
+        chain = steps("inverse", "vga")
+        colors = lib.make_colors("#7e118f #754fc7 #835d75 #807930")
+
+        compiled = lut.compile_chain(chain, lut.EXACT)
+
+        self.assertEqual(pipeline.run(colors, compiled), pipeline.run(colors, chain))
+
+
+@fixture()
+def luts(_fixtures: Fixtures) -> FixtureContext[None]:
+    lut.LUTS.clear()
+    yield
+    lut.LUTS.clear()
+
+
+@given(lib.tmpdir, luts)
+class LoadLUTTests(TestCase):
+    def test_stored(self, fixtures: Fixtures) -> None:
+        store = PaletteStore(fixtures.tmpdir)
+        chain = steps("inverse", "sepia")
+        table = lut.load_lut(chain, 9, store)
+        lut.LUTS.clear()
+
+        with mock.patch.object(lut.LUT, "compile") as compile_:
+            stored = lut.load_lut(chain, 9, store)
+
+        compile_.assert_not_called()
+        self.assertEqual(stored.table.tolist(), table.table.tolist())
+
+    def test_kept_in_memory(self, fixtures: Fixtures) -> None:
+        chain = steps("inverse", "sepia")
+        table = lut.load_lut(chain, 9)
+
+        with mock.patch.object(lut.LUT, "compile") as compile_:
+            self.assertIs(lut.load_lut(steps("inverse", "sepia"), 9), table)
+
+        compile_.assert_not_called()
+
+    def test_keeps_recent_luts(self, fixtures: Fixtures) -> None:
+        for i in range(lut.MAX_LUTS + 2):
+            lut.load_lut(steps("inverse", config=lib.make_config("inverse", x=i)), 2)
+
+        self.assertEqual(len(lut.LUTS), lut.MAX_LUTS)
+
+    def test_exact_is_not_stored(self, fixtures: Fixtures) -> None:
+        store = PaletteStore(fixtures.tmpdir)
+        chain = steps("inverse")
+
+        with mock.patch.object(
+            lut.LUT, "compile", return_value=lut.LUT(np.zeros((2, 2, 2, 3), np.uint8))
+        ):
+            lut.load_lut(chain, lut.EXACT, store)
+
+        self.assertIsNone(store.load_lut(lut.lut_key(chain, lut.EXACT)))
+
+
+class LUTKeyTests(TestCase):
+    def test(self) -> None:
+        chain = steps("inverse", "sepia")
+        config = lib.make_config("sepia", amount=0.5)
+
+        key = lut.lut_key(chain, 9)
+
+        self.assertEqual(lut.lut_key(steps("inverse", "sepia"), 9), key)
+        self.assertNotEqual(lut.lut_key(chain, 17), key)
+        self.assertNotEqual(lut.lut_key(chain[::-1], 9), key)
+        self.assertNotEqual(
+            lut.lut_key(steps("inverse", "sepia", config=config), 9), key
+        )
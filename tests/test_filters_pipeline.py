@@ -0,0 +1,345 @@
+"""Tests for the filters pipeline"""
+
+# pylint: disable=missing-docstring
+import datetime as dt
+import inspect
+import itertools
+from configparser import ConfigParser
+from unittest import TestCase, mock
+
+import numpy as np
+from unittest_fixtures import Fixtures, params
+
+from larry.filters import ColorArray, HSVArray, filters_list, load_filter, pipeline
+from larry.palette import Palette
+
+from . import lib
+
+ORIG_COLORS = lib.make_colors(
+    "#7e118f #754fc7 #835d75 #807930 #9772ea #9f934b #39e822 #35dfe9"
+)
+HSV_FILTERS = sorted(
+    name for name, cfilter in filters_list() if pipeline.is_hsv_filter(cfilter)
+)
+
+
+@pipeline.array_filter
+def halve(colors: ColorArray, _config: ConfigParser) -> ColorArray:
+    """Halve the colors"""
+    return colors // 2
+
+
+@pipeline.hsv_filter
+def rotate(hsv: HSVArray, _config: ConfigParser) -> HSVArray:
+    """Rotate the hues by 180 degrees"""
+    hsv[:, 0] = (hsv[:, 0] + 180) % 360
+    return hsv
+
+
+class ArrayFilterTests(TestCase):
+    def test_can_be_called_as_list_filter(self) -> None:
+        colors = halve(lib.make_colors("#ff0000 #102030"), ConfigParser())
+
+        self.assertEqual(colors, lib.make_colors("#7f0000 #081018"))
+
+    def test_array_attribute(self) -> None:
+        func = pipeline.get_array_filter(halve)
+        assert func is not None
+
+        colors = np.array([[255, 0, 0]], dtype=np.float32)
+        result = func(colors, ConfigParser())  # pylint: disable=not-callable
+
+        self.assertEqual(result.tolist(), [[127, 0, 0]])
+
+    def test_signature_and_doc(self) -> None:
+        self.assertEqual(len(inspect.signature(halve).parameters), 2)
+        self.assertEqual(halve.__doc__, "Halve the colors")
+
+    def test_list_filter_has_no_array_filter(self) -> None:
+        self.assertIsNone(pipeline.get_array_filter(load_filter("shift")))
+
+
+class RunTests(TestCase):
+    def test_matches_calling_each_filter(self) -> None:
+        config = ConfigParser()
+        names = ["inverse", "hueshift", "none", "neonize", "sepia", "vga"]
+        chain = [(load_filter(name), config) for name in names]
+
+        colors = pipeline.run(ORIG_COLORS, chain)
+
+        expected = ORIG_COLORS
+        for cfilter, _ in chain:
+            expected = cfilter(expected, config)
+        self.assertEqual(colors, expected)
+
+    def test_converts_only_at_boundaries(self) -> None:
+        config = ConfigParser()
+        names = ["inverse", "hueshift", "none", "neonize", "sepia", "vga"]
+        chain = [(load_filter(name), config) for name in names]
+
+        with mock.patch.object(
+            pipeline, "to_colors", wraps=pipeline.to_colors
+        ) as to_colors:
+            pipeline.run(ORIG_COLORS, chain)
+
+        # Once before "none" and once at the end
+        self.assertEqual(to_colors.call_count, 2)
+
+    def test_empty_chain(self) -> None:
+        self.assertEqual(pipeline.run(ORIG_COLORS, []), ORIG_COLORS)
+
+    def test_run_array(self) -> None:
+        config = ConfigParser()
+        names = ["inverse", "hueshift", "none", "neonize", "sepia", "vga"]
+        chain = [(load_filter(name), config) for name in names]
+
+        array = pipeline.run_array(pipeline.to_array(ORIG_COLORS), chain)
+
+        self.assertEqual(pipeline.to_colors(array), pipeline.run(ORIG_COLORS, chain))
+
+
+class WeightsTests(TestCase):
+    def test_not_weighted(self) -> None:
+        self.assertIsNone(pipeline.color_weights(ORIG_COLORS))
+
+    def test_weighted(self) -> None:
+        weights = list(range(len(ORIG_COLORS)))
+
+        with pipeline.weighted(ORIG_COLORS, weights):
+            self.assertEqual(pipeline.color_weights(ORIG_COLORS).tolist(), weights)
+
+            with pipeline.weighted(ORIG_COLORS, None):
+                self.assertIsNone(pipeline.color_weights(ORIG_COLORS))
+
+            self.assertIsNotNone(pipeline.color_weights(ORIG_COLORS))
+
+        self.assertIsNone(pipeline.color_weights(ORIG_COLORS))
+
+    def test_weights_for_other_colors(self) -> None:
+        with pipeline.weighted(ORIG_COLORS, [1, 2, 3]):
+            self.assertIsNone(pipeline.color_weights(ORIG_COLORS))
+
+    def test_other_colors_are_not_weighted(self) -> None:
+        other_colors = list(ORIG_COLORS)
+        seen = []
+
+        def record(colors: list, _config: ConfigParser) -> list:
+            seen.append(pipeline.color_weights(colors))
+            return colors
+
+        with pipeline.weighted(ORIG_COLORS, range(len(ORIG_COLORS))):
+            colors = pipeline.run(other_colors, [(record, ConfigParser())])
+
+            self.assertIsNone(pipeline.color_weights(colors))
+
+        self.assertEqual(seen, [None])
+
+    def test_kept_through_array_filters(self) -> None:
+        config = ConfigParser()
+        seen = []
+
+        @pipeline.array_filter
+        def record(colors: ColorArray, _config: ConfigParser) -> ColorArray:
+            seen.append(pipeline.color_weights(colors))
+            return colors
+
+        chain = [(load_filter("inverse"), config), (pipeline.pointwise(record), config)]
+
+        with pipeline.weighted(ORIG_COLORS, range(len(ORIG_COLORS))):
+            record(ORIG_COLORS, config)
+            pipeline.run(ORIG_COLORS, chain)
+
+        self.assertEqual([weights.tolist() for weights in seen], [list(range(8))] * 2)
+
+    def test_kept_by_pointwise_filters(self) -> None:
+        config = ConfigParser()
+        chain = [(load_filter(name), config) for name in ["inverse", "hueshift"]]
+
+        with pipeline.weighted(ORIG_COLORS, range(len(ORIG_COLORS))):
+            colors = pipeline.run(ORIG_COLORS, chain)
+            weights = pipeline.color_weights(colors)
+
+        self.assertIsNotNone(weights)
+
+    def test_kept_by_order_preserving_filters(self) -> None:
+        config = ConfigParser()
+        chain = [(load_filter(name), config) for name in ["vibrance", "chromefocus"]]
+
+        with pipeline.weighted(ORIG_COLORS, range(len(ORIG_COLORS))):
+            colors = pipeline.run(ORIG_COLORS, chain)
+            weights = pipeline.color_weights(colors)
+
+        self.assertEqual(weights.tolist(), list(range(len(ORIG_COLORS))))
+
+    def test_dropped_by_other_filters(self) -> None:
+        config = ConfigParser()
+        chain = [(load_filter(name), config) for name in ["shift", "inverse"]]
+
+        with pipeline.weighted(ORIG_COLORS, range(len(ORIG_COLORS))):
+            colors = pipeline.run(ORIG_COLORS, chain)
+            self.assertIsNone(pipeline.color_weights(colors))
+
+    def test_dropped_by_run_array(self) -> None:
+        array = pipeline.to_array(ORIG_COLORS)
+
+        with pipeline.weighted(array, range(len(ORIG_COLORS))):
+            new = pipeline.run_array(array, [(halve, ConfigParser())])
+            self.assertIsNone(pipeline.color_weights(new))
+
+    def test_dropped_before_later_filters(self) -> None:
+        config = ConfigParser()
+        seen = []
+
+        def record(colors: list, _config: ConfigParser) -> list:
+            seen.append(pipeline.color_weights(colors))
+            return colors
+
+        chain = [(record, config), (load_filter("shift"), config), (record, config)]
+
+        with pipeline.weighted(ORIG_COLORS, range(len(ORIG_COLORS))):
+            pipeline.run(ORIG_COLORS, chain)
+
+        self.assertIsNotNone(seen[0])
+        self.assertIsNone(seen[1])
+
+
+class PointwiseTests(TestCase):
+    def test(self) -> None:
+        self.assertTrue(pipeline.is_pointwise(load_filter("inverse")))
+        self.assertTrue(pipeline.is_pointwise(load_filter("hueshift")))
+        self.assertFalse(pipeline.is_pointwise(load_filter("shuffle")))
+        self.assertFalse(pipeline.is_pointwise(halve))
+
+
+class OrderPreservingTests(TestCase):
+    def test(self) -> None:
+        self.assertTrue(pipeline.is_order_preserving(load_filter("inverse")))
+        self.assertTrue(pipeline.is_order_preserving(load_filter("vibrance")))
+        self.assertTrue(pipeline.is_order_preserving(load_filter("chromefocus")))
+        self.assertFalse(pipeline.is_order_preserving(load_filter("shuffle")))
+        self.assertFalse(pipeline.is_order_preserving(halve))
+
+    def test_filters_keep_the_number_of_colors(self) -> None:
+        config = ConfigParser()
+
+        for name, cfilter in filters_list():
+            if pipeline.is_order_preserving(cfilter):
+                with self.subTest(name=name):
+                    colors = cfilter(ORIG_COLORS, config)
+                    self.assertEqual(len(colors), len(ORIG_COLORS))
+
+
+class HSVFilterTests(TestCase):
+    def test_can_be_called_as_list_filter(self) -> None:
+        colors = rotate(lib.make_colors("#ff0000 #00ffff"), ConfigParser())
+
+        self.assertEqual(colors, lib.make_colors("#00ffff #ff0000"))
+
+    def test_attributes(self) -> None:
+        self.assertIs(pipeline.get_hsv_filter(rotate), getattr(rotate, "hsv"))
+        self.assertIsNotNone(pipeline.get_array_filter(rotate))
+        self.assertEqual(rotate.__doc__, "Rotate the hues by 180 degrees")
+
+    def test_array_filter_has_no_hsv_filter(self) -> None:
+        self.assertIsNone(pipeline.get_hsv_filter(load_filter("inverse")))
+
+    def test_none_leaves_colors_unchanged(self) -> None:
+        config = ConfigParser()
+        config["filters:intensify"] = {"percent": "0"}
+        chain = [(load_filter("intensify"), config)] * 2
+
+        self.assertEqual(pipeline.run(ORIG_COLORS, chain), ORIG_COLORS)
+
+
+@params(names=list(itertools.product(HSV_FILTERS, repeat=2)))
+class FusedCloseToSequentialTests(TestCase):
+    colors = ORIG_COLORS + lib.make_colors("#000000 #ffffff #808080 #150015")
+
+    def test(self, fixtures: Fixtures) -> None:
+        config = ConfigParser()
+        chain = [(load_filter(name), config) for name in fixtures.names]
+
+        with mock.patch("larry.filters.timeofday.now") as now:
+            now.return_value = dt.datetime(2025, 9, 7, 22, 0, 0)
+            fused = Palette.from_colors(pipeline.run(self.colors, pipeline.fuse(chain)))
+            sequential = Palette.from_colors(pipeline.run(self.colors, chain))
+
+        # Rounding between the filters moves the hues of the less saturated colors a
+        # little, which neonize and pastelize then bring out
+        diff = np.abs(fused.array.astype(int) - sequential.array.astype(int))
+        self.assertLessEqual(diff.max(), 8)
+
+
+class FuseTests(TestCase):
+    def test_converts_once(self) -> None:
+        config = ConfigParser()
+        names = ["hueshift", "neonize", "soften", "pastelize"]
+        chain = [(load_filter(name), config) for name in names]
+
+        with (
+            mock.patch.object(
+                pipeline.Palette, "from_hsv", wraps=Palette.from_hsv
+            ) as from_hsv,
+            mock.patch.object(
+                pipeline.Palette, "to_hsv", autospec=True, side_effect=Palette.to_hsv
+            ) as to_hsv,
+        ):
+            pipeline.run(ORIG_COLORS, pipeline.fuse(chain))
+
+        self.assertEqual(from_hsv.call_count, 1)
+        self.assertEqual(to_hsv.call_count, 1)
+
+    def test_no_rounding_between_filters(self) -> None:
+        chain = [(rotate, ConfigParser())] * 2
+
+        colors = pipeline.run(ORIG_COLORS, pipeline.fuse(chain))
+
+        hsv = Palette.from_colors(ORIG_COLORS).to_hsv()
+        hsv = rotate.hsv(rotate.hsv(hsv, ConfigParser()), ConfigParser())
+        self.assertEqual(colors, Palette.from_hsv(hsv).to_colors())
+
+    def test_grays_between_filters(self) -> None:
+        config = ConfigParser()
+        colors = ORIG_COLORS + lib.make_colors("#000000 #ffffff #808080")
+        chain = [(load_filter(name), config) for name in ["grayscale", "neonize"]]
+
+        self.assertEqual(
+            pipeline.run(colors, pipeline.fuse(chain)), pipeline.run(colors, chain)
+        )
+
+    def test_each_filter_gets_its_config(self) -> None:
+        hueshift = load_filter("hueshift")
+        config1 = ConfigParser()
+        config1["filters:hueshift"] = {"amount": "30"}
+        config2 = ConfigParser()
+        config2["filters:hueshift"] = {"amount": "60"}
+        chain = [(hueshift, config1), (hueshift, config2)]
+
+        colors = pipeline.run(ORIG_COLORS, pipeline.fuse(chain))
+
+        hsv = Palette.from_colors(ORIG_COLORS).to_hsv()
+        hsv[:, 0] = ((hsv[:, 0] + 30) % 360 + 60) % 360
+        self.assertEqual(colors, Palette.from_hsv(hsv).to_colors())
+
+    def test_fuses_only_consecutive_hsv_filters(self) -> None:
+        steps = list(
+            pipeline.fuse(
+                (load_filter(name), ConfigParser())
+                for name in ["hueshift", "neonize", "inverse", "grayscale"]
+            )
+        )
+
+        self.assertEqual(len(steps), 3)
+        self.assertNotIn(steps[0][0], [load_filter("hueshift"), load_filter("neonize")])
+        self.assertIsNotNone(pipeline.get_hsv_filter(steps[0][0]))
+        self.assertIs(steps[1][0], load_filter("inverse"))
+        self.assertIs(steps[2][0], load_filter("grayscale"))
+
+    def test_run_does_not_fuse(self) -> None:
+        chain = [(rotate, ConfigParser())] * 2
+
+        with mock.patch.object(pipeline, "fuse") as fuse:
+            pipeline.run(ORIG_COLORS, chain)
+            pipeline.run_array(pipeline.to_array(ORIG_COLORS), chain)
+
+        fuse.assert_not_called()
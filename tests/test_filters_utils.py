@@ -67,6 +67,19 @@ class GetOpacityTests(TestCase):
             utils.get_opacity(self.config, "test", "bar")
 
 
+class ClosestColorTests(TestCase):
+    def test(self):
+        colors = make_colors("#7e118f #754fc7 #835d75 #807930 #9772ea #9f934b")
+
+        self.assertEqual(utils.closest_color(Color("#0000ff"), colors), colors[1])
+        self.assertEqual(utils.closest_color(Color("#ffff00"), colors), colors[5])
+
+    def test_first_of_equally_close_colors(self):
+        colors = make_colors("#000000 #202020 #000000 #404040")
+
+        self.assertIs(utils.closest_color(Color("#101010"), colors), colors[0])
+
+
 class ParseRangeTests(TestCase):
     def test(self) -> None:
         self.assertEqual(utils.parse_range("0.72-6.4"), (0.72, 6.4))
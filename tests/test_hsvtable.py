@@ -0,0 +1,124 @@
+# pylint: disable=missing-docstring,unused-argument
+import os
+from unittest import TestCase, mock
+
+import numpy as np
+from unittest_fixtures import FixtureContext, Fixtures, fixture, given
+
+from larry import hsvtable
+from larry.color import rgb_to_hsv
+from larry.filters import filters_list, pipeline
+from larry.hsvtable import HSVTable
+from larry.palette import Palette
+
+from . import lib
+
+
+@fixture()
+def small_table(_fixtures: Fixtures) -> FixtureContext[None]:
+    # Only the colors with no red
+    with mock.patch.object(hsvtable, "NUM_COLORS", 1 << 16):
+        with mock.patch.object(hsvtable, "CHUNK_SIZE", 1 << 12):
+            yield
+
+
+def colors_without_red(size: int = 500) -> np.ndarray:
+    rgb = np.random.default_rng(1).integers(0, 256, (size, 3)).astype(np.uint8)
+    rgb[:, 0] = 0
+
+    return rgb
+
+
+@given(lib.tmpdir, small_table)
+class HSVTableTests(TestCase):
+    def test_lookup(self, fixtures: Fixtures) -> None:
+        table = HSVTable(fixtures.tmpdir)
+        rgb = colors_without_red()
+
+        hsv = table.lookup(rgb)
+
+        self.assertEqual(hsv.dtype, np.float64)
+        self.assertEqual(hsv.tolist(), rgb_to_hsv(rgb).tolist())
+
+    def test_generated_only_once(self, fixtures: Fixtures) -> None:
+        HSVTable(fixtures.tmpdir).load()
+
+        with mock.patch.object(HSVTable, "generate") as generate:
+            table = HSVTable(fixtures.tmpdir).load()
+
+        generate.assert_not_called()
+        assert table is not None
+        self.assertIsInstance(table, np.memmap)
+        self.assertFalse(
+            [name for name in os.listdir(fixtures.tmpdir) if name.endswith(".tmp")]
+        )
+
+    def test_falls_back_to_computing(self, fixtures: Fixtures) -> None:
+        path = f"{fixtures.tmpdir}/file"
+        with open(path, "wb"):
+            pass
+        table = HSVTable(path)
+        rgb = colors_without_red()
+
+        with mock.patch.object(hsvtable, "LOGGER"):
+            hsv = table.lookup(rgb)
+
+        self.assertIsNone(table.load())
+        self.assertEqual(hsv.tolist(), rgb_to_hsv(rgb).tolist())
+
+    def test_bad_table_is_not_used(self, fixtures: Fixtures) -> None:
+        np.save(f"{fixtures.tmpdir}/{hsvtable.FILENAME}", np.zeros((3, 3)))
+
+        with mock.patch.object(hsvtable, "LOGGER"):
+            self.assertIsNone(HSVTable(fixtures.tmpdir).load())
+
+
+@given(lib.tmpdir, small_table)
+class PassedTableTests(TestCase):
+    def test_palette_to_hsv(self, fixtures: Fixtures) -> None:
+        rgb = colors_without_red()
+        table = HSVTable(fixtures.tmpdir)
+
+        with mock.patch.object(
+            HSVTable, "lookup", autospec=True, side_effect=HSVTable.lookup
+        ) as lookup:
+            hsv = Palette(rgb).to_hsv(table)
+
+        lookup.assert_called_once()
+        self.assertEqual(hsv.tolist(), rgb_to_hsv(rgb).tolist())
+
+    def test_filters_give_the_same_colors(self, fixtures: Fixtures) -> None:
+        colors = Palette(colors_without_red()).to_colors()
+        config = lib.make_config("larry")
+        chain = [(cfilter, config) for _, cfilter in filters_list()]
+        chain = [step for step in chain if pipeline.is_pointwise(step[0])]
+        expected = [pipeline.run(colors, [step]) for step in chain]
+        table = HSVTable(fixtures.tmpdir)
+
+        with mock.patch.object(
+            HSVTable, "lookup", autospec=True, side_effect=HSVTable.lookup
+        ) as lookup:
+            filtered = [pipeline.run(colors, [step], table) for step in chain]
+
+        lookup.assert_called()
+        self.assertEqual(filtered, expected)
+
+    def test_not_passed(self, fixtures: Fixtures) -> None:
+        rgb = colors_without_red()
+
+        with mock.patch.object(HSVTable, "lookup") as lookup:
+            hsv = Palette(rgb).to_hsv()
+
+        lookup.assert_not_called()
+        self.assertEqual(hsv.tolist(), rgb_to_hsv(rgb).tolist())
+
+
+class GetTableTests(TestCase):
+    def test_loaded_once_per_directory(self) -> None:
+        hsvtable.get_table.cache_clear()
+        self.addCleanup(hsvtable.get_table.cache_clear)
+
+        table = hsvtable.get_table("/a")
+
+        self.assertIs(hsvtable.get_table("/a"), table)
+        self.assertIsNot(hsvtable.get_table("/b"), table)
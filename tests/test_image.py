@@ -1,9 +1,25 @@
 """tests for larry.image"""
 
+import base64
+import gzip
+from collections import Counter
+from io import BytesIO
 from unittest import TestCase, mock
 
-from larry.color import Color
-from larry.image import RasterImage, SVGImage, make_image_from_bytes
+import numpy as np
+from PIL import Image as PillowImage
+from PIL.JpegImagePlugin import JpegImageFile
+
+from larry import image as image_module
+from larry.color import Color, replace_string
+from larry.image import (
+    RasterImage,
+    SVGImage,
+    make_image_from_bytes,
+    sniff,
+    tokenize_svg,
+)
+from larry.palette import Palette
 
 from . import lib
 
@@ -24,6 +40,53 @@ class MakeImageFromBytesTest(TestCase):
         with self.assertRaises(ValueError):
             make_image_from_bytes(b"\x01\x02\xff\xff")
 
+    def test_svgz(self) -> None:
+        image = make_image_from_bytes(gzip.compress(lib.SVG_IMAGE))
+
+        self.assertTrue(isinstance(image, SVGImage))
+
+    def test_sniffed_type_is_used_directly(self) -> None:
+        svg_image = mock.Mock(spec=["sniff"], **{"sniff.return_value": False})
+        types = [svg_image, RasterImage]
+
+        with mock.patch.object(image_module, "IMAGE_TYPES", types):
+            image = make_image_from_bytes(lib.RASTER_IMAGE)
+
+        self.assertTrue(isinstance(image, RasterImage))
+        svg_image.assert_not_called()
+
+    def test_falls_back_to_trying_each_type(self) -> None:
+        tiff = BytesIO()
+        PillowImage.open(BytesIO(lib.RASTER_IMAGE)).save(tiff, "TIFF")
+
+        self.assertEqual(sniff(tiff.getvalue()), [])
+        self.assertTrue(isinstance(make_image_from_bytes(tiff.getvalue()), RasterImage))
+
+
+class SniffTests(TestCase):
+    def test_raster_formats(self) -> None:
+        png = PillowImage.open(BytesIO(lib.RASTER_IMAGE))
+
+        for image_format in ["PNG", "JPEG", "GIF", "WEBP", "BMP"]:
+            with self.subTest(image_format=image_format):
+                bytes_io = BytesIO()
+                png.convert("RGB").save(bytes_io, image_format)
+
+                self.assertEqual(sniff(bytes_io.getvalue()), [RasterImage])
+
+    def test_svg(self) -> None:
+        for data in [
+            lib.SVG_IMAGE,
+            b"\xef\xbb\xbf  <svg></svg>",
+            b'<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN"><svg/>',
+            gzip.compress(lib.SVG_IMAGE),
+        ]:
+            with self.subTest(data=data[:10]):
+                self.assertEqual(sniff(data), [SVGImage])
+
+    def test_unknown(self) -> None:
+        self.assertEqual(sniff(b"\x01\x02\xff\xff"), [])
+
 
 class SVGImageTests(TestCase):
     image = SVGImage(lib.SVG_IMAGE)
@@ -48,9 +111,147 @@ class SVGImageTests(TestCase):
     def test_bytes(self):
         self.assertEqual(bytes(self.image), lib.SVG_IMAGE)
 
+    def test_replace_keeps_syntax(self) -> None:
+        image = SVGImage(lib.CSS.encode())
+        orig_colors = lib.make_colors("#333 #002d6c #3a7e94")
+        new_colors = lib.make_colors("#fff #1245ef #000")
+
+        new_image = image.replace(orig_colors, new_colors)
+
+        colormap = dict(zip(orig_colors, new_colors))
+        self.assertEqual(str(new_image), replace_string(lib.CSS, colormap))
+        self.assertEqual(new_image.colors, SVGImage(bytes(new_image)).colors)
+        self.assertEqual(str(image), lib.CSS)
+
+    def test_svgz(self) -> None:
+        image = SVGImage(gzip.compress(lib.SVG_IMAGE))
+        orig_colors = lib.make_colors("#000000")
+        new_colors = lib.make_colors("#0000ff")
+
+        new_image = image.replace(orig_colors, new_colors)
+
+        self.assertEqual(image.colors, self.image.colors)
+        self.assertEqual(gzip.decompress(bytes(image)), lib.SVG_IMAGE)
+        self.assertIn(Color("#0000ff"), SVGImage(bytes(new_image)).colors)
+        self.assertTrue(bytes(new_image).startswith(b"\x1f\x8b"))
+
     def test_str(self):
         self.assertEqual(str(self.image), lib.SVG_IMAGE.decode("UTF-8"))
 
+    def test_color_counts(self) -> None:
+        palette, counts = self.image.color_counts()
+
+        expected = Counter(
+            self.image.token_colors[s] for s in self.image.color_strings()
+        )
+        self.assertEqual(dict(zip(palette, counts.tolist())), dict(expected))
+
+    def test_sample(self) -> None:
+        palette, counts = self.image.sample(2)
+
+        expected_palette, expected_counts = self.image.color_counts()
+        self.assertEqual(palette, expected_palette)
+        self.assertEqual(counts.tolist(), expected_counts.tolist())
+
+
+EMBEDDED_SVG = f"""\
+<svg xmlns="http://www.w3.org/2000/svg">
+  <rect fill="#000000" width="10" height="10"/>
+  <image href="data:image/png;base64,{base64.b64encode(lib.RASTER_IMAGE).decode()}"/>
+</svg>
+""".encode()
+
+
+class EmbeddedImageTests(TestCase):
+    def test_data_uris_are_not_scanned(self) -> None:
+        image = SVGImage(EMBEDDED_SVG)
+
+        self.assertEqual(image.colors, {Color("#000000")})
+        self.assertEqual(image.color_strings(), ["#000000"])
+        self.assertEqual(bytes(image), EMBEDDED_SVG)
+
+    def test_embedded(self) -> None:
+        image = SVGImage(EMBEDDED_SVG, embedded=True)
+
+        self.assertEqual(
+            image.colors, RasterImage(lib.RASTER_IMAGE).colors | {Color("#000000")}
+        )
+        self.assertEqual(bytes(image), EMBEDDED_SVG)
+
+    def test_embedded_color_counts(self) -> None:
+        image = SVGImage(EMBEDDED_SVG, embedded=True)
+
+        palette, counts = image.color_counts()
+
+        raster_palette, raster_counts = RasterImage(lib.RASTER_IMAGE).color_counts()
+        expected = Counter(dict(zip(raster_palette, raster_counts.tolist())))
+        expected[Color("#000000")] += 1
+        self.assertEqual(dict(zip(palette, counts.tolist())), dict(expected))
+
+    def test_embedded_replace(self) -> None:
+        image = SVGImage(EMBEDDED_SVG, embedded=True)
+        orig_colors = lib.make_colors("#000000 #a889e9")
+        new_colors = lib.make_colors("#ffffff #0000ff")
+
+        new_image = image.replace(orig_colors, new_colors)
+
+        expected = RasterImage(lib.RASTER_IMAGE).replace(orig_colors, new_colors)
+        self.assertEqual(new_image.colors, expected.colors | {Color("#ffffff")})
+        self.assertEqual(
+            SVGImage(bytes(new_image), embedded=True).colors, new_image.colors
+        )
+
+    def test_embedded_images_are_not_downscaled(self) -> None:
+        image = SVGImage(EMBEDDED_SVG, embedded=True, max_size=(2, 2))
+
+        self.assertEqual(bytes(image), EMBEDDED_SVG)
+        self.assertEqual(
+            [raster.image.size for raster in image.embedded.values()], [(10, 10)]
+        )
+
+    def test_make_image_from_bytes_passes_options(self) -> None:
+        image = make_image_from_bytes(EMBEDDED_SVG, embedded=True)
+
+        self.assertIn(Color("#a889e9"), image.colors)
+
+
+class TokenizeSVGTests(TestCase):
+    svg = '<a fill="#fff" href="data:image/png;base64,AAAA\n  AA=="/>rgb(1, 2, 3)'
+
+    def test(self) -> None:
+        self.assertEqual(
+            tokenize_svg(self.svg),
+            [
+                '<a fill="',
+                "#fff",
+                '" href="data:image/png;base64,AAAA\n  AA=="/>',
+                "rgb(1, 2, 3)",
+                "",
+            ],
+        )
+
+    def test_embedded(self) -> None:
+        self.assertEqual(
+            tokenize_svg(self.svg, embedded=True),
+            [
+                '<a fill="',
+                "#fff",
+                '" href="',
+                "data:image/png;base64,AAAA\n  AA==",
+                '"/>',
+                "rgb(1, 2, 3)",
+                "",
+            ],
+        )
+
+    def test_non_raster_data_uris_stay_text(self) -> None:
+        svg = "url(data:font/woff2;base64,AAAA) #000"
+
+        self.assertEqual(
+            tokenize_svg(svg, embedded=True),
+            ["url(data:font/woff2;base64,AAAA) ", "#000", ""],
+        )
+
 
 class RasterImageTests(TestCase):
     image = RasterImage(lib.RASTER_IMAGE)
@@ -64,6 +265,17 @@ class RasterImageTests(TestCase):
         )
         self.assertEqual(colors, expected)
 
+    def test_color_counts(self) -> None:
+        palette, counts = self.image.color_counts()
+
+        width, height = self.image.image.size
+        expected = {
+            Color(*rgba[:3]): count
+            for count, rgba in self.image.image.getcolors(width * height)
+        }
+        self.assertEqual(dict(zip(palette, counts.tolist())), expected)
+        self.assertEqual(counts.sum(), width * height)
+
     def test_replace(self):
         orig_colors = lib.make_colors("#a889e9 #b594c9 #c39faa #d0aa8b #deb56b")
         new_colors = lib.make_colors("#0000ff #00ff00 #ff0000 #000000 #ffffff")
@@ -76,6 +288,175 @@ class RasterImageTests(TestCase):
         )
         self.assertEqual(colors, expected)
 
+    def test_tiled(self) -> None:
+        orig_colors = lib.make_colors("#a889e9 #b594c9 #c39faa #d0aa8b #deb56b")
+        new_colors = lib.make_colors("#0000ff #00ff00 #ff0000 #000000 #ffffff")
+        palette, counts = self.image.color_counts()
+        replaced = self.image.replace(orig_colors, new_colors)
+
+        with mock.patch("larry.image.TILE_PIXELS", 7):
+            self.assertEqual(len(list(self.image.tiles())), 10)
+
+            tiled_palette, tiled_counts = self.image.color_counts()
+            tiled_replaced = self.image.replace(orig_colors, new_colors)
+
+        self.assertEqual(tiled_palette, palette)
+        self.assertEqual(tiled_counts.tolist(), counts.tolist())
+        self.assertEqual(tiled_replaced.image.tobytes(), replaced.image.tobytes())
+
+    def test_replace_preserves_alpha(self) -> None:
+        image = RasterImage(lib.RASTER_IMAGE)
+        image.image.putalpha(128)
+        orig_colors = lib.make_colors("#a889e9")
+        new_colors = lib.make_colors("#0000ff")
+
+        new_image = image.replace(orig_colors, new_colors)
+
+        self.assertEqual(new_image.image.getextrema()[3], (128, 128))
+        self.assertIn(Color(0, 0, 255), new_image.colors)
+        self.assertNotIn(Color(0xA8, 0x89, 0xE9), new_image.colors)
+        self.assertIn(Color(0xA8, 0x89, 0xE9), image.colors)
+
+    def test_recolor(self) -> None:
+        image = RasterImage(lib.RASTER_IMAGE)
+        image.image.putalpha(128)
+        palette, _ = image.color_counts()
+        table = palette.array[::-1].copy()
+
+        with mock.patch("larry.image.TILE_PIXELS", 7):
+            new_image = image.recolor(palette, table)
+
+        replaced = image.replace(palette, Palette(table))
+        self.assertEqual(new_image.image.tobytes(), replaced.image.tobytes())
+        self.assertEqual(new_image.image.getextrema()[3], (128, 128))
+
+    def test_recolor_with_index_map(self) -> None:
+        image = RasterImage(lib.RASTER_IMAGE)
+        palette, _ = image.color_counts()
+        table = palette.array[::-1].copy()
+        index_map = image.palette_index(palette)
+
+        with (
+            mock.patch("larry.image.TILE_PIXELS", 7),
+            mock.patch.object(image, "indexed_tiles") as indexed_tiles,
+        ):
+            new_image = image.recolor(palette, table, index_map)
+
+        indexed_tiles.assert_not_called()
+        self.assertEqual(
+            new_image.image.tobytes(), image.recolor(palette, table).image.tobytes()
+        )
+
+    def test_palette_index(self) -> None:
+        image = RasterImage(lib.RASTER_IMAGE)
+        palette, _ = image.color_counts()
+
+        index_map = image.palette_index(palette)
+
+        self.assertEqual(index_map.dtype, np.uint16)
+        self.assertEqual(index_map.shape, image.image.size[::-1])
+        self.assertEqual(
+            [palette[i] for i in index_map.ravel()],
+            [Color(*rgba[:3]) for rgba in image.image.convert("RGBA").getdata()],
+        )
+
+    def test_indexed_tiles(self) -> None:
+        image = RasterImage(lib.RASTER_IMAGE)
+        palette, _ = image.color_counts()
+        palette = palette[palette.argsort()]
+
+        with mock.patch("larry.image.TILE_PIXELS", 30):
+            tiles = list(image.indexed_tiles(palette[1:]))
+
+        self.assertEqual([top for top, _, _ in tiles], [0, 3, 6, 9])
+
+        for _, tile, index in tiles:
+            self.assertEqual(index.shape, (tile.height, tile.width))
+            self.assertEqual(
+                [
+                    palette[1:][i] if i < len(palette) - 1 else None
+                    for i in index.ravel()
+                ],
+                [
+                    None if Color(*rgba[:3]) == palette[0] else Color(*rgba[:3])
+                    for rgba in tile.convert("RGBA").getdata()
+                ],
+            )
+
+    def test_map_pixels(self) -> None:
+        image = RasterImage(lib.RASTER_IMAGE)
+        image.image.putalpha(128)
+        palette, _ = image.color_counts()
+        bands = []
+
+        def invert(rgb):
+            bands.append(rgb.shape)
+            return 255.4 - rgb
+
+        with mock.patch("larry.image.TILE_PIXELS", 30):
+            new_image = image.map_pixels(invert)
+
+        replaced = image.replace(palette, Palette(255 - palette.array))
+        self.assertEqual(new_image.image.tobytes(), replaced.image.tobytes())
+        self.assertEqual(bands, [(30, 3), (30, 3), (30, 3), (10, 3)])
+
+    def test_sample(self) -> None:
+        # Left half red, right half (a third of it) blue
+        image = PillowImage.new("RGB", (300, 200), "#ff0000")
+        image.paste(PillowImage.new("RGB", (100, 200), "#0000ff"), (200, 0))
+        bytes_io = BytesIO()
+        image.save(bytes_io, "PNG")
+        raster = RasterImage(bytes_io.getvalue())
+
+        palette, counts = raster.sample(600)
+
+        self.assertEqual(palette, lib.make_colors("#0000ff #ff0000"))
+        self.assertEqual(counts.tolist(), [200, 400])
+
+    def test_sample_is_seeded(self) -> None:
+        samples = [self.image.sample(16, seed) for seed in [0, 1, 0]]
+
+        self.assertEqual(samples[0][0], samples[2][0])
+        self.assertEqual(samples[0][1].tolist(), samples[2][1].tolist())
+        self.assertNotEqual(
+            dict(zip(samples[0][0], samples[0][1].tolist())),
+            dict(zip(samples[1][0], samples[1][1].tolist())),
+        )
+        self.assertTrue(all(counts.sum() == 16 for _, counts in samples))
+
+    def test_small_images_are_not_sampled(self) -> None:
+        palette, counts = self.image.sample(100)
+
+        expected_palette, expected_counts = self.image.color_counts()
+        self.assertEqual(palette, expected_palette)
+        self.assertEqual(counts.tolist(), expected_counts.tolist())
+
+    def test_max_size(self) -> None:
+        image = RasterImage(lib.RASTER_IMAGE, max_size=(5, 8))
+
+        self.assertEqual(image.image.size, (5, 5))
+        self.assertEqual(image.color_counts()[1].sum(), 25)
+        self.assertEqual(PillowImage.open(BytesIO(bytes(image))).size, (5, 5))
+
+    def test_max_size_does_not_upscale(self) -> None:
+        image = RasterImage(lib.RASTER_IMAGE, max_size=(20, 20))
+
+        self.assertEqual(image.image.size, (10, 10))
+        self.assertEqual(bytes(image), lib.RASTER_IMAGE)
+
+    def test_max_size_jpeg_is_decoded_small(self) -> None:
+        bytes_io = BytesIO()
+        PillowImage.new("RGB", (640, 480), "#336699").save(bytes_io, "JPEG")
+
+        with mock.patch.object(
+            JpegImageFile, "draft", autospec=True, side_effect=JpegImageFile.draft
+        ) as draft:
+            image = RasterImage(bytes_io.getvalue(), max_size=(80, 80))
+
+        draft.assert_called_once()
+        self.assertEqual(image.image.size, (80, 60))
+        self.assertEqual(image.image_format, "JPEG")
+
     def test_bytes(self) -> None:
         self.assertEqual(bytes(self.image), lib.RASTER_IMAGE)
 
@@ -89,3 +470,76 @@ class RasterImageTests(TestCase):
         mock_image.convert.assert_called_once_with("RGB")
         converted_image = mock_image.convert.return_value
         converted_image.save.assert_called_once_with(mock.ANY, image.image_format)
+
+
+def paletted(data: bytes, image_format: str = "PNG") -> bytes:
+    image = PillowImage.open(BytesIO(data)).convert("RGB").quantize(colors=256)
+    bytes_io = BytesIO()
+    image.save(bytes_io, image_format)
+
+    return bytes_io.getvalue()
+
+
+class PalettedRasterImageTests(TestCase):
+    image = RasterImage(paletted(lib.RASTER_IMAGE))
+
+    def test_is_paletted(self) -> None:
+        self.assertTrue(self.image.is_paletted)
+        self.assertEqual(self.image.image.mode, "P")
+        self.assertFalse(RasterImage(lib.RASTER_IMAGE).is_paletted)
+
+    def test_colors(self) -> None:
+        self.assertEqual(self.image.colors, RasterImage(lib.RASTER_IMAGE).colors)
+
+    def test_color_counts(self) -> None:
+        palette, counts = self.image.color_counts()
+        rgba_palette, rgba_counts = RasterImage(lib.RASTER_IMAGE).color_counts()
+
+        self.assertEqual(palette, rgba_palette)
+        self.assertEqual(counts.tolist(), rgba_counts.tolist())
+
+    def test_sample(self) -> None:
+        palette, counts = self.image.sample(25, seed=3)
+        rgba_palette, rgba_counts = RasterImage(lib.RASTER_IMAGE).sample(25, seed=3)
+
+        self.assertEqual(palette, rgba_palette)
+        self.assertEqual(counts.tolist(), rgba_counts.tolist())
+
+    def test_color_counts_merges_duplicate_entries(self) -> None:
+        image = PillowImage.new("P", (3, 1))
+        image.putpalette([255, 0, 0, 0, 255, 0, 255, 0, 0])
+        image.putdata([0, 1, 2])
+        bytes_io = BytesIO()
+        image.save(bytes_io, "PNG")
+
+        palette, counts = RasterImage(bytes_io.getvalue()).color_counts()
+
+        self.assertEqual(palette, lib.make_colors("#00ff00 #ff0000"))
+        self.assertEqual(counts.tolist(), [1, 2])
+
+    def test_replace(self) -> None:
+        orig_colors = lib.make_colors("#a889e9 #b594c9 #c39faa #d0aa8b #deb56b")
+        new_colors = lib.make_colors("#0000ff #00ff00 #ff0000 #000000 #ffffff")
+
+        image = self.image.replace(orig_colors, new_colors)
+
+        self.assertEqual(image.image.mode, "P")
+        self.assertEqual(
+            image.colors,
+            RasterImage(lib.RASTER_IMAGE).replace(orig_colors, new_colors).colors,
+        )
+        self.assertEqual(self.image.colors, RasterImage(lib.RASTER_IMAGE).colors)
+
+    def test_bytes_keeps_mode(self) -> None:
+        for image_format in ["PNG", "GIF"]:
+            with self.subTest(image_format=image_format):
+                image = RasterImage(paletted(lib.RASTER_IMAGE, image_format))
+                image = image.replace(
+                    lib.make_colors("#a889e9"), lib.make_colors("#00f")
+                )
+
+                saved = PillowImage.open(BytesIO(bytes(image)))
+
+                self.assertEqual(saved.format, image_format)
+                self.assertEqual(saved.mode, "P")
+                self.assertIn(Color("#00f"), RasterImage(bytes(image)).colors)
@@ -0,0 +1,113 @@
+# pylint: disable=missing-docstring
+from unittest import TestCase
+
+import numpy as np
+
+from larry import nearest
+from larry.color import Color
+from larry.nearest import ColorIndex
+
+from . import lib
+
+
+def brute_force(candidates: np.ndarray, colors: np.ndarray) -> list[int]:
+    squared = ((colors[:, None, :] - candidates[None]) ** 2).sum(axis=2)
+
+    return squared.argmin(axis=1).tolist()
+
+
+class ColorIndexTests(TestCase):
+    def test_query(self) -> None:
+        rng = np.random.default_rng(1)
+        candidates = rng.integers(0, 256, (64, 3))
+        colors = rng.integers(0, 256, (1000, 3))
+
+        index = ColorIndex(candidates)
+
+        self.assertEqual(index.query(colors).tolist(), brute_force(candidates, colors))
+
+    def test_ties_choose_the_first(self) -> None:
+        rng = np.random.default_rng(1)
+        # Lots of equally near colors
+        candidates = rng.integers(100, 104, (12, 3))
+        colors = rng.integers(100, 104, (200, 3))
+
+        index = ColorIndex(candidates)
+
+        self.assertEqual(index.query(colors).tolist(), brute_force(candidates, colors))
+
+    def test_duplicates(self) -> None:
+        candidates = lib.make_colors("#ff0000 #0000ff #ff0000 #0000ff")
+        index = ColorIndex(candidates)
+
+        self.assertEqual(
+            index.query(lib.make_colors("#ee0000 #0000ee")).tolist(), [0, 1]
+        )
+        self.assertEqual(len(index), 4)
+
+    def test_single_color(self) -> None:
+        index = ColorIndex(lib.make_colors("#ff0000 #ff0000"))
+
+        self.assertEqual(index.query(lib.make_colors("#000 #fff")).tolist(), [0, 0])
+
+    def test_nearest(self) -> None:
+        index = ColorIndex(lib.make_colors("#000000 #ffffff"))
+
+        self.assertEqual(index.nearest(lib.make_colors("#eeeeee")[0]), 1)
+
+    def test_empty(self) -> None:
+        with self.assertRaises(ValueError):
+            ColorIndex([])
+
+    def test_spaces(self) -> None:
+        candidates = lib.make_colors("#0000ff #008080 #808080")
+        color = Color("#382c7b")
+
+        self.assertEqual(ColorIndex(candidates, "rgb").nearest(color), 1)
+        self.assertEqual(ColorIndex(candidates, "lab").nearest(color), 2)
+        self.assertEqual(ColorIndex(candidates, "oklab").nearest(color), 0)
+
+    def test_unknown_space(self) -> None:
+        with self.assertRaises(ValueError):
+            ColorIndex(lib.make_colors("#000"), "cmyk")
+
+
+class ColorIndexCacheTests(TestCase):
+    def test(self) -> None:
+        colors = lib.make_colors("#000000 #ffffff")
+
+        index = nearest.color_index(colors, "lab")
+
+        self.assertIs(nearest.color_index(list(colors), "lab"), index)
+        self.assertIsNot(nearest.color_index(colors, "oklab"), index)
+        self.assertEqual(index.space, "lab")
+
+
+class ConvertTests(TestCase):
+    rgb = [[255, 255, 255], [255, 0, 0], [0, 0, 0], [0, 0, 255]]
+
+    def test_lab(self) -> None:
+        lab = nearest.convert(self.rgb, "lab")
+
+        np.testing.assert_allclose(
+            lab,
+            [
+                [100, 0, 0],
+                [53.2408, 80.0925, 67.2032],
+                [0, 0, 0],
+                [32.297, 79.1875, -107.8602],
+            ],
+            atol=1e-3,
+        )
+
+    def test_oklab(self) -> None:
+        oklab = nearest.convert(self.rgb, "oklab")
+
+        np.testing.assert_allclose(
+            oklab,
+            [[1, 0, 0], [0.628, 0.2249, 0.1258], [0, 0, 0], [0.452, -0.0325, -0.3115]],
+            atol=1e-3,
+        )
+
+    def test_rgb(self) -> None:
+        self.assertEqual(nearest.convert(self.rgb, "rgb").tolist(), self.rgb)
@@ -0,0 +1,129 @@
+# pylint: disable=missing-docstring
+from unittest import TestCase
+
+import numpy as np
+
+from larry.color import Color
+from larry.palette import Palette, pack, unpack
+
+from . import lib
+
+COLORS = lib.make_colors(
+    "#7e118f #754fc7 #835d75 #807930 #9772ea #9f934b #39e822 #35dfe9 #000000 #ffffff"
+)
+
+
+class PaletteTests(TestCase):
+    palette = Palette.from_colors(COLORS)
+
+    def test_from_colors(self) -> None:
+        self.assertEqual(self.palette.array.shape, (10, 3))
+        self.assertEqual(self.palette.array.dtype, np.uint8)
+
+    def test_to_colors(self) -> None:
+        colors = self.palette.to_colors()
+
+        self.assertEqual(colors, COLORS)
+        self.assertTrue(all(isinstance(color, Color) for color in colors))
+
+    def test_empty(self) -> None:
+        palette = Palette.from_colors([])
+
+        self.assertEqual(len(palette), 0)
+        self.assertEqual(palette.to_colors(), [])
+
+    def test_bad_shape(self) -> None:
+        with self.assertRaises(ValueError):
+            Palette(np.zeros((4, 4)))
+
+    def test_clamps_values(self) -> None:
+        palette = Palette([[-20, 127.9, 300]])
+
+        self.assertEqual(palette.to_colors(), [Color(0, 127, 255)])
+
+    def test_getitem(self) -> None:
+        self.assertEqual(self.palette[1], COLORS[1])
+        self.assertEqual(self.palette[1:3], COLORS[1:3])
+
+    def test_eq(self) -> None:
+        self.assertEqual(self.palette, Palette.from_colors(COLORS))
+        self.assertNotEqual(self.palette, self.palette.inverse())
+
+    def test_luminocity(self) -> None:
+        expected = [color.luminocity() for color in COLORS]
+
+        self.assertEqual(self.palette.luminocity().tolist(), expected)
+
+    def test_sorted(self) -> None:
+        self.assertEqual(
+            self.palette.sorted().to_colors(), sorted(COLORS, key=Color.luminocity)
+        )
+
+    def test_to_hsv(self) -> None:
+        expected = np.array([color.to_hsv() for color in COLORS])
+
+        self.assertTrue(np.array_equal(self.palette.to_hsv(), expected))
+
+    def test_from_hsv(self) -> None:
+        hsv = [(270, 59, 86), (-90, 59, 86), (360, 59, 86), (270, 0, 86)]
+
+        palette = Palette.from_hsv(hsv)
+
+        self.assertEqual(palette.to_colors(), [Color.from_hsv(i) for i in hsv])
+
+    def test_luminize(self) -> None:
+        expected = [color.luminize(40) for color in COLORS]
+
+        self.assertEqual(self.palette.luminize(40).to_colors(), expected)
+
+    def test_luminize_per_color(self) -> None:
+        lums = range(0, 250, 25)
+        expected = [color.luminize(lum) for color, lum in zip(COLORS, lums)]
+
+        self.assertEqual(self.palette.luminize(list(lums)).to_colors(), expected)
+
+    def test_inverse(self) -> None:
+        expected = [color.inverse() for color in COLORS]
+
+        self.assertEqual(self.palette.inverse().to_colors(), expected)
+
+    def test_arithmetic(self) -> None:
+        other = Color("#040404")
+
+        self.assertEqual((self.palette + 20.0).to_colors(), [c + 20.0 for c in COLORS])
+        self.assertEqual(
+            (self.palette + other).to_colors(), [c + other for c in COLORS]
+        )
+        self.assertEqual(
+            (self.palette - other).to_colors(), [c - other for c in COLORS]
+        )
+        self.assertEqual((self.palette * 1.3).to_colors(), [c * 1.3 for c in COLORS])
+        self.assertEqual((0.3 * self.palette).to_colors(), [c * 0.3 for c in COLORS])
+
+    def test_arithmetic_with_arrays(self) -> None:
+        palette = Palette.from_colors(COLORS[:3])
+
+        # A flat array is one value per color, even if it has 3 of them
+        self.assertEqual(
+            (palette + np.array([1, 2, 3])).to_colors(),
+            [c + n for c, n in zip(COLORS[:3], [1, 2, 3])],
+        )
+        self.assertEqual(
+            (palette - np.array([[1, 2, 3]] * 3)).to_colors(),
+            [c - Color(1, 2, 3) for c in COLORS[:3]],
+        )
+
+    def test_arithmetic_with_bad_shapes(self) -> None:
+        for value in [(4, 4, 4), np.zeros((1, 3)), np.zeros((3, 3)), [1, 2]]:
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                self.palette + value  # pylint: disable=pointless-statement
+
+
+class PackTests(TestCase):
+    def test(self) -> None:
+        rgb = np.array([[0x12, 0x34, 0x56], [0xFF, 0x00, 0x80]], dtype=np.uint8)
+
+        packed = pack(rgb)
+
+        self.assertEqual(packed.tolist(), [0x123456, 0xFF0080])
+        self.assertTrue(np.array_equal(unpack(packed), rgb))
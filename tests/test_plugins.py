@@ -78,6 +78,38 @@ class ListPlugins(TestCase):
         self.assertIn("[ ] gtk", output)
 
 
+@given(lib.configmaker)
+class DominantMethodTests(TestCase):
+    def test_default(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["plugins:vim"] = {}
+
+        self.assertEqual(plugins.dominant_method(config["plugins:vim"]), "sklearn")
+
+    def test_from_larry_config(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"]["dominant_method"] = "octree"
+        config["plugins:vim"] = {}
+
+        self.assertEqual(plugins.dominant_method(config["plugins:vim"]), "octree")
+
+    def test_from_plugin_config(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"]["dominant_method"] = "octree"
+        config["plugins:vim"] = {"dominant_method": "histogram"}
+
+        self.assertEqual(plugins.dominant_method(config["plugins:vim"]), "histogram")
+
+    def test_unknown(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["plugins:vim"] = {"dominant_method": "bogus"}
+
+        with mock.patch.object(plugins, "LOGGER"):
+            method = plugins.dominant_method(config["plugins:vim"])
+
+        self.assertEqual(method, "sklearn")
+
+
 class LoadTests(TestCase):
     def test(self):
         plugin = plugins.load("command")
@@ -127,6 +127,57 @@ class ThemeTests(TestCase):
         gio.Settings.return_value.reset.assert_called_once_with("name")
 
 
+class AccentColorTests(TestCase):
+    def test_closest(self) -> None:
+        accent_color = gnome_shell.AccentColor
+
+        self.assertIs(accent_color.closest(Color("#0000ff")), accent_color.BLUE)
+        self.assertIs(accent_color.closest(Color("#ffa010")), accent_color.ORANGE)
+        self.assertIs(accent_color.closest(Color("#107070")), accent_color.TEAL)
+
+    def test_closest_in_space(self) -> None:
+        accent_color = gnome_shell.AccentColor
+        color = Color("#7942bd")
+
+        self.assertIs(accent_color.closest(color), accent_color.SLATE)
+        self.assertIs(accent_color.closest(color, "oklab"), accent_color.PURPLE)
+
+
+@given(lib.configmaker)
+class DistanceSpaceTests(TestCase):
+    def test_default(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+
+        self.assertEqual(gnome_shell.distance_space(config["larry"]), "rgb")
+
+    def test_from_larry_config(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"]["distance"] = "lab"
+        config["plugins:gnome_shell"] = {}
+
+        self.assertEqual(
+            gnome_shell.distance_space(config["plugins:gnome_shell"]), "lab"
+        )
+
+    def test_from_plugin_config(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["larry"]["distance"] = "lab"
+        config["plugins:gnome_shell"] = {"distance": "oklab"}
+
+        self.assertEqual(
+            gnome_shell.distance_space(config["plugins:gnome_shell"]), "oklab"
+        )
+
+    def test_unknown(self, fixtures: Fixtures) -> None:
+        config = fixtures.configmaker.config
+        config["plugins:gnome_shell"] = {"distance": "cmyk"}
+
+        with mock.patch.object(gnome_shell, "LOGGER"):
+            space = gnome_shell.distance_space(config["plugins:gnome_shell"])
+
+        self.assertEqual(space, "rgb")
+
+
 @given(lib.configmaker)
 @mock.patch("larry.plugins.gnome_shell.Theme", autospec=True)
 class PluginTests(IsolatedAsyncioTestCase):
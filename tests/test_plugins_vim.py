@@ -3,6 +3,7 @@ from unittest import IsolatedAsyncioTestCase, TestCase, mock
 
 from unittest_fixtures import Fixtures, given
 
+from larry.filters import pipeline
 from larry.plugins import vim
 
 from . import lib
@@ -99,6 +100,35 @@ class GetNewColorsTests(TestCase):
         ]
         self.assertEqual(new_colors, expected)
 
+    def test_dominant_method(self, fixtures: Fixtures) -> None:
+        configmaker = fixtures.configmaker
+        configmaker.add_section("plugins:vim")
+        configmaker.add_config(dominant_method="mediancut")
+
+        with mock.patch.object(
+            vim.Color, "dominant", return_value=COLORS[:7]
+        ) as dominant:
+            vim.get_new_colors(COLOR_STR, COLORS, configmaker.config["plugins:vim"])
+
+        dominant.assert_called_once_with(
+            COLORS, 7, None, mock.ANY, method="mediancut", weights=None
+        )
+
+    def test_weights(self, fixtures: Fixtures) -> None:
+        configmaker = fixtures.configmaker
+        configmaker.add_section("plugins:vim")
+        weights = list(range(1, 9))
+
+        with (
+            pipeline.weighted(COLORS, weights),
+            mock.patch.object(
+                vim.Color, "dominant", return_value=COLORS[:7]
+            ) as dominant,
+        ):
+            vim.get_new_colors(COLOR_STR, COLORS, configmaker.config["plugins:vim"])
+
+        self.assertEqual(dominant.call_args.kwargs["weights"].tolist(), weights)
+
     def test_filter_skip_bg(self, fixtures: Fixtures) -> None:
         configmaker = fixtures.configmaker
         configmaker.add_section("plugins:vim")
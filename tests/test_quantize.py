@@ -0,0 +1,209 @@
+# pylint: disable=missing-docstring
+from unittest import TestCase, mock
+
+import numpy as np
+from unittest_fixtures import Fixtures, params
+
+from larry import quantize
+
+RNG = np.random.default_rng(1)
+# Clusters of colors around a few centers
+CENTERS = RNG.integers(30, 226, (6, 3))
+COLORS = np.unique(
+    np.clip(CENTERS[RNG.integers(0, 6, 3000)] + RNG.normal(0, 6, (3000, 3)), 0, 255)
+    .astype(np.uint8)
+    .reshape(-1, 3),
+    axis=0,
+)
+WEIGHTS = RNG.integers(1, 100, len(COLORS))
+
+
+def rms_error(colors: np.ndarray, weights: np.ndarray, centers: np.ndarray) -> float:
+    squared = ((colors[:, None, :] - centers[None]) ** 2).sum(axis=2).min(axis=1)
+
+    return float(np.sqrt((squared * weights).sum() / weights.sum()))
+
+
+@params(method=list(quantize.QUANTIZERS))
+class QuantizerTests(TestCase):
+    def test_at_most_k_colors(self, fixtures: Fixtures) -> None:
+        quantizer = quantize.QUANTIZERS[fixtures.method]
+
+        for k in [1, 2, 7, 64]:
+            with self.subTest(k=k):
+                centers = quantizer(COLORS, WEIGHTS, k)
+
+                self.assertLessEqual(len(centers), k)
+                self.assertGreater(len(centers), 0)
+                self.assertTrue(((centers >= 0) & (centers <= 255)).all())
+
+    def test_finds_the_clusters(self, fixtures: Fixtures) -> None:
+        centers = quantize.QUANTIZERS[fixtures.method](COLORS, WEIGHTS, 16)
+
+        self.assertLess(rms_error(COLORS, WEIGHTS, centers), 15)
+
+    def test_deterministic(self, fixtures: Fixtures) -> None:
+        quantizer = quantize.QUANTIZERS[fixtures.method]
+
+        self.assertEqual(
+            quantizer(COLORS, WEIGHTS, 8).tolist(),
+            quantizer(COLORS, WEIGHTS, 8).tolist(),
+        )
+
+    def test_fewer_colors_than_k(self, fixtures: Fixtures) -> None:
+        colors = np.array([[255, 0, 0], [0, 0, 255], [0, 255, 0]])
+
+        centers = quantize.QUANTIZERS[fixtures.method](colors, [1, 1, 1], 8)
+
+        self.assertEqual(sorted(centers.tolist()), sorted(colors.tolist()))
+
+    def test_no_colors(self, fixtures: Fixtures) -> None:
+        with self.assertRaises(ValueError):
+            quantize.QUANTIZERS[fixtures.method](np.empty((0, 3)), [], 8)
+
+
+class MedianCutTests(TestCase):
+    def test_splits_at_the_weighted_median(self) -> None:
+        colors = [[0, 0, 0], [10, 0, 0], [20, 0, 0], [200, 0, 0]]
+
+        centers = quantize.median_cut(colors, [1, 1, 1, 9], 2)
+
+        self.assertEqual(centers.tolist(), [[10.0, 0.0, 0.0], [200.0, 0.0, 0.0]])
+
+
+class OctreeTests(TestCase):
+    def test_deepest_level_that_fits(self) -> None:
+        colors = [[0, 0, 0], [100, 0, 0], [255, 255, 255]]
+
+        self.assertEqual(
+            quantize.octree(colors, [5, 5, 1], 3).tolist(),
+            [[0.0, 0.0, 0.0], [100.0, 0.0, 0.0], [255.0, 255.0, 255.0]],
+        )
+        self.assertEqual(
+            quantize.octree(colors, [5, 5, 1], 2).tolist(),
+            [[50.0, 0.0, 0.0], [255.0, 255.0, 255.0]],
+        )
+
+    def test_heaviest_nodes_are_split(self) -> None:
+        # Two nodes at the first level, each with two children
+        colors = [[0, 0, 0], [100, 0, 0], [150, 150, 150], [255, 255, 255]]
+
+        centers = quantize.octree(colors, [5, 5, 1, 1], 3)
+
+        self.assertEqual(
+            centers.tolist(),
+            [[202.5, 202.5, 202.5], [0.0, 0.0, 0.0], [100.0, 0.0, 0.0]],
+        )
+
+    def test_partial_split(self) -> None:
+        # Three nodes at the first level, but only room for two colors
+        colors = [[0, 0, 0], [255, 0, 0], [0, 0, 255]]
+
+        centers = quantize.octree(colors, [5, 1, 1], 2)
+
+        self.assertEqual(centers.tolist(), [[127.5, 0.0, 127.5], [0.0, 0.0, 0.0]])
+
+
+class KMeansTests(TestCase):
+    def test_seed(self) -> None:
+        centers = quantize.kmeans(COLORS, WEIGHTS, 8, iterations=0, seed=1)
+
+        self.assertNotEqual(
+            centers.tolist(),
+            quantize.kmeans(COLORS, WEIGHTS, 8, iterations=0, seed=2).tolist(),
+        )
+
+    def test_timeout(self) -> None:
+        with (
+            mock.patch.object(quantize, "time") as time,
+            mock.patch.object(quantize, "cKDTree", wraps=quantize.cKDTree) as tree,
+        ):
+            time.monotonic.side_effect = [0.0, 1.5]
+            quantize.kmeans(COLORS, WEIGHTS, 8, timeout=1.0)
+
+        tree.assert_not_called()
+
+    def test_no_timeout_by_default(self) -> None:
+        with mock.patch.object(quantize, "time") as time:
+            centers = quantize.kmeans(COLORS, WEIGHTS, 8)
+
+        time.monotonic.assert_not_called()
+        self.assertEqual(len(centers), 8)
+
+    def test_seeds_from_a_sample(self) -> None:
+        with mock.patch.object(quantize, "SEED_SAMPLE_SIZE", 100):
+            centers = quantize.kmeans(COLORS, WEIGHTS, 8)
+
+        self.assertEqual(len(centers), 8)
+        self.assertLess(rms_error(COLORS, WEIGHTS, centers), 15)
+
+    def test_improves_on_the_seeds(self) -> None:
+        seeds = quantize.kmeans(COLORS, WEIGHTS, 8, iterations=0)
+        centers = quantize.kmeans(COLORS, WEIGHTS, 8)
+
+        self.assertLessEqual(
+            rms_error(COLORS, WEIGHTS, centers), rms_error(COLORS, WEIGHTS, seeds)
+        )
+
+
+class MiniBatchKMeansTests(TestCase):
+    def test_seed(self) -> None:
+        self.assertNotEqual(
+            quantize.minibatch_kmeans(COLORS, WEIGHTS, 8, seed=1).tolist(),
+            quantize.minibatch_kmeans(COLORS, WEIGHTS, 8, seed=2).tolist(),
+        )
+
+    def test_improves_on_the_seeds(self) -> None:
+        seeds = quantize.minibatch_kmeans(COLORS, WEIGHTS, 8, iterations=0)
+        centers = quantize.minibatch_kmeans(COLORS, WEIGHTS, 8)
+
+        self.assertLessEqual(
+            rms_error(COLORS, WEIGHTS, centers), rms_error(COLORS, WEIGHTS, seeds)
+        )
+
+
+class HistogramTests(TestCase):
+    def test_neighboring_bins_are_skipped(self) -> None:
+        # The two reds fall in neighboring bins
+        colors = [[255, 0, 0], [235, 0, 0], [0, 0, 255]]
+
+        centers = quantize.histogram(colors, [10, 5, 1], 2)
+
+        self.assertEqual(centers.tolist(), [[255.0, 0.0, 0.0], [0.0, 0.0, 255.0]])
+
+    def test_neighboring_bins_when_there_is_room(self) -> None:
+        colors = [[255, 0, 0], [235, 0, 0], [0, 0, 255]]
+
+        centers = quantize.histogram(colors, [10, 5, 1], 3)
+
+        self.assertEqual(
+            centers.tolist(), [[255.0, 0.0, 0.0], [0.0, 0.0, 255.0], [235.0, 0.0, 0.0]]
+        )
+
+
+class ByWeightTests(TestCase):
+    def test(self) -> None:
+        colors = [[0, 0, 0], [10, 10, 10], [250, 250, 250]]
+        centers = np.array([[5.0, 5.0, 5.0], [250.0, 250.0, 250.0]])
+
+        ordered = quantize.by_weight(colors, [1, 1, 5], centers)
+
+        self.assertEqual(ordered.tolist(), centers[::-1].tolist())
+
+
+class DistinctTests(TestCase):
+    def test(self) -> None:
+        colors = np.array([[9, 9, 9], [1, 2, 3], [9, 9, 9], [1, 2, 3], [9, 9, 9]])
+
+        rgb, counts, inverse = quantize.distinct(colors)
+
+        self.assertEqual(rgb.dtype, np.uint8)
+        self.assertEqual(rgb.tolist(), [[1, 2, 3], [9, 9, 9]])
+        self.assertEqual(counts.tolist(), [2, 3])
+        self.assertEqual(rgb[inverse].tolist(), colors.tolist())
+
+
+class PrepareTests(TestCase):
+    def test_weights_must_match(self) -> None:
+        with self.assertRaises(ValueError):
+            quantize.prepare([[1, 2, 3], [4, 5, 6]], [1])